@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+多指标统一评估
+每个生成图像文件夹只读取、解码一次，解码结果在内存中派生出各指标所需的预处理版本，
+分发给FID、HPSv2、ImageReward、LPIPS、SSIM，最终汇总为一张长表（文件夹路径, 文件夹名, 文件名, 指标, 分数）。
+各评估器在多个文件夹之间复用，消融实验（3-1…3-7）的模型只加载一次。
+
+用法示例:
+    python Calculate_AllMetrics.py --generated E:/2025-09-08/5.3/3-1_Basemodel E:/2025-09-08/5.3/3-2_Ourmodel \
+        --reference-image E:/2025-09-08/5.3/3-5_Fullmodel/Fullmodel-generate-0123.png \
+        --reference-dir E:/2025-09-08/5.3/Reference --output E:/2025-09-08/5.3/all_metrics.xlsx \
+        --results-dir E:/2025-09-08/Results --experiment 5.3
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn.functional as F
+from PIL import Image
+from torchvision import transforms
+
+# 将Evaluate目录加入搜索路径，以便导入各指标目录中的模块
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
+
+from Image_handle.Image_loader import list_images, iter_images, decode_image, resize_rgb, resize_center_crop
+from Calculate_Score.Results_dataset import write_scores
+
+# 支持的指标
+METRICS = ('fid', 'hpsv2', 'imagereward', 'lpips', 'ssim')
+
+# 长表的列：run为生成文件夹的完整规范化路径（唯一标识一组结果），folder为便于阅读的文件夹名
+RESULT_COLUMNS = ['run', 'folder', 'filename', 'metric', 'value']
+
+# 默认提示词（与HPSv2、ImageReward脚本一致）
+DEFAULT_PROMPT = "This is a high-resolution photo of a tugboat sailing across calm turquoise waters. The vessel is predominantly white with green and red accents, and has a sturdy rectangular hull. The green deck is equipped with various equipment, including large black rubber fenders along the waterline, which may be used for collision protection. The tugboat's superstructure includes a bridge with windows, radar equipment, and a red and white antenna mast. The bridge is operated by a crew member, but he is not visible in the photo. The water is calm, with gentle ripples indicating movement. There is no sky in the image, and the focus is entirely on the ship and its surroundings."
+
+
+def _import_script(folder, module_name):
+    """
+    导入Evaluate下某个指标目录中的脚本模块
+
+    ImageReward目录与pip包ImageReward同名，无法以 ImageReward.xxx 的形式导入，
+    因此把该目录加入搜索路径后按脚本名导入
+    """
+    folder_path = os.path.join(_EVALUATE_DIR, folder)
+    if folder_path not in sys.path:
+        sys.path.append(folder_path)
+    return importlib.import_module(module_name)
+
+
+def run_id(generated_dir):
+    """
+    生成文件夹的结果标识：完整的规范化绝对路径
+
+    只用文件夹名时，run1/out 与 run2/out 这类同名文件夹的结果会互相覆盖
+    """
+    return os.path.normcase(os.path.normpath(os.path.abspath(generated_dir)))
+
+
+class MetricSuite:
+    def __init__(self, metrics=METRICS, device=None, batch_size=16, workers=4,
+                 fid_dims=192, lpips_net='alex', ssim_color=False, ssim_window='uniform', fid_cache_dir=None,
+                 fast_inference=False):
+        """
+        多指标评估器，各指标的模型在第一次使用时加载，之后在多个文件夹之间复用
+
+        Args:
+            metrics: 启用的指标，取值见METRICS
+            device: 计算设备，默认自动选择
+            batch_size: 各模型的批大小
+            workers: 图像解码线程数
+            fid_dims: FID使用的Inception特征维度
+            lpips_net: LPIPS骨干网络 ('alex', 'vgg', 'squeeze')
+            ssim_color: 为True时计算彩色SSIM
+            ssim_window: SSIM窗口类型 ('uniform' 或 'gaussian')
+            fid_cache_dir: 参考集FID统计量缓存目录，为None时使用FID模块的默认目录
+            fast_inference: HPSv2、ImageReward、LPIPS启用快速推理（CPU上bfloat16 autocast + channels_last）
+        """
+        unknown = [m for m in metrics if m not in METRICS]
+        if unknown:
+            raise ValueError(f"不支持的指标: {unknown}，可选值: {list(METRICS)}")
+
+        self.metrics = tuple(m for m in METRICS if m in metrics)
+        self.device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.batch_size = batch_size
+        self.workers = workers
+        self.fid_dims = fid_dims
+        self.lpips_net = lpips_net
+        self.ssim_color = ssim_color
+        self.ssim_window = ssim_window
+        self.fid_cache_dir = fid_cache_dir
+        self.fast_inference = fast_inference
+        self._evaluators = {}
+
+    def _create_evaluator(self, metric):
+        """按需导入并创建评估器（未启用的指标不需要安装对应依赖；SSIM没有模型，返回其计算模块）"""
+        if metric == 'fid':
+            from FID.FID_Cache import DEFAULT_CACHE_DIR
+            from FID.FID_Engine import FIDEvaluator
+            return FIDEvaluator(dims=self.fid_dims, device=self.device, batch_size=self.batch_size,
+                                cache_dir=self.fid_cache_dir or DEFAULT_CACHE_DIR)
+        if metric == 'hpsv2':
+            from HPSv2.Calculate_HPSv2 import HPSv2Evaluator
+            return HPSv2Evaluator(hps_version="v2.1", device=str(self.device), batch_size=self.batch_size,
+                                  fast_inference=self.fast_inference)
+        if metric == 'imagereward':
+            module = _import_script('ImageReward', 'Calculate_ImageReward')
+            return module.ImageRewardEvaluator("ImageReward-v1.0", device=str(self.device), batch_size=self.batch_size,
+                                               fast_inference=self.fast_inference)
+        if metric == 'lpips':
+            from LPIPS.Calculate_LPIPS import LPIPSEvaluator
+            return LPIPSEvaluator(net=self.lpips_net, device=self.device, fast_inference=self.fast_inference)
+        if metric == 'ssim':
+            from SSIM import Calculate_SSIM
+            return Calculate_SSIM
+
+    def get_evaluator(self, metric):
+        if metric not in self._evaluators:
+            self._evaluators[metric] = self._create_evaluator(metric)
+        return self._evaluators[metric]
+
+    def _check_inputs(self, reference_image, reference_dir, prompt):
+        missing = []
+        if 'fid' in self.metrics and not reference_dir:
+            missing.append("fid 需要 reference_dir")
+        if ('lpips' in self.metrics or 'ssim' in self.metrics) and not reference_image:
+            missing.append("lpips/ssim 需要 reference_image")
+        if ('hpsv2' in self.metrics or 'imagereward' in self.metrics) and not prompt:
+            missing.append("hpsv2/imagereward 需要 prompt")
+        if missing:
+            raise ValueError("缺少评估输入: " + "；".join(missing))
+
+    def _decode_folder(self, generated_dir, reference_array):
+        """
+        解码文件夹中的全部图像（每张只解码一次），并在内存中派生各指标的预处理版本
+
+        Returns:
+            (有效文件名列表, {指标: 预处理后的图像列表})，HPSv2评估器加载失败时其值为该异常
+        """
+        filenames, paths = list_images(generated_dir)
+        hps_tensors, reward_images, lpips_images, ssim_images, fid_tensors = [], [], [], [], []
+        ssim_module = self.get_evaluator('ssim') if 'ssim' in self.metrics else None
+        hps_preprocess, hps_error = None, None
+        if 'hpsv2' in self.metrics:
+            try:
+                hps_preprocess = self.get_evaluator('hpsv2').preprocess_image
+            except Exception as e:
+                # 加载失败只影响HPSv2，计算该指标时再报告
+                hps_error = e
+        if 'lpips' in self.metrics:
+            from LPIPS.Calculate_LPIPS import LPIPS_IMAGE_SIZE
+        to_tensor = transforms.ToTensor()
+
+        valid_names = []
+        for index, path, image_array, error in iter_images(paths, workers=self.workers):
+            if image_array is None:
+                print(f"警告：无法读取图像 '{filenames[index]}'，跳过 ({error})")
+                continue
+            valid_names.append(filenames[index])
+
+            # HPSv2是长边缩放+补边（不裁剪），直接保存评估器预处理后的模型输入tensor
+            if hps_preprocess is not None:
+                hps_tensors.append(hps_preprocess(image_array))
+            # ImageReward是224短边缩放+中心裁剪
+            if 'imagereward' in self.metrics:
+                reward_images.append(Image.fromarray(resize_center_crop(image_array, size=224)))
+            if 'lpips' in self.metrics:
+                lpips_images.append(Image.fromarray(resize_rgb(image_array, LPIPS_IMAGE_SIZE)))
+            if ssim_module is not None:
+                size = (reference_array.shape[1], reference_array.shape[0])
+                ssim_images.append(ssim_module.prepare_ssim_image(image_array, size=size, color=self.ssim_color))
+            if 'fid' in self.metrics:
+                # 与InceptionV3内部相同的299x299双线性缩放，只保留缩放后的tensor以节省内存
+                tensor = to_tensor(Image.fromarray(image_array)).unsqueeze(0)
+                fid_tensors.append(F.interpolate(tensor, size=(299, 299), mode='bilinear', align_corners=False)[0])
+
+        return valid_names, {'hpsv2': hps_error or hps_tensors, 'imagereward': reward_images,
+                             'lpips': lpips_images, 'ssim': ssim_images, 'fid': fid_tensors}
+
+    def evaluate_folder(self, generated_dir, reference_image=None, reference_dir=None, prompt=DEFAULT_PROMPT):
+        """
+        对一个生成图像文件夹计算全部已启用的指标
+
+        Args:
+            generated_dir: 生成图像文件夹
+            reference_image: 参考图像路径（LPIPS、SSIM）
+            reference_dir: 真实图像文件夹（FID）
+            prompt: 文本提示词（HPSv2、ImageReward）
+
+        Returns:
+            长表DataFrame，列为 run, folder, filename, metric, value；
+            FID为文件夹级指标，filename为空。某个指标计算失败时只打印警告并跳过该指标，
+            不影响其他指标
+        """
+        self._check_inputs(reference_image, reference_dir, prompt)
+
+        reference_array = decode_image(reference_image) if reference_image else None
+        filenames, variants = self._decode_folder(generated_dir, reference_array)
+        run = run_id(generated_dir)
+        folder = os.path.basename(os.path.normpath(generated_dir))
+        print(f"{folder}: 共 {len(filenames)} 张图像，指标 {list(self.metrics)}")
+
+        rows = []
+        if not filenames:
+            return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+        def compute(metric):
+            """计算单个指标，返回 [(文件名, 分数)]；FID为文件夹级指标，文件名为None"""
+            if metric == 'fid':
+                result = self.get_evaluator('fid').calculate_fid(reference_dir, variants['fid'])
+                return [(None, result.fid)]
+            if metric == 'hpsv2':
+                if isinstance(variants['hpsv2'], Exception):
+                    raise variants['hpsv2']
+                scores = self.get_evaluator('hpsv2').score_batch(prompt, variants['hpsv2'])
+            elif metric == 'imagereward':
+                scores = self.get_evaluator('imagereward').score_batch(prompt, variants['imagereward'])
+            elif metric == 'lpips':
+                scores = self.get_evaluator('lpips').calculate_lpips_batch(
+                    reference_image, variants['lpips'], batch_size=self.batch_size)
+            else:
+                ssim_module = self.get_evaluator('ssim')
+                reference = ssim_module.prepare_ssim_image(reference_array, color=self.ssim_color)
+                scores = ssim_module.ssim_batch(reference, np.stack(variants['ssim']), window=self.ssim_window)
+            return list(zip(filenames, scores))
+
+        for metric in self.metrics:
+            # 逐个指标捕获异常（如FID图像少于2张、某个模型加载失败），其他指标照常计算
+            try:
+                pairs = compute(metric)
+            except Exception as e:
+                print(f"警告：{folder} 的指标 {metric} 计算失败，跳过 ({type(e).__name__}: {e})")
+                continue
+            rows.extend({'run': run, 'folder': folder, 'filename': name, 'metric': metric, 'value': float(score)}
+                        for name, score in pairs)
+
+        return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+    def evaluate_folders(self, generated_dirs, reference_image=None, reference_dir=None, prompt=DEFAULT_PROMPT):
+        """
+        依次评估多个生成图像文件夹（如消融实验的各组），模型只加载一次
+
+        Returns:
+            所有文件夹结果拼接后的长表DataFrame
+        """
+        results = [self.evaluate_folder(d, reference_image, reference_dir, prompt) for d in generated_dirs]
+        return pd.concat(results, ignore_index=True)
+
+
+def summarize(results):
+    """
+    按生成文件夹（run）汇总：每个指标取平均值（FID本身就是文件夹级指标）
+
+    Args:
+        results: evaluate_folder(s)返回的长表
+
+    Returns:
+        行为文件夹、列为指标的DataFrame（同名文件夹按run区分）
+    """
+    summary = results.pivot_table(index=['run', 'folder'], columns='metric', values='value',
+                                  aggfunc='mean', sort=False)
+    summary.columns.name = None
+    return summary.reset_index()
+
+
+def save_results(results, output_path):
+    """
+    保存结果：.xlsx时写入明细与汇总两个工作表，其他扩展名保存为CSV长表
+
+    Args:
+        results: 长表DataFrame
+        output_path: 输出文件路径
+    """
+    if output_path.lower().endswith('.xlsx'):
+        with pd.ExcelWriter(output_path) as writer:
+            results.to_excel(writer, sheet_name='details', index=False)
+            summarize(results).to_excel(writer, sheet_name='summary', index=False)
+    else:
+        results.to_csv(output_path, index=False)
+    print(f"结果已保存到: {output_path}")
+
+
+def save_to_dataset(results, generated_dirs, results_dir, experiment, types=None):
+    """
+    将结果写入Parquet结果数据集（按实验/模型类型分区，每个指标一个文件）
+
+    Args:
+        results: 长表DataFrame
+        generated_dirs: 生成图像文件夹（顺序与types一致）
+        results_dir: 结果数据集目录
+        experiment: 实验名称
+        types: 各文件夹对应的模型类型编号，默认按顺序为1, 2, ...
+    """
+    types = types or list(range(1, len(generated_dirs) + 1))
+    if len(types) != len(generated_dirs):
+        raise ValueError("--types的数量必须与--generated一致")
+
+    for generated_dir, model_type in zip(generated_dirs, types):
+        # 按完整路径匹配，同名的不同文件夹不会互相混入
+        for metric, group in results[results['run'] == run_id(generated_dir)].groupby('metric', sort=False):
+            write_scores(results_dir, experiment, model_type, metric, group['filename'], group['value'])
+    print(f"结果已写入数据集: {results_dir} (experiment={experiment})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="一次解码、同时计算FID/HPSv2/ImageReward/LPIPS/SSIM")
+    parser.add_argument('--generated', nargs='+', required=True, help="生成图像文件夹（可指定多个）")
+    parser.add_argument('--reference-image', default=None, help="参考图像路径（LPIPS、SSIM）")
+    parser.add_argument('--reference-dir', default=None, help="真实图像文件夹（FID）")
+    parser.add_argument('--prompt', default=DEFAULT_PROMPT, help="文本提示词（HPSv2、ImageReward）")
+    parser.add_argument('--metrics', nargs='+', default=list(METRICS), choices=METRICS, help="启用的指标")
+    parser.add_argument('--batch-size', type=int, default=16, help="模型批大小")
+    parser.add_argument('--workers', type=int, default=4, help="图像解码线程数")
+    parser.add_argument('--fid-dims', type=int, default=192, help="FID特征维度")
+    parser.add_argument('--fast', action='store_true', help="启用快速推理（CPU上bfloat16 autocast + channels_last）")
+    parser.add_argument('--output', default=None, help="结果输出路径（.xlsx或.csv）")
+    parser.add_argument('--results-dir', default=None, help="Parquet结果数据集目录（按实验/模型类型分区，供绘图脚本读取）")
+    parser.add_argument('--experiment', default=None, help="写入结果数据集时的实验名称")
+    parser.add_argument('--types', nargs='+', type=int, default=None,
+                        help="各生成文件夹对应的模型类型编号，默认按顺序为1, 2, ...")
+    args = parser.parse_args()
+
+    suite = MetricSuite(metrics=args.metrics, batch_size=args.batch_size, workers=args.workers,
+                        fid_dims=args.fid_dims, fast_inference=args.fast)
+    results = suite.evaluate_folders(args.generated, args.reference_image, args.reference_dir, args.prompt)
+
+    print(summarize(results).to_string(index=False))
+    if args.output:
+        save_results(results, args.output)
+    if args.results_dir:
+        if not args.experiment:
+            parser.error("写入结果数据集时需要指定--experiment")
+        save_to_dataset(results, args.generated, args.results_dir, args.experiment, args.types)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+评估结果数据集（Parquet）
+各评估脚本把分数直接写入按 实验/模型类型 分区的Parquet数据集，目录结构为:
+    <root>/experiment=5.2/model_type=1/hpsv2.parquet
+每个 (实验, 类型, 指标) 一个文件，重新评估时整体覆盖。
+绘图脚本只读取需要的列，并按实验、类型、指标过滤（分区过滤直接跳过无关文件），
+不再拼接手工整理的Excel；Excel只作为导出格式保留（export_excel）。
+"""
+
+import os
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# 文件内的列
+SCORE_SCHEMA = pa.schema([
+    ('filename', pa.string()),   # 图像文件名，文件夹级指标（FID）为空
+    ('metric', pa.string()),     # 指标名称
+    ('score', pa.float64()),     # 分数
+    ('rank', pa.int32()),        # 序号/名次，可为空
+])
+
+# 分区列（来自目录名）
+PARTITION_SCHEMA = pa.schema([
+    ('experiment', pa.string()),  # 实验名称（如 5.2、5.3）
+    ('model_type', pa.int32()),   # 模型类型（原Excel中的"类型"列）
+])
+
+# 导出Excel时各指标的列名（与原来手工整理的Excel保持一致）
+METRIC_COLUMNS = {
+    'fid': 'FID得分',
+    'hpsv2': 'HPSv2得分',
+    'imagereward': 'ImageReward得分',
+    'lpips': 'LPIPS得分',
+    'ssim': 'SSIM得分',
+    'comprehensive': '综合得分',
+}
+
+
+def _partition_dir(root, experiment, model_type):
+    # 分区值按URI编码，与pyarrow读取hive分区时的解码方式一致
+    return os.path.join(root, f"experiment={quote(str(experiment), safe='')}", f"model_type={int(model_type)}")
+
+
+def write_scores(root, experiment, model_type, metric, filenames, scores, ranks=None):
+    """
+    写入一组分数（覆盖同一 实验/类型/指标 的旧结果）
+
+    Args:
+        root: 数据集根目录
+        experiment: 实验名称
+        model_type: 模型类型编号
+        metric: 指标名称（见METRIC_COLUMNS）
+        filenames: 文件名列表，文件夹级指标传[None]
+        scores: 与filenames一一对应的分数
+        ranks: 与filenames一一对应的序号/名次（可选）
+
+    Returns:
+        写入的文件路径
+    """
+    filenames = [None if pd.isna(name) else str(name) for name in filenames]
+    ranks = [None] * len(filenames) if ranks is None else [None if pd.isna(r) else int(r) for r in ranks]
+    table = pa.table({
+        'filename': pa.array(filenames, pa.string()),
+        'metric': pa.array([metric] * len(filenames), pa.string()),
+        'score': pa.array([float(s) for s in scores], pa.float64()),
+        'rank': pa.array(ranks, pa.int32()),
+    }, schema=SCORE_SCHEMA)
+
+    directory = _partition_dir(root, experiment, model_type)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{metric}.parquet")
+    # 以"."开头的临时文件会被数据集读取忽略，写完后原子替换
+    tmp_path = os.path.join(directory, f".{metric}.parquet.tmp")
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def open_dataset(root):
+    """
+    打开结果数据集
+
+    Returns:
+        pyarrow.dataset.Dataset
+    """
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"结果数据集不存在: {root}")
+    schema = pa.unify_schemas([SCORE_SCHEMA, PARTITION_SCHEMA])
+    return ds.dataset(root, schema=schema, format='parquet',
+                      partitioning=ds.partitioning(PARTITION_SCHEMA, flavor='hive'))
+
+
+def read_scores(root, columns=None, metrics=None, experiments=None, model_types=None):
+    """
+    读取分数，只读取需要的列，过滤条件下推到数据集扫描
+
+    Args:
+        root: 数据集根目录
+        columns: 需要的列（默认全部: filename, metric, score, rank, experiment, model_type）
+        metrics: 只读取这些指标
+        experiments: 只读取这些实验
+        model_types: 只读取这些模型类型
+
+    Returns:
+        长表DataFrame
+    """
+    conditions = []
+    if metrics is not None:
+        conditions.append(ds.field('metric').isin(list(metrics)))
+    if experiments is not None:
+        conditions.append(ds.field('experiment').isin([str(e) for e in experiments]))
+    if model_types is not None:
+        conditions.append(ds.field('model_type').isin([int(t) for t in model_types]))
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return open_dataset(root).to_table(columns=columns, filter=expression).to_pandas()
+
+
+def mean_by_type(scores, metrics):
+    """
+    按模型类型计算各指标的平均分
+
+    Args:
+        scores: read_scores返回的长表（至少包含model_type、metric、score列）
+        metrics: 指标顺序
+
+    Returns:
+        行为模型类型、列为指标的DataFrame
+    """
+    means = scores.pivot_table(index='model_type', columns='metric', values='score', aggfunc='mean')
+    return means.reindex(columns=list(metrics))
+
+
+def export_excel(root, output_path, experiment, metrics=None):
+    """
+    将一个实验的结果导出为Excel：每个指标一个工作表（列为 序号、类型、文件名、X得分），另加按类型的平均分
+
+    Args:
+        root: 数据集根目录
+        output_path: 输出的.xlsx路径
+        experiment: 实验名称
+        metrics: 导出的指标，默认全部
+    """
+    scores = read_scores(root, columns=['model_type', 'filename', 'metric', 'score', 'rank'],
+                         metrics=metrics, experiments=[experiment])
+    metric_names = list(metrics) if metrics else sorted(scores['metric'].unique())
+
+    with pd.ExcelWriter(output_path) as writer:
+        for metric in metric_names:
+            sheet = scores[scores['metric'] == metric].sort_values(['model_type', 'rank', 'filename'])
+            sheet = sheet.rename(columns={'rank': '序号', 'model_type': '类型', 'filename': '文件名',
+                                          'score': METRIC_COLUMNS.get(metric, metric)})
+            sheet = sheet.drop(columns='metric')[['序号', '类型', '文件名', METRIC_COLUMNS.get(metric, metric)]]
+            sheet.to_excel(writer, sheet_name=metric, index=False)
+        summary = mean_by_type(scores, metric_names).rename(columns=METRIC_COLUMNS)
+        summary.index.name = '类型'
+        summary.reset_index().to_excel(writer, sheet_name='summary', index=False)
+    print(f"结果已导出到: {output_path}")
+
+
+def import_excel(excel_path, root, experiment, metric):
+    """
+    将原来手工整理的Excel（列为 序号、类型、文件名、X得分）导入数据集，用于迁移已有结果
+
+    Args:
+        excel_path: Excel文件路径
+        root: 数据集根目录
+        experiment: 实验名称
+        metric: 指标名称（决定读取哪一列得分，见METRIC_COLUMNS）
+    """
+    df = pd.read_excel(excel_path)
+    score_column = METRIC_COLUMNS.get(metric, metric)
+    for model_type, group in df.groupby('类型'):
+        filenames = group['文件名'] if '文件名' in group else [None] * len(group)
+        ranks = group['序号'] if '序号' in group else None
+        write_scores(root, experiment, model_type, metric, filenames, group[score_column], ranks)
+    print(f"已导入 {excel_path} -> {root}")
@@ -6,12 +6,9 @@ date   : 2025-09
 """
 
 # -------------------- 用户配置区（按需要改） --------------------
-FILE_PATH      = r"E:/2025-09-08/5.2/Class/2-1_HPSv2_Score.xlsx"         # 1. 你的 Excel 文件
-SHEET_NAME     = 0                     # 0 表示第一个工作表，也可写表名
-COL_ID         = "序号"                # 原始列名
-COL_TYPE       = "类型"
-COL_FILE       = "文件名"
-COL_SCORE      = "HPSv2得分"
+RESULTS_DIR    = r"E:/2025-09-08/Results"   # 1. 结果数据集目录（Calculate_Score/Results_dataset.py）
+EXPERIMENT     = "5.2"                      # 实验名称
+METRIC         = "hpsv2"                    # 绘制的指标
 
 # 3. 5 组 HEX 颜色（按类型 1~5 对位）
 HEX_COLORS = ['#FF7043', '#0077BB', '#CC3311', '#33BBEE', '#EE3377']
@@ -34,10 +31,18 @@ MEAN_LINE_WIDTH = 1.8
 # 图片保存
 SAVE_NAME = "HPSv2_scatter.png"
 # -------------------------------------------------------------
-import pandas as pd
+import os
+import sys
+
 import matplotlib.pyplot as plt
 import numpy as np
 
+# 将Evaluate目录加入搜索路径，以便导入Calculate_Score中的公共模块
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
+
+from Calculate_Score.Results_dataset import read_scores
 
 
 def hex_to_rgb(hex_str):
@@ -46,14 +51,9 @@ def hex_to_rgb(hex_str):
 
 
 def main():
-    # 1. 读 Excel
-    df = pd.read_excel(FILE_PATH, sheet_name=SHEET_NAME)
-    df = df.rename(columns={
-        COL_ID: "id",
-        COL_TYPE: "type",
-        COL_FILE: "file",
-        COL_SCORE: "score"
-    })
+    # 1. 读结果数据集（只读类型与分数两列，按实验与指标过滤）
+    df = read_scores(RESULTS_DIR, columns=["model_type", "score"], metrics=[METRIC], experiments=[EXPERIMENT])
+    df = df.rename(columns={"model_type": "type"})
 
     # 2. 按类型分组
     type_groups = {i: grp for i, grp in df.groupby("type")}
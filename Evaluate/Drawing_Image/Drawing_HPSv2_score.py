@@ -1,10 +1,17 @@
 import os
+import sys
 import hpsv2
 import torch
 from PIL import Image
 import numpy as np
 from torchvision import transforms
-import pandas as pd
+
+# 将Evaluate目录加入搜索路径，以便导入Calculate_Score中的公共模块
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
+
+from Calculate_Score.Results_dataset import write_scores, export_excel
 
 # 将 127.0.0.1:7890 替换为你自己的代理地址和端口
 os.environ["HTTP_PROXY"] = "http://127.0.0.1:7897"
@@ -21,9 +28,9 @@ def convert_rgba_to_rgb(image: Image) -> Image.Image:
         return image.convert('RGB')
     return image
 
-def evaluate_images_with_hpsv2(image_paths: str,output_filename: str,file_type: int):
+def evaluate_images_with_hpsv2(image_paths: str, results_dir: str, experiment: str, file_type: int):
     """
-    使用HPSv2评估图像
+    使用HPSv2评估图像，分数写入结果数据集（results_dir/experiment=.../model_type=.../hpsv2.parquet）
 
     """
     # 定义文本提示词，描述了期望生成的图像内容
@@ -81,22 +88,12 @@ def evaluate_images_with_hpsv2(image_paths: str,output_filename: str,file_type:
         Total_Score += float(result[3])
     print(f"Ave_Score = {Total_Score/len(Results)}")
 
-    """
-        将HPSv2得分列表转换为指定格式的Excel文件
-         
-        参数:
-        data_list: 原始数据列表，格式为[(序号, 文件名, HPSv2得分), ...]
-        output_filename: 输出的Excel文件名
-        file_type: 要添加到"类型"列的手动指定内容
-        """
-
-    # 创建DataFrame并添加新列
-    df = pd.DataFrame(Results, columns=['序号', '类型', '文件名', 'HPSv2得分'])
-
-    # 保存为Excel文件
-    df.to_excel(output_filename, index=False)
-    print(f"文件已保存为: {output_filename}")
-
+    # 写入结果数据集（同一实验、类型的旧结果会被覆盖），"类型"作为分区
+    path = write_scores(results_dir, experiment, file_type, 'hpsv2',
+                        filenames=[result[2] for result in Results],
+                        scores=[float(result[3]) for result in Results],
+                        ranks=[result[0] for result in Results])
+    print(f"结果已写入: {path}")
 
 
 def main():
@@ -111,20 +108,18 @@ def main():
         "E:/2025-09-08/5.2/Class/2-5_R128A64_LoRA_v0.5",
     ]
 
-    # 输出的Excel文件名
-    output_filenames = [
-        "E:/2025-09-08/5.2/Class/2-1_HPSv2_Score.xlsx",
-        "E:/2025-09-08/5.2/Class/2-2_HPSv2_Score.xlsx",
-        "E:/2025-09-08/5.2/Class/2-3_HPSv2_Score.xlsx",
-        "E:/2025-09-08/5.2/Class/2-4_HPSv2_Score.xlsx",
-        "E:/2025-09-08/5.2/Class/2-5_HPSv2_Score.xlsx",
-    ]
+    # 结果数据集目录与实验名称
+    results_dir = "E:/2025-09-08/Results"
+    experiment = "5.2"
 
     # "类型"
     file_types = [1,2,3,4,5]
 
     for index in range(len(image_paths)):
-        evaluate_images_with_hpsv2(image_paths[index], output_filenames[index],file_types[index])
+        evaluate_images_with_hpsv2(image_paths[index], results_dir, experiment, file_types[index])
+
+    # 需要Excel时再导出（可选）
+    # export_excel(results_dir, "E:/2025-09-08/5.2/Class/HPSv2_Score.xlsx", experiment, metrics=['hpsv2'])
 
 
 if __name__ == "__main__":
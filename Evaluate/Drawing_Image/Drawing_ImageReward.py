@@ -1,33 +1,45 @@
-import pandas as pd
+import os
+import sys
+
 import matplotlib.pyplot as plt
 import numpy as np
 
+# 将Evaluate目录加入搜索路径，以便导入Calculate_Score中的公共模块
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
+
+from Calculate_Score.Results_dataset import read_scores, mean_by_type
+
+# 柱状图对应的指标（顺序与颜色、图例一致）
+SCORE_METRICS = ['fid', 'hpsv2', 'imagereward']
+
 # 彻底解决中文显示问题 - 方法一：全局设置字体
 plt.rcParams['font.family'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans']  # 使用支持中文的字体
 plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示为方块的问题
 
 
-def read_and_process_data(file_paths, comprehensive_file_path=None):
+def read_and_process_data(results_dir, experiment, with_comprehensive=True):
     """
-    读取多个Excel文件并合并为一个DataFrame，可选读取综合得分文件
+    从结果数据集读取一个实验的各项得分（只读取类型、指标、分数三列），可选读取综合得分
 
     Parameters:
-    file_paths (list): 本地Excel文件路径列表
-    comprehensive_file_path (str): 综合得分Excel文件路径（可选）
+    results_dir (str): 结果数据集目录
+    experiment (str): 实验名称
+    with_comprehensive (bool): 是否读取综合得分
 
     Returns:
-    pd.DataFrame: 合并后的数据
-    pd.DataFrame: 综合得分数据（如果提供了路径）
+    pd.DataFrame: 各项得分的长表（model_type, metric, score）
+    pd.DataFrame: 综合得分数据（如果需要）
     """
-    # 读取所有Excel文件
-    dfs = [pd.read_excel(file) for file in file_paths]
-    # 合并数据
-    combined_df = pd.concat(dfs, ignore_index=True)
+    combined_df = read_scores(results_dir, columns=['model_type', 'metric', 'score'],
+                              metrics=SCORE_METRICS, experiments=[experiment])
 
-    # 如果提供了综合得分文件路径，读取它
+    # 如果需要综合得分，按指标过滤读取
     comprehensive_df = None
-    if comprehensive_file_path:
-        comprehensive_df = pd.read_excel(comprehensive_file_path)
+    if with_comprehensive:
+        comprehensive_df = read_scores(results_dir, columns=['model_type', 'score'],
+                                       metrics=['comprehensive'], experiments=[experiment])
 
     return combined_df, comprehensive_df
 
@@ -37,22 +49,20 @@ def calculate_mean_scores(df, comprehensive_df=None):
     按类型分组计算每种得分的平均值
 
     Parameters:
-    df (pd.DataFrame): 合并后的数据
+    df (pd.DataFrame): 各项得分的长表
     comprehensive_df (pd.DataFrame): 综合得分数据（可选）
 
     Returns:
     pd.DataFrame: 包含分组平均值的DataFrame
     pd.Series: 综合得分的平均值（如果提供了数据）
     """
-    # 原有得分列
-    score_columns = ['FID得分', 'HPSv2得分', 'ImageReward得分']
-    # 按类型分组并计算平均值
-    grouped_means = df.groupby('类型')[score_columns].mean()
+    # 按类型分组并计算平均值，列顺序与SCORE_METRICS一致
+    grouped_means = mean_by_type(df, SCORE_METRICS)
 
     # 如果有综合得分数据，也计算其平均值
     comprehensive_means = None
     if comprehensive_df is not None:
-        comprehensive_means = comprehensive_df.groupby('类型')['综合得分'].mean()
+        comprehensive_means = comprehensive_df.groupby('model_type')['score'].mean()
 
     return grouped_means, comprehensive_means
 
@@ -151,19 +161,15 @@ def create_custom_bar_line_chart(means, comprehensive_means, hex_colors, line_co
 
 
 def main():
-    # 1. 定义文件路径（请根据实际文件路径修改）
-    file_paths = [
-        'E:/2025-09-08/5.2/Class/Done/2-0_FID_Score.xlsx',
-        'E:/2025-09-08/5.2/Class/Done/2-1_HPSv2_Score.xlsx',
-        'E:/2025-09-08/5.2/Class/Done/2-1_ImageReward_Score.xlsx'
-    ]
-
-    # 综合得分文件路径（请根据实际路径修改）
-    comprehensive_file_path = 'E:/2025-09-08/5.2/Class/Done/2-2_Comprehensive_Score.xlsx'
+    # 1. 结果数据集目录与实验名称（请根据实际路径修改）
+    # 已有的Excel结果可用 Results_dataset.import_excel 导入一次，如:
+    # import_excel('E:/2025-09-08/5.2/Class/Done/2-2_Comprehensive_Score.xlsx', results_dir, '5.2', 'comprehensive')
+    results_dir = 'E:/2025-09-08/Results'
+    experiment = '5.2'
 
     try:
         # 2. 读取和处理数据
-        combined_data, comprehensive_data = read_and_process_data(file_paths, comprehensive_file_path)
+        combined_data, comprehensive_data = read_and_process_data(results_dir, experiment)
 
         # 3. 计算分组平均值
         means, comprehensive_means = calculate_mean_scores(combined_data, comprehensive_data)
@@ -215,10 +221,10 @@ def main():
 
     except FileNotFoundError as e:
         print(f"文件未找到: {e}")
-        print("提示：请确保所有文件路径正确，包括综合得分文件")
+        print("提示：请确保结果数据集目录正确")
     except KeyError as e:
         print(f"数据列名错误: {e}")
-        print("提示：请确保Excel文件中包含'类型'和'综合得分'列")
+        print("提示：请确保结果数据集中包含综合得分（comprehensive）")
     except Exception as e:
         print(f"程序执行出错: {e}")
 
@@ -1,16 +1,25 @@
 import os
+import sys
 import torch
 import ImageReward as RM  # 导入ImageReward库，用于评估图像-文本匹配度
-import pandas as pd
 
+# 将Evaluate目录加入搜索路径，以便导入Calculate_Score中的公共模块
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
 
+from Calculate_Score.Results_dataset import write_scores, export_excel
 
-def evaluate_images_with_ImageReward(image_paths: str,output_filename: str,file_type: int):
+
+def evaluate_images_with_ImageReward(image_paths: str, results_dir: str, experiment: str, file_type: int):
+    """
+    使用ImageReward评估图像，分数写入结果数据集（results_dir/experiment=.../model_type=.../imagereward.parquet）
+    """
     # 定义文本提示词，描述了期望生成的图像内容
     prompt = "This is a high-resolution photo of a tugboat sailing across calm turquoise waters. The vessel is predominantly white with green and red accents, and has a sturdy rectangular hull. The green deck is equipped with various equipment, including large black rubber fenders along the waterline, which may be used for collision protection. The tugboat's superstructure includes a bridge with windows, radar equipment, and a red and white antenna mast. The bridge is operated by a crew member, but he is not visible in the photo. The water is calm, with gentle ripples indicating movement. There is no sky in the image, and the focus is entirely on the ship and its surroundings."
 
     # 设置图像文件所在的目录路径
-    img_prefix_dir = "E:/2025-09-08/5.2/Class/2-1_R8A4_LoRA_v0.1"
+    img_prefix_dir = image_paths
 
     # 检查文件夹是否存在
     if not os.path.exists(img_prefix_dir):
@@ -46,11 +55,13 @@ def evaluate_images_with_ImageReward(image_paths: str,output_filename: str,file_
         print(f"ranking = {ranking}")  # 输出排名结果
         print(f"rewards = {rewards}")  # 输出奖励分数
 
-        # 遍历每张图像，单独计算并显示其分数
+        # rewards与img_list顺序一致，就是每张图像的分数，不需要再逐张调用model.score重复打分
+        # （只有一张图像时inference_rank返回的是标量）
+        if not isinstance(ranking, list):
+            ranking, rewards = [ranking], [rewards]
         Score = list()
         for index in range(len(img_list)):
-            # 计算单张图像与提示词的匹配分数
-            score = model.score(prompt, img_list[index])
+            score = rewards[index]
             # 格式化输出：图像文件名右对齐16个字符，分数保留2位小数
             # print(f"{filename_globle[index]:>16s}: {score:.4f}")
             Score.append([ranking[index],file_type,filename_globle[index],f"{score:.4f}"])
@@ -64,21 +75,12 @@ def evaluate_images_with_ImageReward(image_paths: str,output_filename: str,file_
             Total_Score += float(score[3])
         print(f"Ave_Score = {Total_Score / len(Score)}")
 
-        """
-                将ImageReward得分列表转换为指定格式的Excel文件
-
-                参数:
-                data_list: 原始数据列表，格式为[(序号, 文件名, HPSv2得分), ...]
-                output_filename: 输出的Excel文件名
-                file_type: 要添加到"类型"列的手动指定内容
-                """
-
-        # 创建DataFrame并添加新列
-        df = pd.DataFrame(Score, columns=['序号', '类型', '文件名', 'ImageReward得分'])
-
-        # 保存为Excel文件
-        df.to_excel(output_filename, index=False)
-        print(f"文件已保存为: {output_filename}")
+        # 写入结果数据集（同一实验、类型的旧结果会被覆盖），"类型"作为分区
+        path = write_scores(results_dir, experiment, file_type, 'imagereward',
+                            filenames=[score[2] for score in Score],
+                            scores=[float(score[3]) for score in Score],
+                            ranks=[score[0] for score in Score])
+        print(f"结果已写入: {path}")
 
 def main():
     # 加载本地图像地址
@@ -91,20 +93,18 @@ def main():
         "E:/2025-09-08/5.2/Class/2-5_R128A64_LoRA_v0.5",
     ]
 
-    # 输出的Excel文件名
-    output_filenames = [
-        "E:/2025-09-08/5.2/Class/2-1_ImageReward_Score.xlsx",
-        "E:/2025-09-08/5.2/Class/2-2_ImageReward_Score.xlsx",
-        "E:/2025-09-08/5.2/Class/2-3_ImageReward_Score.xlsx",
-        "E:/2025-09-08/5.2/Class/2-4_ImageReward_Score.xlsx",
-        "E:/2025-09-08/5.2/Class/2-5_ImageReward_Score.xlsx",
-    ]
+    # 结果数据集目录与实验名称
+    results_dir = "E:/2025-09-08/Results"
+    experiment = "5.2"
 
     # "类型"
     file_types = [1, 2, 3, 4, 5]
 
     for index in range(len(image_paths)):
-        evaluate_images_with_ImageReward(image_paths[index], output_filenames[index], file_types[index])
+        evaluate_images_with_ImageReward(image_paths[index], results_dir, experiment, file_types[index])
+
+    # 需要Excel时再导出（可选）
+    # export_excel(results_dir, "E:/2025-09-08/5.2/Class/ImageReward_Score.xlsx", experiment, metrics=['imagereward'])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
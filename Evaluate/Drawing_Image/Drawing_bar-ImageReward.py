@@ -1,41 +1,52 @@
-import pandas as pd
+import os
+import sys
+
 import matplotlib.pyplot as plt
 import numpy as np
 
+# 将Evaluate目录加入搜索路径，以便导入Calculate_Score中的公共模块
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
+
+from Calculate_Score.Results_dataset import read_scores, mean_by_type
+
+# 柱状图对应的指标（顺序与颜色、图例一致）
+SCORE_METRICS = ['fid', 'hpsv2', 'imagereward']
+
 # 彻底解决中文显示问题 - 方法一：全局设置字体
 plt.rcParams['font.family'] = ['SimHei', 'Microsoft YaHei', 'DejaVu Sans']  # 使用支持中文的字体
 plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示为方块的问题
 
 
-def read_and_process_data(file_paths):
+def read_and_process_data(results_dir, experiment):
     """
-    读取多个Excel文件并合并为一个DataFrame
+    从结果数据集读取一个实验的各项得分（只读取类型、指标、分数三列）
 
     Parameters:
-    file_paths (list): 本地Excel文件路径列表
+    results_dir (str): 结果数据集目录
+    experiment (str): 实验名称
 
     Returns:
-    pd.DataFrame: 合并后的数据
+    pd.DataFrame: 长表数据（model_type, metric, score）
     """
-    # 读取所有Excel文件
-    dfs = [pd.read_excel(file) for file in file_paths]
-    # 合并数据
-    combined_df = pd.concat(dfs, ignore_index=True)
-    return combined_df
+    return read_scores(results_dir, columns=['model_type', 'metric', 'score'],
+                       metrics=SCORE_METRICS, experiments=[experiment])
 
 
-def read_comprehensive_score(file_path):
+def read_comprehensive_score(results_dir, experiment):
     """
-    读取综合得分Excel文件
+    从结果数据集读取综合得分
 
     Parameters:
-    file_path (str): 综合得分文件路径
+    results_dir (str): 结果数据集目录
+    experiment (str): 实验名称
 
     Returns:
-    pd.DataFrame: 综合得分数据
+    pd.DataFrame: 综合得分数据（model_type, score）
     """
-    df = pd.read_excel(file_path)
-    return df
+    return read_scores(results_dir, columns=['model_type', 'score'],
+                       metrics=['comprehensive'], experiments=[experiment])
 
 
 def calculate_mean_scores(df):
@@ -43,15 +54,13 @@ def calculate_mean_scores(df):
     按类型分组计算每种得分的平均值
 
     Parameters:
-    df (pd.DataFrame): 合并后的数据
+    df (pd.DataFrame): 各项得分的长表
 
     Returns:
     pd.DataFrame: 包含分组平均值的DataFrame
     """
-    # 假设得分列名为'得分1', '得分2', '得分3'，请根据实际数据修改
-    score_columns = ['FID得分', 'HPSv2得分', 'ImageReward得分']
-    # 按类型分组并计算平均值
-    grouped_means = df.groupby('类型')[score_columns].mean()
+    # 按类型分组并计算平均值，列顺序与SCORE_METRICS一致
+    grouped_means = mean_by_type(df, SCORE_METRICS)
 
     return grouped_means
 
@@ -67,7 +76,7 @@ def calculate_comprehensive_mean(df):
     pd.Series: 分组后的综合得分平均值
     """
     # 按类型分组并计算综合得分的平均值
-    comprehensive_mean = df.groupby('类型')['综合得分'].mean()
+    comprehensive_mean = df.groupby('model_type')['score'].mean()
     return comprehensive_mean
 
 
@@ -160,22 +169,18 @@ def create_bar_chart_with_line(means, comprehensive_scores, hex_colors, line_col
 
 
 def main():
-    # 1. 定义文件路径（请根据实际文件路径修改）
-    score_file_paths = [
-        'E:/2025-09-08/5.2/Class/Done/2-0_FID_Score.xlsx',
-        'E:/2025-09-08/5.2/Class/Done/2-1_HPSv2_Score.xlsx',
-        'E:/2025-09-08/5.2/Class/Done/2-1_ImageReward_Score.xlsx'
-    ]
-
-    # 综合得分文件路径（请根据实际路径修改）
-    comprehensive_file_path = 'E:/2025-09-08/5.2/Class/Done/2-2_Comprehensive_Score.xlsx'
+    # 1. 结果数据集目录与实验名称（请根据实际路径修改）
+    # 已有的Excel结果可用 Results_dataset.import_excel 导入一次，如:
+    # import_excel('E:/2025-09-08/5.2/Class/Done/2-2_Comprehensive_Score.xlsx', results_dir, '5.2', 'comprehensive')
+    results_dir = 'E:/2025-09-08/Results'
+    experiment = '5.2'
 
     try:
         # 2. 读取和处理原有得分数据
-        combined_data = read_and_process_data(score_file_paths)
+        combined_data = read_and_process_data(results_dir, experiment)
 
         # 3. 读取综合得分数据
-        comprehensive_data = read_comprehensive_score(comprehensive_file_path)
+        comprehensive_data = read_comprehensive_score(results_dir, experiment)
 
         # 4. 计算分组平均值
         means = calculate_mean_scores(combined_data)
@@ -237,7 +242,7 @@ def main():
         print("请检查文件路径是否正确")
     except KeyError as e:
         print(f"数据列名错误: {e}")
-        print("请检查Excel文件中的列名是否正确")
+        print("请检查结果数据集中的列名是否正确")
     except Exception as e:
         print(f"程序执行出错: {e}")
 
@@ -1,27 +1,15 @@
-import torch
-import torchvision
-import torchvision.transforms as transforms
-from pytorch_fid import fid_score
+from FID_Engine import FIDEvaluator
+from FID_Cache import DEFAULT_CACHE_DIR
 
 # 准备真实数据分布和生成模型的图像数据
 real_images_folder = "E:/2025-09-08/5.2/Resource"
 # generated_images_folder = './FID_app3'
 generated_images_folder = "E:/2025-09-08/5.3/3-5_Fullmodel"
 
-# 加载预训练的Inception-v3模型`
-inception_model = torchvision.models.inception_v3(pretrained=True)
-
-# 定义图像变换
-transform = transforms.Compose([
-    transforms.Resize(299),
-    transforms.CenterCrop(299),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
-])
+# 加载pytorch_fid的Inception-v3特征提取器
+# 真实图像集的均值/协方差写入磁盘缓存，图像内容不变时后续运行只需提取生成图像的特征
+evaluator = FIDEvaluator(dims=192, batch_size=50, num_workers=0, cache_dir=DEFAULT_CACHE_DIR)
 
 # 计算FID距离值
-# fid_value = fid_score.calculate_fid_given_paths([real_images_folder, generated_images_folder],
-#                                                  inception_model,
-#                                                  transform=transform)
-fid_value = fid_score.calculate_fid_given_paths([real_images_folder, generated_images_folder],batch_size=50, device='cuda', dims=192, num_workers=0)
-print('FID value:', fid_value)
+fid_result = evaluator.calculate_fid(real_images_folder, generated_images_folder)
+print('FID value:', fid_result.fid)
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+# 将Evaluate目录加入搜索路径，以便导入Image_handle中的公共模块
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
+
+from Image_handle.File_hash import file_sha256, file_signature
+
+# 缓存格式版本，修改特征提取方式时递增，使旧缓存自动失效
+CACHE_VERSION = 1
+
+# 默认缓存目录
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "fid_stats")
+
+
+class ActivationStatsCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        """
+        参考集激活统计量(均值/协方差)的磁盘缓存
+
+        缓存键由文件列表、每个文件的大小/修改时间/内容哈希以及dims共同决定，
+        任何一张图像被增删或修改都会得到新的键，旧条目自然失效。
+
+        Args:
+            cache_dir: 缓存目录
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_keys(self, files, dims_list):
+        """
+        计算一组图像在多个dims下的缓存键（文件哈希只计算一次）
+
+        Args:
+            files: 图像路径列表
+            dims_list: Inception特征维度列表
+
+        Returns:
+            {dims: 十六进制缓存键}
+        """
+        files_digest = hashlib.sha256()
+        files_digest.update(f"n={len(files)}".encode("utf-8"))
+        for file_path in files:
+            size, mtime_ns = file_signature(file_path)
+            entry = f"|{os.path.basename(file_path)}:{size}:{mtime_ns}:{file_sha256(file_path)}"
+            files_digest.update(entry.encode("utf-8"))
+        files_hex = files_digest.hexdigest()
+
+        return {dims: hashlib.sha256(f"fid-stats-v{CACHE_VERSION}|dims={dims}|{files_hex}".encode("utf-8")).hexdigest()
+                for dims in dims_list}
+
+    def make_key(self, files, dims):
+        """
+        计算一组图像在指定dims下的缓存键
+
+        Args:
+            files: 图像路径列表
+            dims: Inception特征维度
+
+        Returns:
+            十六进制缓存键
+        """
+        return self.make_keys(files, [dims])[dims]
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def load(self, key):
+        """
+        读取缓存条目
+
+        Returns:
+            (mu, sigma, 图像数量)，未命中时返回None
+        """
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                return data["mu"], data["sigma"], int(data["count"])
+        except Exception as e:
+            print(f"FID缓存读取失败，将重新计算: {e}")
+            return None
+
+    def save(self, key, mu, sigma, count, source=""):
+        """
+        写入缓存条目（先写临时文件再原子替换，避免中断后留下损坏的缓存）
+
+        Args:
+            key: 缓存键
+            mu: 激活均值
+            sigma: 激活协方差
+            count: 图像数量
+            source: 来源说明（一般为文件夹路径），仅用于人工排查
+        """
+        path = self._entry_path(key)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, mu=mu, sigma=sigma, count=count,
+                 meta=json.dumps({"source": source, "version": CACHE_VERSION}))
+        os.replace(tmp_path, path)
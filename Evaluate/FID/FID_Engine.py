@@ -0,0 +1,287 @@
+import os
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Union
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+from torchvision import transforms
+from pytorch_fid.inception import InceptionV3
+from pytorch_fid.fid_score import calculate_frechet_distance, IMAGE_EXTENSIONS
+
+# 将Evaluate目录加入搜索路径，以便以 FID.xxx 的形式导入同目录模块
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
+
+from FID.FID_Cache import ActivationStatsCache
+
+
+@dataclass
+class FIDResult:
+    """一次FID计算的结构化结果"""
+    fid: float              # FID分数，越低越好
+    dims: int               # 使用的Inception特征维度
+    real_count: int         # 参与计算的真实图像数量
+    generated_count: int    # 参与计算的生成图像数量
+
+
+# Inception的全部4个特征抽取点
+ALL_DIMS = tuple(sorted(InceptionV3.BLOCK_INDEX_BY_DIM))
+
+
+def list_fid_images(folder: str) -> List[str]:
+    """
+    列出文件夹中参与FID计算的图像（与 python -m pytorch_fid 的文件筛选规则一致）
+
+    Args:
+        folder: 图像文件夹路径
+
+    Returns:
+        排序后的图像路径列表
+    """
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                  if os.path.splitext(f)[1][1:] in IMAGE_EXTENSIONS)
+
+
+class FIDImageDataset(torch.utils.data.Dataset):
+    """按路径读取图像的数据集，预处理方式与pytorch_fid保持一致"""
+
+    def __init__(self, files):
+        self.files = files
+        self.transform = transforms.ToTensor()
+
+    def __len__(self):
+        return len(self.files)
+
+    def __getitem__(self, index):
+        with Image.open(self.files[index]) as img:
+            return self.transform(img.convert('RGB'))
+
+
+def collate_fid_batch(tensors: List[torch.Tensor]) -> torch.Tensor:
+    """
+    合并一个batch的图像tensor
+
+    尺寸不一致时先逐张双线性缩放到299x299，与InceptionV3内部的resize完全相同，
+    因此不会改变特征结果，只是允许不同分辨率的图像放进同一个batch。
+    """
+    if all(t.shape == tensors[0].shape for t in tensors):
+        return torch.stack(tensors, dim=0)
+    resized = [F.interpolate(t.unsqueeze(0), size=(299, 299), mode='bilinear', align_corners=False)
+               for t in tensors]
+    return torch.cat(resized, dim=0)
+
+
+class FIDEvaluator:
+    def __init__(self, dims=192, device=None, batch_size=50, num_workers=0, cache_dir=None):
+        """
+        初始化FID评估器，Inception特征提取器只加载一次，可重复用于多次FID计算
+
+        Args:
+            dims: 特征维度，可为单个值，也可为多个值的列表（或"all"表示全部4个），
+                  多个值时在同一次前向传播中同时抽取各层特征
+                  - 64: 第一个最大池化层特征（最适合极小数据集）少于100张图
+                  - 192: 第二个最大池化层特征（推荐小数据集使用）100-500张图
+                  - 768: 预辅助分类器特征 500-2000
+                  - 2048: 标准最终池化特征（需要大数据集） 2000张以上
+            device: 计算设备，默认自动选择
+            batch_size: 特征提取的批大小
+            num_workers: 读取文件夹图像时DataLoader的工作进程数
+            cache_dir: 激活统计量缓存目录，为None时不使用缓存；
+                       启用后文件夹输入（如参考集）的统计量只在内容变化时重新计算
+        """
+        if dims == "all":
+            dims = ALL_DIMS
+        dims_list = sorted(set(dims)) if isinstance(dims, (list, tuple, set)) else [dims]
+        for d in dims_list:
+            if d not in InceptionV3.BLOCK_INDEX_BY_DIM:
+                raise ValueError(f"不支持的特征维度 dims={d}，可选值: {list(ALL_DIMS)}")
+
+        self.device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.dims_list = dims_list
+        self.dims = dims_list[0]
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+
+        # InceptionV3按block序号升序返回特征，dims与block序号的顺序一致
+        block_indices = [InceptionV3.BLOCK_INDEX_BY_DIM[d] for d in dims_list]
+        self.model = InceptionV3(block_indices).to(self.device)
+        self.model.eval()
+
+        self.to_tensor = transforms.ToTensor()
+        self.cache = ActivationStatsCache(cache_dir) if cache_dir else None
+
+    def image_to_tensor(self, image: Union[str, Image.Image, np.ndarray, torch.Tensor]) -> torch.Tensor:
+        """
+        将单张图像转换为[3, H, W]、取值[0, 1]的tensor
+
+        Args:
+            image: 图像路径、PIL Image、numpy array(HWC, uint8)或torch tensor(CHW, [0, 1])
+
+        Returns:
+            图像tensor
+        """
+        if isinstance(image, torch.Tensor):
+            if image.dim() == 4:  # batch dimension
+                image = image.squeeze(0)
+            return image.float()
+
+        if isinstance(image, str):
+            with Image.open(image) as img:
+                return self.to_tensor(img.convert('RGB'))
+
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        return self.to_tensor(image.convert('RGB'))
+
+    def _forward(self, batch: torch.Tensor) -> List[np.ndarray]:
+        """对一个batch提取各个dims的特征，非1x1输出时做全局平均池化"""
+        with torch.no_grad():
+            preds = self.model(batch.to(self.device))
+
+        outputs = []
+        for pred in preds:
+            if pred.size(2) != 1 or pred.size(3) != 1:
+                pred = F.adaptive_avg_pool2d(pred, output_size=(1, 1))
+            outputs.append(pred.squeeze(3).squeeze(2).cpu().numpy())
+        return outputs
+
+    def _iter_batches(self, images):
+        """按batch产出图像tensor：文件夹/路径列表走DataLoader，内存图像直接分批"""
+        if isinstance(images, str):
+            images = list_fid_images(images)
+
+        if isinstance(images, torch.Tensor) and images.dim() == 4:
+            for i in range(0, images.shape[0], self.batch_size):
+                yield images[i:i + self.batch_size].float()
+            return
+
+        if all(isinstance(img, str) for img in images):
+            loader = torch.utils.data.DataLoader(FIDImageDataset(images),
+                                                 batch_size=self.batch_size,
+                                                 shuffle=False,
+                                                 drop_last=False,
+                                                 num_workers=self.num_workers,
+                                                 collate_fn=collate_fid_batch)
+            yield from loader
+            return
+
+        for i in range(0, len(images), self.batch_size):
+            yield collate_fid_batch([self.image_to_tensor(img) for img in images[i:i + self.batch_size]])
+
+    def get_activations_multi(self, images) -> Dict[int, np.ndarray]:
+        """
+        一次前向传播提取所有已配置dims的Inception激活特征
+
+        Args:
+            images: 图像文件夹路径、图像路径列表、内存图像列表或[N, 3, H, W]的tensor
+
+        Returns:
+            {dims: [N, dims]的特征矩阵}
+        """
+        batches = [self._forward(batch) for batch in self._iter_batches(images)]
+        if not batches:
+            return {d: np.empty((0, d)) for d in self.dims_list}
+        return {d: np.concatenate([outputs[i] for outputs in batches], axis=0)
+                for i, d in enumerate(self.dims_list)}
+
+    def get_activations(self, images) -> np.ndarray:
+        """
+        提取Inception激活特征（多dims时返回最小dims的特征）
+
+        Args:
+            images: 图像文件夹路径、图像路径列表、内存图像列表或[N, 3, H, W]的tensor
+
+        Returns:
+            [N, dims]的特征矩阵
+        """
+        return self.get_activations_multi(images)[self.dims]
+
+    def compute_statistics_multi(self, images):
+        """
+        计算每个dims下激活特征的均值与协方差，文件夹输入在启用缓存时优先读取缓存
+        （缓存按dims分别存储，只有全部dims都命中时才跳过特征提取）
+
+        Returns:
+            ({dims: (mu, sigma)}, 图像数量)
+        """
+        cache_keys = None
+        if self.cache is not None and isinstance(images, str):
+            folder = images
+            images = list_fid_images(folder)
+            cache_keys = self.cache.make_keys(images, self.dims_list)
+            cached = {d: self.cache.load(key) for d, key in cache_keys.items()}
+            if all(entry is not None for entry in cached.values()):
+                count = cached[self.dims][2]
+                return {d: (entry[0], entry[1]) for d, entry in cached.items()}, count
+
+        acts = self.get_activations_multi(images)
+        count = acts[self.dims].shape[0]
+        if count < 2:
+            raise ValueError(f"FID至少需要2张图像，当前只有 {count} 张")
+
+        stats = {}
+        for d, act in acts.items():
+            mu, sigma = np.mean(act, axis=0), np.cov(act, rowvar=False)
+            stats[d] = (mu, sigma)
+            if cache_keys is not None:
+                self.cache.save(cache_keys[d], mu, sigma, count, source=folder)
+
+        return stats, count
+
+    def compute_statistics(self, images):
+        """
+        计算激活特征的均值与协方差（多dims时返回最小dims的统计量）
+
+        Returns:
+            (mu, sigma, 图像数量)
+        """
+        stats, count = self.compute_statistics_multi(images)
+        mu, sigma = stats[self.dims]
+        return mu, sigma, count
+
+    def calculate_fid_multi(self, real_images, generated_images) -> Dict[int, FIDResult]:
+        """
+        一次特征提取，计算所有已配置dims下的FID（用于小样本的dims敏感性分析）
+
+        Args:
+            real_images: 真实图像（文件夹路径、路径列表或内存图像）
+            generated_images: 生成图像（文件夹路径、路径列表或内存图像）
+
+        Returns:
+            {dims: FIDResult}，某个dims无法计算时其fid为NaN
+        """
+        real_stats, real_count = self.compute_statistics_multi(real_images)
+        gen_stats, gen_count = self.compute_statistics_multi(generated_images)
+
+        results = {}
+        for d in self.dims_list:
+            mu1, sigma1 = real_stats[d]
+            mu2, sigma2 = gen_stats[d]
+            try:
+                fid_value = calculate_frechet_distance(mu1, sigma1, mu2, sigma2)
+            except ValueError as e:
+                # 样本数少于特征维度时协方差矩阵奇异，高维结果可能无法计算；只记为NaN，不影响其他dims
+                if len(self.dims_list) == 1:
+                    raise
+                print(f"dims={d} 的FID计算失败，记为NaN: {e}")
+                fid_value = float('nan')
+            results[d] = FIDResult(fid=float(fid_value), dims=d,
+                                   real_count=real_count, generated_count=gen_count)
+        return results
+
+    def calculate_fid(self, real_images, generated_images) -> FIDResult:
+        """
+        计算两组图像之间的FID（多dims时返回最小dims的结果）
+
+        Args:
+            real_images: 真实图像（文件夹路径、路径列表或内存图像）
+            generated_images: 生成图像（文件夹路径、路径列表或内存图像）
+
+        Returns:
+            FIDResult
+        """
+        return self.calculate_fid_multi(real_images, generated_images)[self.dims]
@@ -1,5 +1,36 @@
+import math
 import os
-import subprocess
+from functools import lru_cache
+
+from FID_Engine import FIDEvaluator, ALL_DIMS
+from FID_Cache import DEFAULT_CACHE_DIR
+
+
+@lru_cache(maxsize=None)
+def get_fid_evaluator(dims=192):
+    """按特征维度缓存FID评估器，避免每次计算都重新加载Inception模型；参考集统计量写入磁盘缓存"""
+    return FIDEvaluator(dims=dims, cache_dir=DEFAULT_CACHE_DIR)
+
+
+def calculate_fid_all_dims(real_path, generated_path):
+    """
+    在一次Inception前向传播中同时计算64/192/768/2048四种维度的FID，
+    用于观察小样本下FID对特征维度的敏感性
+
+    Args:
+        real_path: 真实图像文件夹路径
+        generated_path: 生成图像文件夹路径
+
+    Returns:
+        {dims: FID分数}（某个dims无法计算时为NaN），失败时返回None
+    """
+    try:
+        results = get_fid_evaluator(ALL_DIMS).calculate_fid_multi(real_path, generated_path)
+    except Exception as e:
+        print("Error:", e)
+        return None
+
+    return {dims: result.fid for dims, result in results.items()}
 
 
 def calculate_fid_small_dataset(real_path, generated_path, dims=192):
@@ -19,26 +50,22 @@ def calculate_fid_small_dataset(real_path, generated_path, dims=192):
     Returns:
         FID分数
     """
-    cmd = [
-        'python', '-m', 'pytorch_fid',
-        real_path,
-        generated_path,
-        '--dims', str(dims),
-        '--device', 'cuda:0'
-    ]
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
-
-    if "FID:" in result.stdout:
-        fid_score = float(result.stdout.split("FID:  ")[0])
-        return fid_score
-    else:
-        print("Error:", result.stderr)
+    try:
+        result = get_fid_evaluator(dims).calculate_fid(real_path, generated_path)
+    except Exception as e:
+        print("Error:", e)
         return None
 
+    return result.fid
 
-def main():
-    """完整的FID计算流程"""
+
+def main(show_sensitivity=False):
+    """
+    完整的FID计算流程
+
+    Args:
+        show_sensitivity: 是否同时输出64/192/768/2048全部维度的FID（需要运行完整的Inception网络）
+    """
 
     # 设置路径
     real_images_path = "D:/ProgramData/Experiment/resource"
@@ -73,13 +100,21 @@ def main():
         dims = 768
         print("Using dims=768 for medium dataset")
 
-    # 计算FID
     print("\nCalculating FID score...")
-    fid_score = calculate_fid_small_dataset(
-        real_images_path,
-        generated_images_path,
-        dims=dims
-    )
+    if not show_sensitivity:
+        # 只计算选定的维度，Inception网络只运行到该维度所需的层
+        fid_score = calculate_fid_small_dataset(real_images_path, generated_images_path, dims=dims)
+    else:
+        # 一次前向传播同时得到全部维度的结果
+        fid_scores = calculate_fid_all_dims(real_images_path, generated_images_path)
+        fid_score = None
+        if fid_scores is not None:
+            print("\nFID sensitivity table:")
+            for feature_dims, score in fid_scores.items():
+                marker = "  <- selected" if feature_dims == dims else ""
+                print(f"  dims={feature_dims:<5d} FID = {score:.4f}{marker}")
+            if not math.isnan(fid_scores[dims]):
+                fid_score = fid_scores[dims]
 
     if fid_score is not None:
         print(f"\n✓ FID Score: {fid_score}")
@@ -89,4 +124,6 @@ def main():
 
 # 如果直接运行此脚本
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+    # 观察小样本下FID对特征维度的敏感性
+    # main(show_sensitivity=True)
\ No newline at end of file
@@ -1,25 +1,273 @@
 import os
-import hpsv2
+import sys
+from typing import Iterator, List, Tuple, Union
+
+import huggingface_hub
 import torch
 from PIL import Image
 import numpy as np
-from torchvision import transforms
+from hpsv2.src.open_clip import create_model_and_transforms, get_tokenizer
+
+# 将Evaluate目录加入搜索路径，以便导入Image_handle中的公共模块
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
+
+from Image_handle.Image_loader import ImageLoader, iter_images, load_rgb_image
+from Image_handle.Image_cache import PreprocessedImageCache
+from Image_handle.Score_store import ScoreStore, score_incremental, score_incremental_pairs
+from Image_handle.Caption_dataset import CLIP_CONTEXT_LENGTH, CaptionDataset, iter_caption_batches
+from HPSv2.HPSv2_Cache import PromptEmbeddingCache, DEFAULT_CACHE_DIR
+from Inference.Inference_mode import InferenceMode
+from Inference.Quantization import quantize_dynamic_int8
+
+# HPSv2各版本对应的权重文件
+HPS_VERSION_MAP = {
+    "v2.0": "HPS_v2_compressed.pt",
+    "v2.1": "HPS_v2.1_compressed.pt",
+}
+
+# 预处理方式标记（长边缩放到224后补边），作为结果库指标版本的一部分；预处理变化后旧分数不再命中
+PREPROCESS_TAG = "resize-max-224-pad"
+
+
+def store_version(hps_version):
+    """结果库（ScoreStore）中HPSv2的指标版本：权重版本 + 权重文件 + 预处理方式"""
+    return f"{hps_version}:{HPS_VERSION_MAP[hps_version]}:{PREPROCESS_TAG}"
+
+
+class HPSv2Evaluator:
+    def __init__(self, hps_version="v2.1", checkpoint=None, device=None, batch_size=16,
+                 cache_dir=DEFAULT_CACHE_DIR, fast_inference=False, compile_model=False, quantize=None):
+        """
+        初始化HPSv2评估器：模型与权重只加载一次，提示词的文本特征按提示词缓存
+
+        hpsv2.score每次调用都会重新读取权重、重新编码提示词；这里文本塔对每个提示词只运行一次，
+        之后每张图像只需经过图像塔，打分为归一化图像特征与文本特征的内积（与hpsv2.score一致）
+
+        Args:
+            hps_version: 权重版本，"v2.0" 或 "v2.1"
+            checkpoint: 本地权重路径，默认从HuggingFace下载
+            device: 计算设备，默认自动选择
+            batch_size: 图像塔的批大小
+            cache_dir: 提示词特征的磁盘缓存目录，为None时只缓存在内存中
+            fast_inference: 图像塔启用快速推理（CPU上bfloat16 autocast + channels_last），
+                            使用前建议用Inference_mode.check_fast_inference在校准集上检查误差
+            compile_model: 快速推理时是否用torch.compile编译图像塔
+            quantize: 为'dynamic'时对图像塔做动态int8量化（仅CPU，每次加载时直接量化），
+                      可用Inference_mode.check_scores对比fp32结果
+        """
+        if hps_version not in HPS_VERSION_MAP:
+            raise ValueError(f"不支持的HPSv2版本: {hps_version}，可选值: {list(HPS_VERSION_MAP)}")
+
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.batch_size = batch_size
+
+        # 权重会完整覆盖模型参数，因此不需要再下载open_clip的预训练权重
+        self.model, _, self.preprocess = create_model_and_transforms(
+            'ViT-H-14', None, precision='amp', device=self.device, jit=False,
+            force_quick_gelu=False, force_custom_text=False, force_patch_dropout=False,
+            force_image_size=None, pretrained_image=False, image_mean=None, image_std=None,
+            light_augmentation=True, aug_cfg={}, output_dict=True,
+            with_score_predictor=False, with_region_predictor=False)
+
+        checkpoint = checkpoint or huggingface_hub.hf_hub_download("xswu/HPSv2", HPS_VERSION_MAP[hps_version])
+        state_dict = torch.load(checkpoint, map_location=self.device)
+        self.model.load_state_dict(state_dict['state_dict'])
+        self.model = self.model.to(self.device)
+        self.model.eval()
+
+        # 文本特征会被缓存，始终以默认精度计算；快速推理与量化只作用于图像塔
+        self.inference = InferenceMode(self.device, fast=fast_inference, compile_model=compile_model)
+        if quantize:
+            if quantize != 'dynamic':
+                raise ValueError("HPSv2图像塔（ViT）只支持dynamic量化")
+            if self.inference.device.type != 'cpu':
+                raise ValueError("int8量化只支持在CPU上运行")
+            if fast_inference:
+                raise ValueError("quantize与fast_inference不能同时启用")
+            self.model.visual = quantize_dynamic_int8(self.model.visual)
+        else:
+            self.model.visual = self.inference.prepare_model(self.model.visual)
+
+        self.tokenizer = get_tokenizer('ViT-H-14')
+
+        # 命名空间包含版本与权重文件大小，更换权重后旧的文本特征自动失效
+        namespace = f"hpsv2-{hps_version}-{os.path.basename(checkpoint)}-{os.path.getsize(checkpoint)}"
+        self.prompt_cache = PromptEmbeddingCache(namespace, cache_dir)
+
+    def _autocast(self):
+        # 与hpsv2.score一致，GPU上使用混合精度
+        return torch.autocast(device_type='cuda', enabled=str(self.device).startswith('cuda'))
+
+    def _encode_prompt(self, prompt):
+        text = self.tokenizer([prompt]).to(device=self.device, non_blocking=True)
+        with torch.no_grad(), self._autocast():
+            text_features = self.model.encode_text(text, normalize=True)
+        return text_features[0].float().cpu().numpy()
+
+    def encode_prompt(self, prompt) -> torch.Tensor:
+        """
+        获取提示词的归一化文本特征（优先读取缓存）
+
+        Returns:
+            [D]的tensor
+        """
+        embedding = self.prompt_cache.get_or_create(prompt, self._encode_prompt)
+        return torch.from_numpy(embedding).to(self.device)
+
+    def preprocess_image(self, image):
+        """
+        将单张图像转换为模型输入tensor（RGBA图像以白色背景合成）
+
+        self.preprocess与hpsv2.score相同（light_augmentation）：长边缩放到224、其余部分补零，不裁剪边缘，
+        因此输入应为原始分辨率的图像，不能先做短边缩放+中心裁剪
+
+        Args:
+            image: PIL Image、numpy array(HWC, uint8)、图像路径，或已经预处理过的[3, 224, 224] tensor（直接返回）
+
+        Returns:
+            [3, 224, 224]的tensor
+        """
+        if isinstance(image, torch.Tensor):
+            return image
+        return self.preprocess(load_rgb_image(image))
+
+    def score_batch(self, prompt, images) -> np.ndarray:
+        """
+        批量计算一组图像与提示词的HPSv2分数
+
+        Args:
+            prompt: 文本提示词
+            images: 图像列表（PIL Image、numpy array或路径）
+
+        Returns:
+            与images顺序一致的[N]分数数组
+        """
+        text_features = self.encode_prompt(prompt)
+        features = self.encode_images(images)
+        if features is None:
+            return np.empty(0)
+        # 内积在autocast之外以fp32计算
+        return (features @ text_features.float()).cpu().numpy()
+
+    def encode_images(self, images):
+        """
+        分批计算图像的归一化特征
 
+        Returns:
+            [N, D]的fp32 tensor，images为空时返回None
+        """
+        features = []
+        with self.inference.context():
+            for i in range(0, len(images), self.batch_size):
+                batch = torch.stack([self.preprocess_image(img) for img in images[i:i + self.batch_size]])
+                batch = self.inference.prepare_input(batch.to(device=self.device, non_blocking=True))
+                with self._autocast():
+                    features.append(self.model.encode_image(batch, normalize=True).float())
+        return torch.cat(features) if features else None
 
-# 将 127.0.0.1:7890 替换为你自己的代理地址和端口
-os.environ["HTTP_PROXY"] = "http://127.0.0.1:7897"
-os.environ["HTTPS_PROXY"] = "http://127.0.0.1:7897"
+    def score_pairs(self, prompts, images) -> np.ndarray:
+        """
+        按每张图像各自的提示词（描述文本）计算HPSv2分数，每个不同的提示词只编码一次
+
+        Args:
+            prompts: 与images一一对应的提示词
+            images: 图像列表（PIL Image、numpy array或路径）
+
+        Returns:
+            与images顺序一致的[N]分数数组
+        """
+        if len(prompts) != len(images):
+            raise ValueError(f"提示词数量({len(prompts)})与图像数量({len(images)})不一致")
+        features = self.encode_images(images)
+        if features is None:
+            return np.empty(0)
+
+        # 提示词 -> 在text_features中的行号
+        positions = {prompt: i for i, prompt in enumerate(dict.fromkeys(prompts))}
+        text_features = torch.stack([self.encode_prompt(prompt).float() for prompt in positions])
+        index = torch.tensor([positions[prompt] for prompt in prompts], device=features.device)
+        return (features * text_features[index]).sum(dim=1).cpu().numpy()
+
+    def score(self, image, prompt) -> float:
+        """
+        计算单张图像的HPSv2分数
+
+        Returns:
+            分数
+        """
+        return float(self.score_batch(prompt, [image])[0])
+
+    def _iter_prepared(self, images, workers, prefetch, cache):
+        """
+        按输入顺序产出 (索引, 路径或None, 图像或None)
+
+        全部为路径时由后台线程解码为原始分辨率的RGB数组（缩放与补边由self.preprocess完成），可使用磁盘缓存；
+        其余输入在主线程读取
+        """
+        if all(isinstance(img, str) for img in images):
+            with ImageLoader(workers=workers, prefetch=prefetch, cache=cache) as loader:
+                for index, path, array, error in loader.iter_images(images):
+                    if array is None:
+                        print(f"处理图像失败: {path} ({error})")
+                    yield index, path, array
+            return
+
+        for index, img in enumerate(images):
+            path = img if isinstance(img, str) else None
+            try:
+                yield index, path, load_rgb_image(img)
+            except Exception as e:
+                print(f"处理图像失败: {e}")
+                yield index, path, None
+
+    def iter_scores(self, prompt, images: List[Union[str, Image.Image, np.ndarray]], workers: int = 4,
+                    prefetch: int = 64, cache=None) -> Iterator[Tuple[int, Union[str, None], float]]:
+        """
+        流式批量评估：后台线程预取并解码，按输入顺序逐张产出分数
+
+        内存中只保留预取队列和当前batch，可以处理任意大的文件夹；
+        读取失败的图像分数为NaN，索引与输入始终一一对应
+
+        Args:
+            prompt: 文本提示词
+            images: 图像列表（路径、PIL Image或numpy array）
+            workers: 解码线程数
+            prefetch: 最多提前解码的图像数量
+            cache: 可选的PreprocessedImageCache
+
+        Returns:
+            (索引, 路径或None, 分数) 的生成器
+        """
+        pending = []  # 当前batch中的 (索引, 路径, 图像或None)
+
+        def flush():
+            valid = [image for _, _, image in pending if image is not None]
+            batch_scores = iter(self.score_batch(prompt, valid).tolist() if valid else [])
+            for index, path, image in pending:
+                yield index, path, next(batch_scores) if image is not None else float('nan')
+            pending.clear()
+
+        ready = 0
+        for item in self._iter_prepared(images, workers, prefetch, cache):
+            pending.append(item)
+            ready += item[2] is not None
+            if ready == self.batch_size:
+                yield from flush()
+                ready = 0
+
+        yield from flush()
+
+    def evaluate_batch(self, prompt, images) -> List[float]:
+        """
+        批量评估图像
+
+        Returns:
+            与images一一对应的分数列表（处理失败的图像为NaN）
+        """
+        return [score for _, _, score in self.iter_scores(prompt, images)]
 
-def convert_rgba_to_rgb(image: Image) -> Image.Image:
-    """将RGBA图像转换为RGB"""
-    if image.mode == 'RGBA':
-        # 白色背景
-        background = Image.new('RGB', image.size, (255, 255, 255))
-        background.paste(image, mask=image.split()[3])
-        return background
-    elif image.mode != 'RGB':
-        return image.convert('RGB')
-    return image
 
 def evaluate_images_with_hpsv2():
     """
@@ -50,18 +298,39 @@ def evaluate_images_with_hpsv2():
             filename_globle.append(filename)
             img_list.append(os.path.join(image_paths, filename))
 
-    # 收集结果
-    Results = []
-    for filename in os.listdir(image_paths):
+    hps_version = "v2.1"
+    evaluator = None
+
+    def score_paths(paths):
+        """只对结果库中没有的图像解码并打分，读取失败的图像记为NaN"""
+        nonlocal evaluator
+        if evaluator is None:
+            # 加载模型（权重只读取一次，提示词特征会被缓存）；全部命中结果库时不加载
+            evaluator = HPSv2Evaluator(hps_version=hps_version)
 
-        # 加载图像
-        image_origin = Image.open(os.path.join(image_paths, filename))
-        # 转化图像为RGB
-        image = convert_rgba_to_rgb(image=image_origin)
+        # 后台线程并行解码并转换为RGB，与打分计算重叠进行
+        # 只解码不缩放：HPSv2的预处理是长边缩放+补边，由评估器完成；解码结果缓存到磁盘，重复运行时直接复用
+        scores = np.full(len(paths), np.nan)
+        images = []
+        valid_indices = []
+        for index, path, image_array, error in iter_images(paths, cache=PreprocessedImageCache()):
+            if image_array is None:
+                print(f"警告：无法读取图像 '{os.path.basename(path)}'，跳过 ({error})")
+                continue
+            images.append(Image.fromarray(image_array))
+            valid_indices.append(index)
 
-        # 计算分数
-        score = hpsv2.score(image, prompt, hps_version="v2.1")
-        Results.append([0,filename,f"{float(score[0]):.4f}"])
+        # 计算分数（文本塔只运行一次，图像分批经过图像塔）
+        if images:
+            scores[valid_indices] = evaluator.score_batch(prompt, images)
+        return scores
+
+    # 增量评估：结果按 (图像内容, 指标版本, 提示词) 保存在该文件夹对应的结果库中（用户缓存目录），只计算新增或变化的图像
+    with ScoreStore.for_folder(image_paths) as store:
+        scores = score_incremental(store, img_list, "HPSv2", store_version(hps_version),
+                                   score_paths, prompt=prompt)
+    Results = [[0, filename, f"{float(score):.4f}"] for filename, score in zip(filename_globle, scores)
+               if not np.isnan(score)]
 
     # 以评分内容为依据进行排序
     # Results.sort(key=lambda x: x[2], reverse=True)
@@ -75,8 +344,55 @@ def evaluate_images_with_hpsv2():
     print(f"Ave_Score = {Total_Score/len(Results)}")
 
 
+def evaluate_captioned_dataset(dataset_dir, groups=None, hps_version="v2.1"):
+    """
+    按每张图像自己的描述文本（同名.txt）评估，如训练集 Dataset/Work_Ship/5_Tugboat
+
+    Args:
+        dataset_dir: 图像-描述文本配对的文件夹
+        groups: 只评估这些类别（如 ['real1']），默认全部
+        hps_version: 权重版本
+
+    Returns:
+        (CaptionRecord列表, 与之一一对应的分数数组)
+    """
+    dataset = CaptionDataset(dataset_dir)
+    print(f"数据集: {dataset.summary()}")
+    records = dataset.select(groups)
+    dataset.warn_truncated(CLIP_CONTEXT_LENGTH, "HPSv2", records)
+    evaluator = None
+
+    def score_pairs(paths, captions):
+        """只对结果库中没有的图像解码并打分，每个不同的描述文本只编码一次"""
+        nonlocal evaluator
+        if evaluator is None:
+            evaluator = HPSv2Evaluator(hps_version=hps_version)
+        scores = np.full(len(paths), np.nan)
+        # 只解码不缩放，长边缩放+补边由评估器的预处理完成
+        for indices, images, texts in iter_caption_batches(paths, captions, batch_size=evaluator.batch_size,
+                                                           cache=PreprocessedImageCache()):
+            scores[indices] = evaluator.score_pairs(texts, [Image.fromarray(image) for image in images])
+        return scores
+
+    with ScoreStore.for_folder(dataset_dir) as store:
+        scores = score_incremental_pairs(store, [dataset.path(record) for record in records],
+                                         [record.caption for record in records], "HPSv2",
+                                         store_version(hps_version), score_pairs)
+
+    for group in sorted({record.group for record in records}):
+        group_scores = [score for record, score in zip(records, scores) if record.group == group]
+        print(f"{group or '-'}: {len(group_scores)} 张，平均分 {np.nanmean(group_scores):.4f}")
+    return records, scores
+
+
 def main():
     evaluate_images_with_hpsv2()
+    # 训练集按每张图像自己的描述文本评估
+    # evaluate_captioned_dataset("../../Dataset/Work_Ship/5_Tugboat")
 
 if __name__ == "__main__":
+    # 代理只在直接运行本脚本时设置，作为库导入（如Calculate_AllMetrics）时不修改进程的环境变量
+    # 将 127.0.0.1:7897 替换为你自己的代理地址和端口
+    os.environ["HTTP_PROXY"] = "http://127.0.0.1:7897"
+    os.environ["HTTPS_PROXY"] = "http://127.0.0.1:7897"
     main()
\ No newline at end of file
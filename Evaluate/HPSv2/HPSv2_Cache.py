@@ -0,0 +1,90 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+# 默认缓存目录
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "hpsv2_prompts")
+
+
+class PromptEmbeddingCache:
+    def __init__(self, namespace, cache_dir=DEFAULT_CACHE_DIR, max_entries=128):
+        """
+        提示词文本特征缓存：内存中按LRU保留最近使用的条目，同时持久化到磁盘
+
+        Args:
+            namespace: 命名空间（模型与权重版本），不同模型的特征互不混用
+            cache_dir: 磁盘缓存目录，为None时只使用内存缓存
+            max_entries: 内存中最多保留的提示词数量
+        """
+        self.namespace = namespace
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _key(self, prompt):
+        return hashlib.sha256(f"{self.namespace}|{prompt}".encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, prompt):
+        """
+        读取提示词的文本特征
+
+        Returns:
+            numpy数组，未命中时返回None
+        """
+        key = self._key(prompt)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        if not self.cache_dir:
+            return None
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            embedding = np.load(path)
+        except Exception as e:
+            print(f"提示词特征缓存读取失败，将重新计算: {e}")
+            return None
+        self._remember(key, embedding)
+        return embedding
+
+    def put(self, prompt, embedding):
+        """
+        写入提示词的文本特征（磁盘上先写临时文件再原子替换）
+        """
+        key = self._key(prompt)
+        embedding = np.asarray(embedding)
+        self._remember(key, embedding)
+
+        if self.cache_dir:
+            path = self._entry_path(key)
+            tmp_path = f"{path}.tmp.npy"
+            np.save(tmp_path, embedding)
+            os.replace(tmp_path, path)
+
+    def _remember(self, key, embedding):
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_create(self, prompt, create):
+        """
+        读取提示词特征，未命中时调用create(prompt)计算并写入缓存
+
+        Returns:
+            numpy数组
+        """
+        embedding = self.get(prompt)
+        if embedding is None:
+            embedding = np.asarray(create(prompt))
+            self.put(prompt, embedding)
+        return embedding
@@ -1,6 +1,24 @@
 import os
+import sys
+from dataclasses import dataclass
+from functools import partial
+from typing import List
+
+import numpy as np
 import torch
 import ImageReward as RM  # 导入ImageReward库，用于评估图像-文本匹配度
+from PIL import Image
+
+# 将Evaluate目录加入搜索路径，以便导入Image_handle中的公共模块
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
+
+from Image_handle.Image_loader import iter_images, resize_center_crop
+from Image_handle.Image_cache import PreprocessedImageCache
+from Image_handle.Score_store import ScoreStore, score_incremental, score_incremental_pairs
+from Image_handle.Caption_dataset import BLIP_CONTEXT_LENGTH, CaptionDataset, iter_caption_batches
+from Inference.Inference_mode import InferenceMode
 
 # 配置代理服务器信息
 proxies = {
@@ -8,6 +26,194 @@ proxies = {
     "https": "http://127.0.0.1:7897"   # 替换为你的本地代理地址和端口
 }
 
+
+@dataclass
+class ImageRewardRecord:
+    """单张图像的ImageReward评估结果"""
+    filename: str   # 图像文件名
+    score: float    # ImageReward分数，越高越符合人类偏好
+    rank: int       # 在本组图像中的名次（1为最好）
+
+
+class ImageRewardEvaluator:
+    def __init__(self, model_name="ImageReward-v1.0", device=None, batch_size=16,
+                 fast_inference=False, compile_model=False):
+        """
+        初始化ImageReward评估器，模型只加载一次
+
+        Args:
+            model_name: 模型名称或本地权重路径
+            device: 计算设备，默认自动选择
+            batch_size: 每次送入模型的图像数量
+            fast_inference: 启用快速推理（CPU上bfloat16 autocast + channels_last），
+                            使用前建议用Inference_mode.check_fast_inference在校准集上检查误差
+            compile_model: 快速推理时是否用torch.compile编译图像编码器
+        """
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = RM.load(model_name, device=self.device)
+        self.model.eval()
+        self.batch_size = batch_size
+
+        self.inference = InferenceMode(self.device, fast=fast_inference, compile_model=compile_model)
+        self.model.blip.visual_encoder = self.inference.prepare_model(self.model.blip.visual_encoder)
+
+        # 提示词只需分词一次：prompt -> (input_ids, attention_mask)
+        self._prompt_cache = {}
+
+    def encode_prompt(self, prompt):
+        """
+        对提示词分词（与ImageReward.score中的处理一致），结果按提示词缓存
+
+        Returns:
+            (input_ids, attention_mask)，形状均为[1, 35]
+        """
+        if prompt not in self._prompt_cache:
+            text_input = self.model.blip.tokenizer(prompt, padding='max_length', truncation=True,
+                                                   max_length=35, return_tensors="pt").to(self.device)
+            self._prompt_cache[prompt] = (text_input.input_ids, text_input.attention_mask)
+        return self._prompt_cache[prompt]
+
+    def preprocess(self, image):
+        """
+        将单张图像转换为模型输入tensor
+
+        Args:
+            image: PIL Image、numpy array(HWC, uint8)或图像路径
+
+        Returns:
+            [3, 224, 224]的tensor
+        """
+        if isinstance(image, str):
+            with Image.open(image) as img:
+                return self.model.preprocess(img)
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        return self.model.preprocess(image)
+
+    def score_batch(self, prompt, images) -> np.ndarray:
+        """
+        批量计算一组图像与提示词的ImageReward分数，每张图像只做一次前向传播
+
+        Args:
+            prompt: 文本提示词
+            images: 图像列表（PIL Image、numpy array或路径）
+
+        Returns:
+            与images顺序一致的[N]分数数组
+        """
+        return self.score_pairs([prompt] * len(images), images)
+
+    def score_pairs(self, prompts, images) -> np.ndarray:
+        """
+        按每张图像各自的提示词（描述文本）计算ImageReward分数，每个不同的提示词只分词一次
+
+        Args:
+            prompts: 与images一一对应的提示词
+            images: 图像列表（PIL Image、numpy array或路径）
+
+        Returns:
+            与images顺序一致的[N]分数数组
+        """
+        if len(prompts) != len(images):
+            raise ValueError(f"提示词数量({len(prompts)})与图像数量({len(images)})不一致")
+        blip = self.model.blip
+
+        rewards = []
+        with self.inference.context():
+            for i in range(0, len(images), self.batch_size):
+                batch = torch.stack([self.preprocess(img) for img in images[i:i + self.batch_size]]).to(self.device)
+                batch = self.inference.prepare_input(batch)
+                image_embeds = blip.visual_encoder(batch)
+                image_atts = torch.ones(image_embeds.size()[:-1], dtype=torch.long, device=self.device)
+
+                # 每张图像与自己的提示词做交叉注意力
+                text_inputs = [self.encode_prompt(prompt) for prompt in prompts[i:i + self.batch_size]]
+                input_ids = torch.cat([ids for ids, _ in text_inputs])
+                attention_mask = torch.cat([mask for _, mask in text_inputs])
+                text_output = blip.text_encoder(input_ids,
+                                                attention_mask=attention_mask,
+                                                encoder_hidden_states=image_embeds,
+                                                encoder_attention_mask=image_atts,
+                                                return_dict=True)
+                txt_features = text_output.last_hidden_state[:, 0, :].float()
+                reward = (self.model.mlp(txt_features) - self.model.mean) / self.model.std
+                rewards.append(reward.squeeze(1).float().cpu().numpy())
+
+        return np.concatenate(rewards) if rewards else np.empty(0)
+
+    def rank_images(self, prompt, images, filenames) -> List[ImageRewardRecord]:
+        """
+        计算分数并排名，返回文件名、分数、名次一一对应的结果
+
+        Args:
+            prompt: 文本提示词
+            images: 图像列表
+            filenames: 与images一一对应的文件名
+
+        Returns:
+            按名次排序的ImageRewardRecord列表
+        """
+        return rank_scores(self.score_batch(prompt, images), filenames)
+
+
+def rank_scores(scores, filenames) -> List[ImageRewardRecord]:
+    """
+    按分数从高到低排名
+
+    Args:
+        scores: [N]分数数组
+        filenames: 与scores一一对应的文件名
+
+    Returns:
+        按名次排序的ImageRewardRecord列表
+    """
+    scores = np.asarray(scores)
+    order = np.argsort(-scores, kind='stable')
+    return [ImageRewardRecord(filename=filenames[index], score=float(scores[index]), rank=rank + 1)
+            for rank, index in enumerate(order)]
+
+
+def evaluate_captioned_dataset(dataset_dir, groups=None, model_name="ImageReward-v1.0"):
+    """
+    按每张图像自己的描述文本（同名.txt）评估，如训练集 Dataset/Work_Ship/5_Tugboat
+
+    Args:
+        dataset_dir: 图像-描述文本配对的文件夹
+        groups: 只评估这些类别（如 ['real1']），默认全部
+        model_name: 模型名称或本地权重路径
+
+    Returns:
+        (CaptionRecord列表, 与之一一对应的分数数组)
+    """
+    dataset = CaptionDataset(dataset_dir)
+    print(f"数据集: {dataset.summary()}")
+    records = dataset.select(groups)
+    dataset.warn_truncated(BLIP_CONTEXT_LENGTH, "ImageReward", records)
+    evaluator = None
+
+    def score_pairs(paths, captions):
+        """只对结果库中没有的图像解码并打分，每个不同的描述文本只分词一次"""
+        nonlocal evaluator
+        if evaluator is None:
+            evaluator = ImageRewardEvaluator(model_name)
+        scores = np.full(len(paths), np.nan)
+        transform = partial(resize_center_crop, size=224)
+        for indices, images, texts in iter_caption_batches(paths, captions, batch_size=evaluator.batch_size,
+                                                           transform=transform, cache=PreprocessedImageCache()):
+            scores[indices] = evaluator.score_pairs(texts, [Image.fromarray(image) for image in images])
+        return scores
+
+    with ScoreStore.for_folder(dataset_dir) as store:
+        scores = score_incremental_pairs(store, [dataset.path(record) for record in records],
+                                         [record.caption for record in records], "ImageReward",
+                                         model_name, score_pairs)
+
+    for group in sorted({record.group for record in records}):
+        group_scores = [score for record, score in zip(records, scores) if record.group == group]
+        print(f"{group or '-'}: {len(group_scores)} 张，平均分 {np.nanmean(group_scores):.4f}")
+    return records, scores
+
+
 def main():
     # 定义文本提示词，描述了期望生成的图像内容
     prompt = "This is a high-resolution photo of a tugboat sailing across calm turquoise waters. The vessel is predominantly white with green and red accents, and has a sturdy rectangular hull. The green deck is equipped with various equipment, including large black rubber fenders along the waterline, which may be used for collision protection. The tugboat's superstructure includes a bridge with windows, radar equipment, and a red and white antenna mast. The bridge is operated by a crew member, but he is not visible in the photo. The water is calm, with gentle ripples indicating movement. There is no sky in the image, and the focus is entirely on the ship and its surroundings."
@@ -34,38 +240,52 @@ def main():
             img_list.append(os.path.join(img_prefix_dir, filename))
 
 
-    # 加载预训练的ImageReward模型（v1.0版本）
-    model = RM.load("ImageReward-v1.0")
-
-    # 使用torch.no_grad()禁用梯度计算，提高推理速度并节省内存
-    with torch.no_grad():
-        # 对所有图像进行排序和打分
-        # ranking: 图像质量排名（从好到差的索引列表）
-        # rewards: 每张图像对应的奖励分数列表
-        ranking, rewards = model.inference_rank(prompt, img_list)
-
-        # 打印评估结果
-        print("\nPreference predictions:\n")
-        print(f"ranking = {ranking}")  # 输出排名结果
-        print(f"rewards = {rewards}")  # 输出奖励分数
-
-        # 遍历每张图像，单独计算并显示其分数
-        Score = list()
-        for index in range(len(img_list)):
-            # 计算单张图像与提示词的匹配分数
-            score = model.score(prompt, img_list[index])
-            # 格式化输出：图像文件名右对齐16个字符，分数保留2位小数
-            # print(f"{filename_globle[index]:>16s}: {score:.4f}")
-            Score.append([ranking[index],filename_globle[index],f"{score:.4f}"])
-
-
-        # 按照每个内容的第0个位置进行排序 正序
-        Score.sort(key=lambda x:x[0], reverse=False)
-        Total_Score = 0
-        for score in Score:
-            print(f"ranking = {score}")
-            Total_Score += float(score[2])
-        print(f"Ave_Score = {Total_Score / len(Score)}")
+    model_name = "ImageReward-v1.0"
+    evaluator = None
+
+    def score_paths(paths):
+        """只对结果库中没有的图像解码并打分，读取失败的图像记为NaN"""
+        nonlocal evaluator
+        if evaluator is None:
+            # 加载预训练的ImageReward模型（v1.0版本）；全部命中结果库时不加载
+            evaluator = ImageRewardEvaluator(model_name)
+
+        # 并行解码图像（RGBA以白色背景合成），后续打分直接使用内存中的图像
+        # 预先做与ImageReward相同的224短边缩放+中心裁剪，结果缓存到磁盘
+        scores = np.full(len(paths), np.nan)
+        images = list()
+        valid_indices = list()
+        transform = partial(resize_center_crop, size=224)
+        for index, path, image_array, error in iter_images(paths, transform=transform, cache=PreprocessedImageCache()):
+            if image_array is None:
+                print(f"警告：无法读取图像 '{os.path.basename(path)}'，跳过 ({error})")
+                continue
+            images.append(Image.fromarray(image_array))
+            valid_indices.append(index)
+
+        # 批量打分（每张图像只经过一次模型）
+        if images:
+            scores[valid_indices] = evaluator.score_batch(prompt, images)
+        return scores
+
+    # 增量评估：结果按 (图像内容, 模型版本, 提示词) 保存在该文件夹对应的结果库中（用户缓存目录），只计算新增或变化的图像
+    with ScoreStore.for_folder(img_prefix_dir) as store:
+        scores = score_incremental(store, img_list, "ImageReward", model_name, score_paths, prompt=prompt)
+
+    # 排名（分数与文件名、名次一一对应）
+    valid = ~np.isnan(scores)
+    records = rank_scores(scores[valid], [name for name, ok in zip(filename_globle, valid) if ok])
+
+    # 打印评估结果
+    print("\nPreference predictions:\n")
+    Total_Score = 0
+    for record in records:
+        print(f"ranking = [{record.rank}, '{record.filename}', '{record.score:.4f}']")
+        Total_Score += record.score
+    print(f"Ave_Score = {Total_Score / len(records)}")
+
+    # 训练集按每张图像自己的描述文本评估
+    # evaluate_captioned_dataset("../../Dataset/Work_Ship/5_Tugboat")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+图像-描述文本配对数据集索引
+训练集（如 Dataset/Work_Ship/5_Tugboat）中每张图像都有同名的.txt描述文本。
+首次扫描时记录每对文件的内容哈希、图像尺寸、文件大小与描述文本的token数，保存为清单文件（默认在用户缓存目录，不在数据集文件夹中写入文件）；
+之后只对大小或修改时间变化的图像重新计算哈希与尺寸。
+评估时按批产出 (图像, 描述文本)，供HPSv2、ImageReward按每张图像自己的描述文本打分，
+每个不同的描述文本只编码一次（见各评估器的score_pairs）。
+描述文本超过文本编码器的上下文长度（CLIP 77、ImageReward 35个token）时只有开头部分参与打分，
+清单中记录会被截断的图像，评估前也会打印警告。
+"""
+
+import hashlib
+import json
+import os
+import re
+from dataclasses import asdict, dataclass
+
+from PIL import Image
+
+from Image_handle.File_hash import file_signature
+from Image_handle.Image_cache import content_hash
+from Image_handle.Image_loader import list_images, iter_images
+from Image_handle.Score_store import text_hash
+
+# 清单默认保存目录，文件名由数据集文件夹的绝对路径哈希得到
+DEFAULT_MANIFEST_DIR = os.path.join(os.path.expanduser("~"), ".cache", "caption_manifests")
+
+# 清单格式版本，修改记录字段时递增，使旧清单自动重建
+MANIFEST_VERSION = 1
+
+# CLIP文本编码器的上下文长度，超出部分会被截断（HPSv2）
+CLIP_CONTEXT_LENGTH = 77
+
+# ImageReward（BLIP）分词时的max_length，超出部分会被截断
+BLIP_CONTEXT_LENGTH = 35
+
+# 文件名中的类别，如 Tugboat_concept0-001.png -> concept0
+_GROUP_PATTERN = re.compile(r'_([A-Za-z]+\d*)-\d+$')
+
+
+def approx_token_count(text):
+    """
+    估算描述文本的CLIP token数：按单词与标点计数，再加上起止两个特殊token
+
+    CLIP的BPE会把少见单词拆成多个token，因此这是下限估计
+    """
+    return len(re.findall(r"[\w']+|[^\w\s]", text.lower())) + 2
+
+
+def caption_path(image_path):
+    """图像对应的描述文本路径（同名.txt）"""
+    return os.path.splitext(image_path)[0] + ".txt"
+
+
+def read_caption(path):
+    """读取描述文本（合并多余的空白）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return " ".join(f.read().split())
+
+
+@dataclass
+class CaptionRecord:
+    """一对图像与描述文本"""
+    image: str          # 图像文件名
+    caption: str        # 描述文本
+    group: str          # 文件名中的类别（如 concept0、real1），无法识别时为空
+    image_hash: str     # 图像内容哈希
+    caption_hash: str   # 描述文本哈希
+    width: int          # 图像宽度
+    height: int         # 图像高度
+    file_size: int      # 图像文件大小（字节）
+    mtime_ns: int       # 图像修改时间，与file_size一起判断图像是否变化
+    token_count: int    # 描述文本的token数
+
+
+class CaptionDataset:
+    def __init__(self, root, count_tokens=approx_token_count, save_manifest=True, manifest_dir=DEFAULT_MANIFEST_DIR):
+        """
+        扫描图像-描述文本配对数据集，已有清单时只重新计算变化的图像
+
+        Args:
+            root: 数据集文件夹
+            count_tokens: 计算描述文本token数的函数，可传入评估模型的分词器
+            save_manifest: 是否保存清单
+            manifest_dir: 清单保存目录
+        """
+        self.root = root
+        self.count_tokens = count_tokens
+        self.manifest_dir = manifest_dir
+        self.records = self._scan(self._load_manifest())
+        if save_manifest:
+            self._save_manifest()
+
+    @property
+    def manifest_path(self):
+        name = hashlib.sha256(os.path.abspath(self.root).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.manifest_dir, f"{name}.json")
+
+    @property
+    def tokenizer_name(self):
+        return getattr(self.count_tokens, "__qualname__", type(self.count_tokens).__qualname__)
+
+    def _load_manifest(self):
+        """读取已有清单，格式版本或分词方式不一致时返回空清单"""
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"清单读取失败，将重新扫描: {e}")
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION:
+            return {}
+        same_tokenizer = manifest.get('tokenizer') == self.tokenizer_name
+        records = {}
+        for item in manifest.get('records', []):
+            if not same_tokenizer:
+                item['token_count'] = None
+            records[item['image']] = item
+        return records
+
+    def _scan(self, previous):
+        filenames, paths = list_images(self.root)
+        records = []
+        for filename, path in zip(filenames, paths):
+            text_path = caption_path(path)
+            if not os.path.exists(text_path):
+                print(f"警告：图像 '{filename}' 没有对应的描述文本，跳过")
+                continue
+            caption = read_caption(text_path)
+            caption_digest = text_hash(caption)
+            size, mtime_ns = file_signature(path)
+
+            old = previous.get(filename)
+            if old and (old['file_size'], old['mtime_ns']) == (size, mtime_ns):
+                image_hash, width, height = old['image_hash'], old['width'], old['height']
+            else:
+                image_hash = content_hash(path)
+                with Image.open(path) as img:
+                    width, height = img.size
+
+            if old and old['caption_hash'] == caption_digest and old.get('token_count') is not None:
+                token_count = old['token_count']
+            else:
+                token_count = int(self.count_tokens(caption))
+
+            match = _GROUP_PATTERN.search(os.path.splitext(filename)[0])
+            records.append(CaptionRecord(
+                image=filename, caption=caption, group=match.group(1) if match else "",
+                image_hash=image_hash, caption_hash=caption_digest, width=width, height=height,
+                file_size=size, mtime_ns=mtime_ns, token_count=token_count))
+        return records
+
+    def _save_manifest(self):
+        # 同时记录各编码器会截断的图像，查看清单即可知道哪些描述文本没有被完整使用
+        truncated = {name: [record.image for record in self.truncated(length)]
+                     for name, length in (('clip', CLIP_CONTEXT_LENGTH), ('blip', BLIP_CONTEXT_LENGTH))}
+        manifest = {'version': MANIFEST_VERSION, 'root': os.path.abspath(self.root),
+                    'tokenizer': self.tokenizer_name, 'truncated': truncated,
+                    'records': [asdict(record) for record in self.records]}
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.manifest_path)
+
+    def __len__(self):
+        return len(self.records)
+
+    def select(self, groups=None):
+        """
+        按类别筛选记录
+
+        Args:
+            groups: 类别列表（如 ['real1']），为None时返回全部
+
+        Returns:
+            CaptionRecord列表
+        """
+        if groups is None:
+            return list(self.records)
+        return [record for record in self.records if record.group in groups]
+
+    def path(self, record):
+        """记录对应的图像完整路径"""
+        return os.path.join(self.root, record.image)
+
+    def truncated(self, context_length, records=None):
+        """
+        token数超过文本编码器上下文长度、打分时会被截断的记录
+
+        Args:
+            context_length: 上下文长度（CLIP_CONTEXT_LENGTH、BLIP_CONTEXT_LENGTH）
+            records: 只检查这些记录，默认全部
+
+        Returns:
+            CaptionRecord列表
+        """
+        records = self.records if records is None else records
+        return [record for record in records if record.token_count > context_length]
+
+    def warn_truncated(self, context_length, model_name, records=None):
+        """
+        打印会被截断的描述文本数量：截断后的文本只保留开头部分，分数不反映完整描述
+
+        Args:
+            context_length: 模型文本编码器的上下文长度
+            model_name: 打印用的模型名称
+            records: 只检查这些记录，默认全部
+
+        Returns:
+            被截断的记录数
+        """
+        truncated = self.truncated(context_length, records)
+        if truncated:
+            longest = max(truncated, key=lambda record: record.token_count)
+            print(f"警告：{len(truncated)} 条描述文本超过{model_name}的 {context_length} 个token，"
+                  f"超出部分在打分时被截断（最长 {longest.token_count} 个token: '{longest.image}'）")
+        return len(truncated)
+
+    def summary(self):
+        """
+        数据集统计：各类别数量、不同描述文本数量、token数分布、超出CLIP/BLIP上下文长度的描述文本数量
+
+        Returns:
+            dict
+        """
+        groups = {}
+        for record in self.records:
+            groups[record.group] = groups.get(record.group, 0) + 1
+        tokens = sorted(record.token_count for record in self.records)
+        return {
+            'pairs': len(self.records),
+            'groups': groups,
+            'unique_captions': len({record.caption_hash for record in self.records}),
+            'tokens_min': tokens[0] if tokens else 0,
+            'tokens_median': tokens[len(tokens) // 2] if tokens else 0,
+            'tokens_max': tokens[-1] if tokens else 0,
+            'over_clip_context': sum(1 for t in tokens if t > CLIP_CONTEXT_LENGTH),
+            'over_blip_context': sum(1 for t in tokens if t > BLIP_CONTEXT_LENGTH),
+        }
+
+    def iter_batches(self, batch_size=16, groups=None, transform=None, cache=None, workers=4):
+        """
+        按批产出 (记录, 图像, 描述文本)，图像在后台线程中并行解码
+
+        Args:
+            batch_size: 每批的数量
+            groups: 只使用这些类别（见select）
+            transform: 解码后的预处理（如 partial(resize_center_crop, size=224)）
+            cache: 可选的PreprocessedImageCache
+            workers: 解码线程数
+
+        Returns:
+            (CaptionRecord列表, 图像数组列表, 描述文本列表) 的生成器，读取失败的图像被跳过
+        """
+        records = self.select(groups)
+        for indices, images, captions in iter_caption_batches(
+                [self.path(record) for record in records], [record.caption for record in records],
+                batch_size=batch_size, transform=transform, cache=cache, workers=workers):
+            yield [records[i] for i in indices], images, captions
+
+
+def iter_caption_batches(paths, captions, batch_size=16, transform=None, cache=None, workers=4):
+    """
+    并行解码图像并与描述文本按批配对
+
+    Args:
+        paths: 图像路径列表
+        captions: 与paths一一对应的描述文本
+        batch_size: 每批的数量
+        transform: 解码后的预处理
+        cache: 可选的PreprocessedImageCache
+        workers: 解码线程数
+
+    Returns:
+        (输入序号列表, 图像数组列表, 描述文本列表) 的生成器，读取失败的图像被跳过
+    """
+    indices, images, texts = [], [], []
+    for index, path, image_array, error in iter_images(paths, workers=workers, transform=transform, cache=cache):
+        if image_array is None:
+            print(f"警告：无法读取图像 '{os.path.basename(path)}'，跳过 ({error})")
+            continue
+        indices.append(index)
+        images.append(image_array)
+        texts.append(captions[index])
+        if len(indices) == batch_size:
+            yield indices, images, texts
+            indices, images, texts = [], [], []
+    if indices:
+        yield indices, images, texts
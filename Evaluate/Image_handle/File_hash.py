@@ -0,0 +1,34 @@
+import hashlib
+import os
+
+
+def file_sha256(file_path, chunk_size=1 << 20):
+    """
+    计算文件内容的SHA256摘要（分块读取，避免一次性载入大文件）
+
+    参数:
+        file_path: 文件路径
+        chunk_size: 每次读取的字节数
+
+    返回:
+        十六进制摘要字符串
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_signature(file_path):
+    """
+    获取文件的 (大小, 修改时间ns)，用于快速判断文件是否变化
+
+    参数:
+        file_path: 文件路径
+
+    返回:
+        (size, mtime_ns)
+    """
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
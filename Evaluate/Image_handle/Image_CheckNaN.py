@@ -1,26 +1,245 @@
+#!/usr/bin/env python3
+"""
+图像数据检查
+找出会导致评估指标出错的文件:
+    truncated     文件被截断（生成或复制中断）
+    decode_error  无法解码
+    empty         尺寸为0
+    black         全黑图像（如被安全检查器替换的输出）
+    constant      所有像素值相同
+    nan / inf     浮点TIFF、EXR、.npy中包含NaN或Inf
+8位/16位整数图像不可能包含NaN，只检查截断与常数图像；浮点数据按原始dtype分块检查，不转换为float64。
+多个进程并行检查，结果写入JSON报告。
+
+用法示例:
+    python Image_CheckNaN.py --input E:/2025-09-08/5.3 --report E:/2025-09-08/5.3/check_report.json
+"""
+
+import argparse
+import json
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Optional
+
 import numpy as np
 from PIL import Image
 
+# 将Evaluate目录加入搜索路径，以便作为脚本直接运行
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
+
+from Image_handle.Image_header import walk_images
+from Image_handle.Image_loader import SUPPORTED_FORMATS
+
+# 检查的文件类型：常规图像 + 浮点输出
+CHECK_FORMATS = SUPPORTED_FORMATS + ('.tif', '.exr', '.npy')
+
+# 分块检查时每块的元素数量，限制临时数组的内存占用
+CHUNK_ELEMENTS = 1 << 22
+
+# 检查通过的状态
+STATUS_OK = 'ok'
+
+
+@dataclass
+class ImageCheck:
+    """单个文件的检查结果"""
+    path: str                        # 文件路径
+    status: str                      # ok / truncated / decode_error / empty / black / constant / nan / inf
+    detail: str = ""                 # 说明
+    shape: Optional[list] = None     # 数组形状
+    dtype: str = ""                  # 数组dtype
+    min: Optional[float] = None      # 最小值（忽略NaN）
+    max: Optional[float] = None      # 最大值（忽略NaN）
+
+
+def _load_exr(path):
+    # PIL不支持EXR，使用OpenCV读取（需在导入cv2前启用OpenEXR）
+    os.environ.setdefault("OPENCV_IO_ENABLE_OPENEXR", "1")
+    try:
+        import cv2
+    except ImportError:
+        raise RuntimeError("读取EXR需要安装opencv-python")
+    array = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if array is None:
+        raise RuntimeError("OpenCV无法读取该文件")
+    return array
+
+
+def check_array(array, ignore_alpha=True):
+    """
+    按原始dtype分块检查数组
+
+    Args:
+        array: [H, W]、[H, W, C]或任意形状的数组（可为内存映射）
+        ignore_alpha: 带alpha的图像（LA为2通道、RGBA为4通道）只检查颜色通道的常数/全黑情况
+
+    Returns:
+        (状态, 说明, 最小值, 最大值)
+    """
+    if array.size == 0:
+        return 'empty', "数组为空", None, None
+
+    is_float = np.issubdtype(array.dtype, np.floating)
+    values = array
+    if ignore_alpha and array.ndim == 3 and array.shape[-1] in (2, 4):
+        values = array[..., :array.shape[-1] - 1]
+    if values.ndim == 0:
+        values = values.reshape(1)
+    # 沿第一个维度切片（视图，不复制），每块约CHUNK_ELEMENTS个元素
+    rows_per_chunk = max(1, CHUNK_ELEMENTS // max(1, values[0].size))
+
+    low, high = None, None
+    nan_count = inf_count = 0
+    for start in range(0, values.shape[0], rows_per_chunk):
+        block = values[start:start + rows_per_chunk]
+        if is_float:
+            nan_mask = np.isnan(block)
+            nan_count += int(nan_mask.sum())
+            inf_count += int(np.isinf(block).sum())
+            if nan_mask.all():
+                continue
+            block_low, block_high = np.nanmin(block), np.nanmax(block)
+        else:
+            block_low, block_high = block.min(), block.max()
+        low = block_low if low is None else min(low, block_low)
+        high = block_high if high is None else max(high, block_high)
+
+    low = None if low is None else float(low)
+    high = None if high is None else float(high)
+    if nan_count:
+        return 'nan', f"{nan_count} 个NaN（共 {array.size} 个值）", low, high
+    if inf_count:
+        return 'inf', f"{inf_count} 个Inf（共 {array.size} 个值）", low, high
+    if low == high:
+        if high == 0:
+            return 'black', "全黑图像", low, high
+        return 'constant', f"所有像素值均为 {high:g}", low, high
+    return STATUS_OK, "", low, high
+
+
+def _pixel_array(img):
+    """
+    将PIL图像转换为按像素值检查的数组
+
+    调色板(P/PA)图像的数组是调色板索引而不是颜色（索引全为0的白色图像会被误判为全黑），
+    1位图像的数组为bool，因此先转换为L/RGB/RGBA
+    """
+    if img.mode == 'P':
+        img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    elif img.mode == 'PA':
+        img = img.convert('RGBA')
+    elif img.mode == '1':
+        img = img.convert('L')
+    return np.asarray(img)
+
+
+def check_file(path):
+    """
+    检查单个文件（在工作进程中执行）
+
+    Returns:
+        ImageCheck
+    """
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        if extension == '.npy':
+            array = np.load(path, mmap_mode='r')
+        elif extension == '.exr':
+            array = _load_exr(path)
+        else:
+            with Image.open(path) as img:
+                img.load()
+                array = _pixel_array(img)
+    except Exception as e:
+        # 任何解码异常（含DecompressionBombError、EOFError等）都只记录该文件，不能中断整个检查
+        message = str(e)
+        status = 'truncated' if 'truncated' in message or 'broken data stream' in message else 'decode_error'
+        return ImageCheck(path, status, f"{type(e).__name__}: {message}")
+
+    status, detail, low, high = check_array(array)
+    return ImageCheck(path, status, detail, list(array.shape), str(array.dtype), low, high)
+
+
 def Check_image(input_path):
-    # 打开图像
-    with Image.open(input_path) as img:
-        img_numpy = np.array(img).astype(float)
-        if np.isnan(img_numpy).any() or np.isinf(img).any():
-            return False
-        return True
-
-
-# 批量处理文件夹中的图片
-input_folder = "D:/ProgramData/Experiment/resource"
-
-
-# 遍历输入文件夹中的所有图片
-for filename in os.listdir(input_folder):
-    if filename.endswith(('.png', '.jpg', '.jpeg', '.bmp', '.webp')):  # 筛选图片格式
-        input_path = os.path.join(input_folder, filename)
-        result = Check_image(input_path)
-        if result == False:
-            print(f"{filename} 图像包含非法值，需替换或删除")
-        elif result == True:
-            print(f"{filename} 图像合法")
+    """
+    检查单张图像是否可用（保留原接口）
+
+    Returns:
+        合法返回True，否则返回False
+    """
+    return check_file(input_path).status == STATUS_OK
+
+
+def check_folder(input_folder, recursive=True, workers=None):
+    """
+    并行检查文件夹中的全部图像与浮点输出
+
+    Args:
+        input_folder: 文件夹路径
+        recursive: 是否递归子目录
+        workers: 进程数，默认CPU核数
+
+    Returns:
+        按路径排序的ImageCheck列表
+    """
+    paths = [path for path, _, _ in walk_images(input_folder, recursive, extensions=CHECK_FORMATS)]
+    workers = max(1, workers or os.cpu_count() or 1)
+    if not paths:
+        return []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(paths) // (workers * 8))
+        return list(executor.map(check_file, paths, chunksize=chunksize))
+
+
+def write_report(results, report_path, input_folder):
+    """
+    写入JSON报告：各状态数量、有问题的文件与全部结果
+
+    Returns:
+        报告dict
+    """
+    counts = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    report = {
+        'input': os.path.abspath(input_folder),
+        'checked': len(results),
+        'counts': counts,
+        'problems': [asdict(result) for result in results if result.status != STATUS_OK],
+        'results': [asdict(result) for result in results],
+    }
+    report_dir = os.path.dirname(os.path.abspath(report_path))
+    os.makedirs(report_dir, exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查图像中的截断、解码错误、全黑/常数图像以及NaN/Inf")
+    parser.add_argument('--input', required=True, help="要检查的文件夹")
+    parser.add_argument('--report', help="JSON报告路径（默认 <input>/check_report.json）")
+    parser.add_argument('--no-recursive', action='store_true', help="不检查子目录")
+    parser.add_argument('--workers', type=int, help="并行进程数（默认CPU核数）")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    results = check_folder(args.input, recursive=not args.no_recursive, workers=args.workers)
+    report_path = args.report or os.path.join(args.input, "check_report.json")
+    report = write_report(results, report_path, args.input)
+
+    for problem in report['problems']:
+        print(f"✗ [{problem['status']}] {problem['path']} {problem['detail']}")
+    print(f"检查 {report['checked']} 个文件，用时 {time.time() - start_time:.1f} 秒: {report['counts']}")
+    print(f"报告已保存到: {report_path}")
+    # 存在问题文件时返回非0，便于在批处理脚本中判断
+    sys.exit(1 if report['problems'] else 0)
+
+
+if __name__ == "__main__":
+    main()
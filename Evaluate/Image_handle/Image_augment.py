@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+数据增强（惰性虚拟变体）
+Horizontal_flip.py 会把每张图像的翻转版本写到磁盘，增强N倍就要N倍的存储与写入。
+这里只记录"源文件 + 增强步骤"，在数据加载器的工作线程/进程中解码源文件时才生成变体：
+    - 随机增强（裁剪位置、颜色扰动系数）在构建变体时由 (seed, 文件名, 配方, 副本序号) 确定，同一变体每次生成的结果相同
+    - 可选的PreprocessedImageCache按"源文件内容哈希 + 变体签名"缓存结果，总大小有上限（LRU淘汰）
+    - 描述文本沿用源图像的同名.txt
+需要真实文件的场景（如LoRA训练器）可以用export把选定的变体写到磁盘。
+
+配方写法: 步骤用 + 连接，如 flip、crop=0.85、jitter=0.2、resize=1024x768、flip+crop=0.9
+
+用法示例（Dataset/Work_Ship/5_Tugboat 扩充为原图 + 翻转 + 2份随机裁剪 + 2份翻转并颜色扰动，共6倍）:
+    python Image_augment.py --input ../../Dataset/Work_Ship/5_Tugboat --recipes flip crop=0.85 flip+jitter=0.2 --copies 2
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+from dataclasses import dataclass
+from functools import partial
+
+import numpy as np
+from PIL import Image
+
+# 将Evaluate目录加入搜索路径，以便作为脚本直接运行
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
+
+from Image_handle.Caption_dataset import caption_path, read_caption
+from Image_handle.Image_loader import decode_image, iter_images, list_images, resize_rgb
+
+# 随机参数保留的小数位数（使变体签名简短且稳定）
+_PARAM_DIGITS = 4
+
+
+# ---------------- 增强步骤（输入输出均为 [H, W, 3] 的uint8数组） ----------------
+
+def hflip(image):
+    """水平翻转"""
+    return np.ascontiguousarray(image[:, ::-1])
+
+
+def crop(image, scale=0.85, x=0.5, y=0.5):
+    """
+    裁剪出边长为原图scale倍的区域
+
+    Args:
+        scale: 裁剪区域与原图的边长比例
+        x, y: 裁剪区域在可移动范围内的相对位置（0为左/上，1为右/下）
+    """
+    h, w = image.shape[:2]
+    crop_w, crop_h = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+    left = int(round((w - crop_w) * x))
+    top = int(round((h - crop_h) * y))
+    return np.ascontiguousarray(image[top:top + crop_h, left:left + crop_w])
+
+
+def color_jitter(image, brightness=1.0, contrast=1.0, saturation=1.0):
+    """按给定系数调整亮度、对比度、饱和度（系数为1时不变）"""
+    result = image.astype(np.float32)
+    if brightness != 1.0:
+        result *= brightness
+    if contrast != 1.0:
+        mean = (result @ np.array([0.299, 0.587, 0.114], dtype=np.float32)).mean()
+        result = (result - mean) * contrast + mean
+    if saturation != 1.0:
+        gray = (result @ np.array([0.299, 0.587, 0.114], dtype=np.float32))[..., None]
+        result = (result - gray) * saturation + gray
+    return np.clip(result + 0.5, 0, 255).astype(np.uint8)
+
+
+def resize(image, width=1024, height=768):
+    """缩放到固定尺寸"""
+    return resize_rgb(image, (width, height), Image.BICUBIC)
+
+
+OPS = {
+    'hflip': hflip,
+    'crop': crop,
+    'color_jitter': color_jitter,
+    'resize': resize,
+}
+
+
+def apply_ops(image, ops=(), transform=None):
+    """
+    依次执行增强步骤，再执行评估所需的预处理（在加载器的工作线程/进程中执行）
+
+    Args:
+        image: 解码后的RGB数组
+        ops: ((步骤名, ((参数名, 值), ...)), ...)，纯数据，签名稳定、可被pickle
+        transform: 可选的后续预处理（如 partial(resize_center_crop, size=224)）
+    """
+    for name, params in ops:
+        image = OPS[name](image, **dict(params))
+    if transform is not None:
+        image = transform(image)
+    return image
+
+
+# ---------------- 配方与变体 ----------------
+
+def _seeded_random(*parts):
+    """由若干字段确定的随机数生成器（与进程、运行次数无关）"""
+    digest = hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def parse_recipe(recipe, rng):
+    """
+    把配方字符串解析为确定的增强步骤
+
+    Args:
+        recipe: 如 'flip'、'crop=0.85'、'jitter=0.2'、'resize=1024x768'、'flip+crop=0.9'
+        rng: 随机数生成器，用于确定裁剪位置、颜色扰动系数
+
+    Returns:
+        ops元组（见apply_ops）
+    """
+    ops = []
+    for item in recipe.split('+'):
+        name, _, value = item.strip().partition('=')
+        if name == 'flip':
+            ops.append(('hflip', ()))
+        elif name == 'crop':
+            scale = float(value) if value else 0.85
+            ops.append(('crop', (('scale', scale), ('x', round(rng.random(), _PARAM_DIGITS)),
+                                 ('y', round(rng.random(), _PARAM_DIGITS)))))
+        elif name == 'jitter':
+            strength = float(value) if value else 0.2
+            factors = tuple((key, round(rng.uniform(1 - strength, 1 + strength), _PARAM_DIGITS))
+                            for key in ('brightness', 'contrast', 'saturation'))
+            ops.append(('color_jitter', factors))
+        elif name == 'resize':
+            width, height = (int(v) for v in value.lower().split('x'))
+            ops.append(('resize', (('width', width), ('height', height))))
+        else:
+            raise ValueError(f"不支持的增强步骤: {item}，可选: flip, crop[=比例], jitter[=强度], resize=WxH")
+    return tuple(ops)
+
+
+@dataclass(frozen=True)
+class Variant:
+    """一个虚拟变体：源文件 + 确定的增强步骤"""
+    source: str     # 源图像路径
+    name: str       # 虚拟文件名，如 Tugboat_concept0-001_flip+crop-1.png
+    recipe: str     # 配方，原图为空字符串
+    ops: tuple      # 增强步骤（见apply_ops）
+
+    def transform(self, transform=None):
+        """该变体在加载器中使用的预处理函数（原图直接使用transform）"""
+        if not self.ops:
+            return transform
+        return partial(apply_ops, ops=self.ops, transform=transform)
+
+
+class AugmentedDataset:
+    def __init__(self, root, recipes, copies=1, seed=0, include_original=True):
+        """
+        描述一个文件夹的增强数据集，不写入任何文件
+
+        Args:
+            root: 源图像文件夹
+            recipes: 配方列表（见parse_recipe）
+            copies: 含随机步骤（crop、jitter）的配方生成的份数，每份随机参数不同
+            seed: 随机种子
+            include_original: 是否包含原图
+        """
+        self.root = root
+        self.recipes = list(recipes)
+        self.copies = max(1, copies)
+        self.seed = seed
+        filenames, paths = list_images(root)
+        self.variants = []
+        for filename, path in zip(filenames, paths):
+            stem, extension = os.path.splitext(filename)
+            if include_original:
+                self.variants.append(Variant(path, filename, "", ()))
+            for recipe in self.recipes:
+                randomized = any(step.split('=')[0] in ('crop', 'jitter') for step in recipe.split('+'))
+                for copy in range(self.copies if randomized else 1):
+                    ops = parse_recipe(recipe, _seeded_random(seed, filename, recipe, copy))
+                    suffix = f"_{recipe.replace('=', '')}" + (f"-{copy}" if randomized else "")
+                    self.variants.append(Variant(path, f"{stem}{suffix}{extension}", recipe, ops))
+
+    def __len__(self):
+        return len(self.variants)
+
+    def __getitem__(self, index):
+        """按需生成第index个变体（不缓存）"""
+        variant = self.variants[index]
+        return decode_image(variant.source, transform=variant.transform())
+
+    def caption(self, variant):
+        """变体的描述文本（源图像的同名.txt），不存在时返回None"""
+        text_path = caption_path(variant.source)
+        return read_caption(text_path) if os.path.exists(text_path) else None
+
+    def iter_images(self, transform=None, cache=None, workers=4, backend='thread'):
+        """
+        并行生成全部变体
+
+        Args:
+            transform: 增强之后的预处理（如 partial(resize_center_crop, size=224)）
+            cache: 可选的PreprocessedImageCache，同一变体再次使用时直接读取
+            workers: 工作线程/进程数
+            backend: 'thread' 或 'process'
+
+        Returns:
+            (Variant, 数组或None, 错误信息或None) 的生成器
+        """
+        for index, _, array, error in iter_images(
+                [variant.source for variant in self.variants], workers=workers, backend=backend,
+                cache=cache, transforms=[variant.transform(transform) for variant in self.variants]):
+            yield self.variants[index], array, error
+
+    def iter_batches(self, batch_size=16, transform=None, cache=None, workers=4):
+        """
+        按批产出 (变体列表, 图像数组列表, 描述文本列表)，没有描述文本或生成失败的变体被跳过
+        （与Caption_dataset.iter_caption_batches的输出一致，可直接交给评估器的score_pairs）
+        """
+        variants, images, captions = [], [], []
+        for variant, array, error in self.iter_images(transform, cache, workers):
+            if array is None:
+                print(f"警告：无法生成变体 '{variant.name}'，跳过 ({error})")
+                continue
+            caption = self.caption(variant)
+            if caption is None:
+                continue
+            variants.append(variant)
+            images.append(array)
+            captions.append(caption)
+            if len(variants) == batch_size:
+                yield variants, images, captions
+                variants, images, captions = [], [], []
+        if variants:
+            yield variants, images, captions
+
+    def export(self, output_dir, recipes=None, copy_captions=True, workers=4):
+        """
+        把变体写到磁盘（供需要真实文件的训练器使用），已存在的文件跳过
+
+        Args:
+            output_dir: 输出文件夹
+            recipes: 只导出这些配方的变体（原图的配方为''），为None时导出全部
+            copy_captions: 是否为每个变体写入同名.txt描述文本
+            workers: 并行线程数
+
+        Returns:
+            写入的图像数量
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        written = 0
+        selected = [variant for variant in self.variants
+                    if (recipes is None or variant.recipe in recipes)
+                    and not os.path.exists(os.path.join(output_dir, variant.name))]
+        for index, _, array, error in iter_images(
+                [variant.source for variant in selected], workers=workers,
+                transforms=[variant.transform() for variant in selected]):
+            variant = selected[index]
+            if array is None:
+                print(f"警告：无法生成变体 '{variant.name}'，跳过 ({error})")
+                continue
+            output_path = os.path.join(output_dir, variant.name)
+            tmp_path = f"{output_path}.tmp"
+            Image.fromarray(np.asarray(array)).save(tmp_path, format=Image.registered_extensions()[
+                os.path.splitext(variant.name)[1].lower()])
+            os.replace(tmp_path, output_path)
+            caption = self.caption(variant) if copy_captions else None
+            if caption is not None:
+                with open(os.path.splitext(output_path)[0] + ".txt", 'w', encoding='utf-8') as f:
+                    f.write(caption)
+            written += 1
+        return written
+
+    def summary(self):
+        """各配方的变体数量"""
+        counts = {}
+        for variant in self.variants:
+            counts[variant.recipe or 'original'] = counts.get(variant.recipe or 'original', 0) + 1
+        return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据增强：以惰性虚拟变体描述增强数据集，按需生成或导出")
+    parser.add_argument('--input', required=True, help="源图像文件夹")
+    parser.add_argument('--recipes', nargs='+', required=True,
+                        help="增强配方: flip crop[=比例] jitter[=强度] resize=WxH，用+组合，如 flip+crop=0.9")
+    parser.add_argument('--copies', type=int, default=1, help="含随机步骤的配方生成的份数")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    parser.add_argument('--no-original', action='store_true', help="不包含原图")
+    parser.add_argument('--export', help="把变体写入该文件夹（默认只统计，不写文件）")
+    parser.add_argument('--workers', type=int, default=4, help="并行线程数")
+    args = parser.parse_args()
+
+    dataset = AugmentedDataset(args.input, args.recipes, copies=args.copies, seed=args.seed,
+                               include_original=not args.no_original)
+    print(f"共 {len(dataset)} 个变体: {dataset.summary()}")
+    if args.export:
+        written = dataset.export(args.export, workers=args.workers)
+        print(f"已写入 {written} 张图像到: {args.export}")
+
+
+if __name__ == "__main__":
+    main()
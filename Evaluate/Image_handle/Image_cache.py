@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+预处理图像磁盘缓存
+每张图像的每种预处理结果（解码+缩放/裁剪/灰度等）以.npy文件保存，按"文件内容哈希+预处理签名"寻址，
+读取时以内存映射方式打开；缓存总大小超过上限时按最近使用时间(LRU)淘汰。
+同一文件夹被多个评估脚本使用、或同一脚本重复运行时，可以完全跳过解码与缩放。
+"""
+
+import functools
+import hashlib
+import inspect
+import os
+import uuid
+
+import numpy as np
+
+from Image_handle.File_hash import file_sha256, file_signature
+
+# 缓存格式版本，修改解码方式时递增，使旧缓存自动失效
+CACHE_VERSION = 1
+
+# 默认缓存目录与大小上限
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "image_preprocess")
+DEFAULT_MAX_BYTES = 4 << 30
+
+# 可调用对象（如torchvision的Compose）可通过该属性提供显式的预处理签名
+SIGNATURE_ATTRIBUTE = "cache_signature"
+
+# 进程内的内容哈希记忆：(绝对路径, 大小, 修改时间ns) -> sha256，避免重复读取整个文件
+_content_hash_memo = {}
+
+
+def content_hash(file_path):
+    """
+    获取文件内容哈希（文件大小与修改时间不变时直接复用上次的结果）
+
+    参数:
+        file_path: 文件路径
+
+    返回:
+        十六进制摘要字符串
+    """
+    memo_key = (os.path.abspath(file_path),) + file_signature(file_path)
+    digest = _content_hash_memo.get(memo_key)
+    if digest is None:
+        digest = file_sha256(file_path)
+        _content_hash_memo[memo_key] = digest
+    return digest
+
+
+def transform_signature(transform):
+    """
+    生成预处理函数的签名字符串，参数不同的预处理结果分别缓存
+
+    参数:
+        transform: None、模块级函数、functools.partial，或定义了cache_signature属性的可调用对象
+
+    返回:
+        签名字符串（模块名 + 限定名 + 参数）
+
+    异常:
+        TypeError: lambda、局部函数、方法或没有cache_signature属性的可调用对象（如torchvision的Compose）
+                   无法生成稳定且唯一的签名，不同的预处理会共用同一个缓存键
+    """
+    if transform is None:
+        return "identity"
+    explicit = getattr(transform, SIGNATURE_ATTRIBUTE, None)
+    if explicit is not None:
+        return str(explicit)
+    if isinstance(transform, functools.partial):
+        args = ",".join(_argument_signature(a) for a in transform.args)
+        kwargs = ",".join(f"{k}={_argument_signature(v)}" for k, v in sorted(transform.keywords.items()))
+        return f"{transform_signature(transform.func)}({args};{kwargs})"
+    if not (inspect.isfunction(transform) or inspect.isbuiltin(transform)):
+        raise TypeError(f"无法为 {type(transform).__qualname__} 对象生成预处理签名，"
+                        f"请使用模块级函数或functools.partial，或为其定义 {SIGNATURE_ATTRIBUTE} 属性")
+    qualname = transform.__qualname__
+    if "<lambda>" in qualname or "<locals>" in qualname:
+        raise TypeError(f"无法为 {qualname} 生成预处理签名（lambda与局部函数无法区分），"
+                        f"请使用模块级函数或functools.partial，或为其定义 {SIGNATURE_ATTRIBUTE} 属性")
+    return f"{transform.__module__}.{qualname}"
+
+
+def _argument_signature(value):
+    """partial参数的签名：函数按transform_signature（而不是含内存地址的repr），其余按repr"""
+    if callable(value) and not isinstance(value, type):
+        return transform_signature(value)
+    return repr(value)
+
+
+class PreprocessedImageCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        预处理图像的磁盘缓存（可被pickle，能直接传给进程池中的解码函数）
+
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总大小上限（字节），超过后按LRU淘汰
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, file_path, signature):
+        """
+        计算缓存键
+
+        Args:
+            file_path: 原始图像路径
+            signature: 预处理签名（见transform_signature）
+
+        Returns:
+            十六进制缓存键
+        """
+        raw = f"image-v{CACHE_VERSION}|{content_hash(file_path)}|{signature}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        # 按键前两位分子目录，避免单个目录文件过多
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def load(self, key):
+        """
+        以内存映射方式读取缓存条目，并刷新其使用时间
+
+        Returns:
+            只读的numpy数组，未命中时返回None
+        """
+        path = self._entry_path(key)
+        try:
+            array = np.load(path, mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"图像缓存读取失败，将重新计算: {e}")
+            return None
+        # 以修改时间记录最近使用时间（atime在很多文件系统上不可靠）
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return array
+
+    def save(self, key, array):
+        """
+        写入缓存条目（先写临时文件再原子替换，多个线程/进程同时写入同一条目也不会损坏）
+        """
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(tmp_path, path)
+
+    def get_or_create(self, file_path, signature, create):
+        """
+        读取缓存，未命中时调用create()生成并写入缓存
+
+        Args:
+            file_path: 原始图像路径
+            signature: 预处理签名
+            create: 无参函数，返回预处理后的numpy数组
+
+        Returns:
+            numpy数组（命中时为只读内存映射）
+        """
+        key = self.make_key(file_path, signature)
+        array = self.load(key)
+        if array is None:
+            array = create()
+            self.save(key, array)
+        return array
+
+    def _entries(self):
+        """列出全部缓存条目 (修改时间, 大小, 路径)"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".npy"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return entries
+
+    def total_size(self):
+        """缓存当前占用的总字节数"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_bytes=None):
+        """
+        按LRU淘汰缓存条目，直到总大小不超过上限
+
+        Args:
+            max_bytes: 大小上限，默认使用初始化时的值
+
+        Returns:
+            被删除的条目数量
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+
+        removed = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        """清空全部缓存"""
+        return self.evict(max_bytes=0)
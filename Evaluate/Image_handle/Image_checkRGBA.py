@@ -1,29 +1,35 @@
 #!/usr/bin/env python3
 """
 简化版RGBA格式图像检查器
-扫描指定目录下的图像文件，找出RGBA格式的文件
+扫描指定目录下的图像文件，找出RGBA格式与尺寸异常的文件（只读取文件头，可递归扫描子目录）
 """
 
 import os
-from PIL import Image
-from pathlib import Path
+import sys
+from collections import Counter
 
+# 将Evaluate目录加入搜索路径，以便作为脚本直接运行
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
 
-def check_rgba_images(directory_path):
+from Image_handle.Image_header import scan_images
+
+
+def check_rgba_images(directory_path, recursive=True, workers=16):
     """
-    扫描目录中的图像文件，检查并统计RGBA格式
+    扫描目录中的图像文件，检查并统计RGBA格式与尺寸异常
+
+    只读取文件头（见Image_header），结果缓存在目录对应的清单库中（用户缓存目录），重复扫描时只读取新增或变化的文件
 
     参数:
         directory_path: 要扫描的目录路径
-    """
-    # 支持的图像格式
-    image_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.tif', '.webp', '.ico'}
-
-    # 结果存储
-    rgba_files = []
-    format_stats = {}
-    errors = []
+        recursive: 是否递归扫描子目录
+        workers: 并发线程数
 
+    返回:
+        RGBA格式（或带透明色）的文件列表（相对路径）
+    """
     # 检查目录是否存在
     if not os.path.exists(directory_path):
         print(f"错误: 目录 '{directory_path}' 不存在")
@@ -36,41 +42,26 @@ def check_rgba_images(directory_path):
     print(f"正在扫描目录: {os.path.abspath(directory_path)}")
     print("=" * 60)
 
-    # 获取目录中的所有文件
-    files = os.listdir(directory_path)
-    total_images = 0
-
-    # 检查每个文件
-    for filename in files:
-        file_path = os.path.join(directory_path, filename)
+    headers = scan_images(directory_path, recursive=recursive, workers=workers)
 
-        # 跳过子目录
-        if os.path.isdir(file_path):
+    # 结果存储
+    rgba_files = []
+    format_stats = {}
+    size_stats = Counter()
+    errors = []
+    for header in headers:
+        if header.error:
+            errors.append((header.path, header.error))
             continue
-
-        # 检查是否为图像文件
-        if Path(file_path).suffix.lower() in image_extensions:
-            total_images += 1
-
-            try:
-                # 打开图像并检查格式
-                with Image.open(file_path) as img:
-                    mode = img.mode
-
-                    # 统计格式
-                    if mode not in format_stats:
-                        format_stats[mode] = []
-                    format_stats[mode].append(filename)
-
-                    # 如果是RGBA格式，添加到列表
-                    if mode == 'RGBA':
-                        rgba_files.append(filename)
-
-            except Exception as e:
-                errors.append((filename, str(e)))
+        # 统计格式
+        format_stats.setdefault(header.mode, []).append(header.path)
+        size_stats[(header.width, header.height)] += 1
+        # RGBA格式，或调色板/RGB图像带透明色
+        if header.has_alpha:
+            rgba_files.append(header.path)
 
     # 打印结果
-    print(f"\n扫描完成！共发现 {total_images} 个图像文件\n")
+    print(f"\n扫描完成！共发现 {len(headers)} 个图像文件\n")
 
     # RGBA文件列表
     print(f"【RGBA格式文件】 共 {len(rgba_files)} 个:")
@@ -88,6 +79,20 @@ def check_rgba_images(directory_path):
     for mode, files in sorted(format_stats.items()):
         print(f"  {mode:8s} : {len(files):3d} 个文件")
 
+    # 尺寸统计：与最常见尺寸不同的文件视为异常
+    if size_stats:
+        common_size, common_count = size_stats.most_common(1)[0]
+        print(f"\n【尺寸统计】 最常见 {common_size[0]}x{common_size[1]}（{common_count} 个）:")
+        print("-" * 40)
+        for (width, height), count in size_stats.most_common():
+            print(f"  {width}x{height} : {count:3d} 个文件")
+        outliers = [header.path for header in headers
+                    if not header.error and (header.width, header.height) != common_size]
+        for file in outliers[:50]:
+            print(f"  ! {file}")
+        if len(outliers) > 50:
+            print(f"  ... 共 {len(outliers)} 个尺寸异常文件")
+
     # 错误信息
     if errors:
         print(f"\n【无法读取的文件】 共 {len(errors)} 个:")
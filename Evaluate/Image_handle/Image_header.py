@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+图像文件头扫描
+只读取文件头获取尺寸、位深与颜色类型，不解码像素：
+    PNG:  IHDR块（颜色类型为灰度/RGB/调色板时继续查找IDAT之前的tRNS块判断是否带透明），其余块直接跳过
+    JPEG: SOF段（APP等段按长度跳过，不读取EXIF内容）
+    WebP: VP8 / VP8L / VP8X 块
+    其他格式（BMP、GIF、TIFF等）用PIL延迟打开，只读取文件头
+目录用os.scandir并发遍历，结果保存在扫描根目录对应的清单库中（默认在用户缓存目录，按 路径+大小+修改时间 判断是否需要重新读取），
+审计大量生成图像中的RGBA、尺寸异常文件时，重复扫描只需要一次目录遍历。
+"""
+
+import hashlib
+import os
+import sqlite3
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from typing import Optional
+
+from PIL import Image
+
+from Image_handle.Image_loader import SUPPORTED_FORMATS
+
+# 清单库默认保存目录，文件名由扫描根目录的绝对路径哈希得到
+DEFAULT_INVENTORY_DIR = os.path.join(os.path.expanduser("~"), ".cache", "image_inventory")
+
+# 解析方式变化时递增，使旧的清单条目失效
+HEADER_VERSION = 1
+
+# 每个线程任务读取的文件数
+_HEADER_CHUNK = 256
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# PNG颜色类型 -> PIL模式
+_PNG_MODES = {0: 'L', 2: 'RGB', 3: 'P', 4: 'LA', 6: 'RGBA'}
+
+# JPEG的SOF标记（不含DHT=C4、JPG=C8、DAC=CC）
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# JPEG颜色分量数 -> PIL模式
+_JPEG_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+
+
+@dataclass
+class ImageHeader:
+    """一个图像文件的头信息"""
+    path: str                    # 相对扫描根目录的路径
+    size: int                    # 文件大小（字节）
+    mtime_ns: int                # 修改时间
+    format: str = ""             # PNG / JPEG / WEBP / PIL识别的格式
+    width: int = 0
+    height: int = 0
+    bit_depth: int = 0           # 每通道位深（未知为0）
+    mode: str = ""               # 与PIL的image.mode对应（RGB、RGBA、L、P等）
+    has_alpha: bool = False      # 是否带透明（RGBA/LA，或调色板/RGB带tRNS透明色）
+    error: Optional[str] = None  # 读取失败的原因
+
+
+def _read_exact(f, n):
+    data = f.read(n)
+    if len(data) != n:
+        raise ValueError("文件头不完整")
+    return data
+
+
+def _parse_png(f):
+    _read_exact(f, 8)
+    length, chunk_type = struct.unpack('>I4s', _read_exact(f, 8))
+    if chunk_type != b'IHDR':
+        raise ValueError("PNG缺少IHDR块")
+    width, height, bit_depth, color_type = struct.unpack('>IIBB', _read_exact(f, 10))
+    mode = _PNG_MODES.get(color_type)
+    if mode is None:
+        raise ValueError(f"未知的PNG颜色类型: {color_type}")
+    if color_type == 0 and bit_depth == 1:
+        mode = '1'
+    elif color_type == 0 and bit_depth == 16:
+        mode = 'I;16'
+    has_alpha = color_type in (4, 6)
+
+    if not has_alpha:
+        # tRNS必须出现在IDAT之前；跳过其余块的内容（ComfyUI在文本块中保存的工作流可能很大）
+        f.seek(8 + 8 + length + 4)
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            length, chunk_type = struct.unpack('>I4s', header)
+            if chunk_type == b'tRNS':
+                has_alpha = True
+                break
+            if chunk_type in (b'IDAT', b'IEND'):
+                break
+            f.seek(length + 4, os.SEEK_CUR)
+    return 'PNG', width, height, bit_depth, mode, has_alpha
+
+
+def _parse_jpeg(f):
+    _read_exact(f, 2)
+    while True:
+        byte = _read_exact(f, 1)
+        if byte != b'\xff':
+            raise ValueError("JPEG段标记错误")
+        marker = _read_exact(f, 1)[0]
+        while marker == 0xFF:   # 填充字节
+            marker = _read_exact(f, 1)[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue            # 没有长度字段的标记
+        if marker == 0xD9:
+            raise ValueError("JPEG中没有SOF段")
+        length = struct.unpack('>H', _read_exact(f, 2))[0]
+        if marker in _JPEG_SOF_MARKERS:
+            precision, height, width, components = struct.unpack('>BHHB', _read_exact(f, 6))
+            return 'JPEG', width, height, precision, _JPEG_MODES.get(components, f"{components}ch"), False
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _parse_webp(f):
+    riff, _, webp = struct.unpack('<4sI4s', _read_exact(f, 12))
+    if riff != b'RIFF' or webp != b'WEBP':
+        raise ValueError("不是WebP文件")
+    chunk_type, _ = struct.unpack('<4sI', _read_exact(f, 8))
+    if chunk_type == b'VP8X':
+        data = _read_exact(f, 10)
+        has_alpha = bool(data[0] & 0x10)
+        width = int.from_bytes(data[4:7], 'little') + 1
+        height = int.from_bytes(data[7:10], 'little') + 1
+    elif chunk_type == b'VP8L':
+        data = _read_exact(f, 5)
+        if data[0] != 0x2F:
+            raise ValueError("VP8L签名错误")
+        bits = int.from_bytes(data[1:5], 'little')
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+        has_alpha = bool((bits >> 28) & 1)
+    elif chunk_type == b'VP8 ':
+        data = _read_exact(f, 10)
+        if data[3:6] != b'\x9d\x01\x2a':
+            raise ValueError("VP8起始码错误")
+        width, height = struct.unpack('<HH', data[6:10])
+        width, height = width & 0x3FFF, height & 0x3FFF
+        has_alpha = False
+    else:
+        raise ValueError(f"未知的WebP块: {chunk_type!r}")
+    return 'WEBP', width, height, 8, 'RGBA' if has_alpha else 'RGB', has_alpha
+
+
+def _parse_with_pil(path):
+    # PIL.Image.open只读取文件头，像素在load()时才解码
+    with Image.open(path) as img:
+        mode = img.mode
+        has_alpha = mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+        bits = {'1': 1, 'I;16': 16, 'I': 32, 'F': 32}.get(mode, 8)
+        return img.format or "", img.width, img.height, bits, mode, has_alpha
+
+
+def read_header(path):
+    """
+    读取单个图像文件的头信息
+
+    Args:
+        path: 图像路径
+
+    Returns:
+        (格式, 宽, 高, 位深, 模式, 是否带透明)
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(12)
+        f.seek(0)
+        if magic.startswith(_PNG_SIGNATURE):
+            return _parse_png(f)
+        if magic.startswith(b'\xff\xd8'):
+            return _parse_jpeg(f)
+        if magic[:4] == b'RIFF' and magic[8:12] == b'WEBP':
+            return _parse_webp(f)
+    return _parse_with_pil(path)
+
+
+def _scan_directory(directory, extensions):
+    """列出一个目录中的图像文件 (路径, 大小, 修改时间) 与子目录"""
+    files, subdirs = [], []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith('.'):
+                        subdirs.append(entry.path)
+                elif entry.name.lower().endswith(extensions):
+                    stat = entry.stat()
+                    files.append((entry.path, stat.st_size, stat.st_mtime_ns))
+    except OSError as e:
+        print(f"警告：无法读取目录 '{directory}' ({e})")
+    return files, subdirs
+
+
+def walk_images(root, recursive=True, workers=16, extensions=SUPPORTED_FORMATS):
+    """
+    并发遍历目录，列出图像文件
+
+    Args:
+        root: 根目录
+        recursive: 是否递归子目录（跳过以"."开头的目录）
+        workers: 并发线程数
+        extensions: 图像扩展名
+
+    Returns:
+        [(完整路径, 大小, 修改时间ns), ...]，按路径排序
+    """
+    files = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = [executor.submit(_scan_directory, root, extensions)]
+        while pending:
+            future = pending.pop()
+            found, subdirs = future.result()
+            files.extend(found)
+            if recursive:
+                pending.extend(executor.submit(_scan_directory, subdir, extensions) for subdir in subdirs)
+    return sorted(files)
+
+
+class ImageInventory:
+    def __init__(self, db_path):
+        """
+        图像头信息清单库
+
+        Args:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS headers ("
+                " path TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " format TEXT,"
+                " width INTEGER,"
+                " height INTEGER,"
+                " bit_depth INTEGER,"
+                " mode TEXT,"
+                " has_alpha INTEGER,"
+                " error TEXT,"
+                " version INTEGER NOT NULL)")
+
+    @classmethod
+    def for_folder(cls, root, inventory_dir=DEFAULT_INVENTORY_DIR):
+        """
+        打开扫描根目录对应的清单库（保存在inventory_dir中，不在扫描目录内写入文件）
+        """
+        root = os.path.abspath(root)
+        os.makedirs(inventory_dir, exist_ok=True)
+        name = hashlib.sha256(root.encode("utf-8")).hexdigest()[:16]
+        return cls(os.path.join(inventory_dir, f"{name}.sqlite"))
+
+    def _load(self):
+        rows = self._conn.execute(
+            f"SELECT {', '.join(f.name for f in fields(ImageHeader))} FROM headers WHERE version = ?", (HEADER_VERSION,))
+        headers = {}
+        for row in rows:
+            header = ImageHeader(*row)
+            header.has_alpha = bool(header.has_alpha)
+            headers[header.path] = header
+        return headers
+
+    def scan(self, root, recursive=True, workers=16):
+        """
+        扫描目录：未变化的文件直接使用清单库中的结果，其余文件并发读取文件头后写回清单库
+
+        Args:
+            root: 扫描根目录
+            recursive: 是否递归子目录
+            workers: 并发线程数
+
+        Returns:
+            ImageHeader列表（按路径排序）
+        """
+        known = self._load()
+        headers = []
+        todo = []
+        # walk_images返回的路径都以root开头，直接截取相对路径（比os.path.relpath快得多）
+        prefix_length = len(os.path.join(root, ''))
+        for path, size, mtime_ns in walk_images(root, recursive, workers):
+            relative = path[prefix_length:]
+            header = known.get(relative)
+            if header is not None and (header.size, header.mtime_ns) == (size, mtime_ns):
+                headers.append(header)
+            else:
+                todo.append((path, ImageHeader(relative, size, mtime_ns)))
+
+        def fill(items):
+            for path, header in items:
+                try:
+                    (header.format, header.width, header.height, header.bit_depth,
+                     header.mode, header.has_alpha) = read_header(path)
+                except Exception as e:
+                    header.error = f"{type(e).__name__}: {e}"
+            return [header for _, header in items]
+
+        if todo:
+            # 线程池的map不支持chunksize，按块提交以减少任务调度开销
+            chunks = [todo[i:i + _HEADER_CHUNK] for i in range(0, len(todo), _HEADER_CHUNK)]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                updated = [header for chunk in executor.map(fill, chunks) for header in chunk]
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO headers VALUES ({', '.join('?' * (len(fields(ImageHeader)) + 1))})",
+                    [(h.path, h.size, h.mtime_ns, h.format, h.width, h.height, h.bit_depth, h.mode,
+                      int(h.has_alpha), h.error, HEADER_VERSION) for h in updated])
+            headers.extend(updated)
+
+        print(f"扫描 {len(headers)} 个图像文件，读取文件头 {len(todo)} 个，复用清单 {len(headers) - len(todo)} 个")
+        return sorted(headers, key=lambda header: header.path)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def scan_images(root, recursive=True, workers=16):
+    """
+    扫描目录中全部图像的头信息（使用根目录对应的清单库）
+
+    Returns:
+        ImageHeader列表
+    """
+    with ImageInventory.for_folder(root) as inventory:
+        return inventory.scan(root, recursive, workers)
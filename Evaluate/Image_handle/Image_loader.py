@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+公共图像解码模块
+用线程池/进程池并行解码图像，并通过有界预取队列按输入顺序产出RGB数组，
+供SSIM、LPIPS、HPSv2、ImageReward等评估脚本共用，使解码与模型计算重叠进行
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from Image_handle.Image_cache import transform_signature
+
+# 支持的图像格式
+SUPPORTED_FORMATS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.webp')
+
+
+def list_images(directory_path, extensions=SUPPORTED_FORMATS):
+    """
+    列出目录中的图像文件（按文件名排序，不递归子目录）
+
+    参数:
+        directory_path: 目录路径
+        extensions: 支持的扩展名
+
+    返回:
+        (文件名列表, 完整路径列表)
+    """
+    filenames = sorted(f for f in os.listdir(directory_path)
+                       if f.lower().endswith(extensions)
+                       and os.path.isfile(os.path.join(directory_path, f)))
+    return filenames, [os.path.join(directory_path, f) for f in filenames]
+
+
+def flatten_rgba(image, background_color=(255, 255, 255)):
+    """
+    将图像转换为RGB，RGBA图像以背景色合成（替代直接丢弃alpha通道）
+
+    参数:
+        image: PIL Image
+        background_color: 背景颜色RGB值
+
+    返回:
+        RGB格式的PIL Image
+    """
+    if image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, background_color)
+        background.paste(image, mask=image.split()[3])
+        return background
+    elif image.mode != 'RGB':
+        return image.convert('RGB')
+    return image
+
+
+def load_rgb_image(image, background_color=(255, 255, 255)):
+    """
+    读取图像并转换为RGB格式的PIL Image
+
+    参数:
+        image: 图像路径、PIL Image或numpy array(HWC, uint8)
+
+    返回:
+        RGB格式的PIL Image
+    """
+    if isinstance(image, str):
+        with Image.open(image) as img:
+            img.load()
+            return flatten_rgba(img, background_color)
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    return flatten_rgba(image, background_color)
+
+
+def resize_rgb(image, size, resample=Image.BILINEAR):
+    """
+    将RGB数组缩放到固定尺寸（与torchvision.transforms.Resize((高, 宽))作用于PIL图像的结果一致）
+
+    参数:
+        image: [H, W, 3]的uint8数组
+        size: 目标尺寸 (宽, 高)
+        resample: PIL插值方式
+
+    返回:
+        缩放后的数组
+    """
+    if (image.shape[1], image.shape[0]) == tuple(size):
+        return image
+    return np.asarray(Image.fromarray(image).resize(tuple(size), resample))
+
+
+def resize_center_crop(image, size=224, resample=Image.BICUBIC):
+    """
+    短边缩放到size后中心裁剪为size x size
+    （与CLIP类模型的 Resize(size) + CenterCrop(size) 预处理一致，如ImageReward；
+    HPSv2的预处理是长边缩放+补边，不能使用）
+
+    参数:
+        image: [H, W, 3]的uint8数组
+        size: 目标边长
+        resample: PIL插值方式
+
+    返回:
+        [size, size, 3]的数组
+    """
+    h, w = image.shape[:2]
+    short, long = (w, h) if w <= h else (h, w)
+    new_long = int(size * long / short)
+    new_w, new_h = (size, new_long) if w <= h else (new_long, size)
+
+    img = Image.fromarray(image)
+    if (new_w, new_h) != (w, h):
+        img = img.resize((new_w, new_h), resample)
+
+    top = int(round((new_h - size) / 2.0))
+    left = int(round((new_w - size) / 2.0))
+    return np.asarray(img.crop((left, top, left + size, top + size)))
+
+
+def decode_image(file_path, background_color=(255, 255, 255), transform=None, cache=None):
+    """
+    解码单张图像为RGB数组（在工作线程/进程中执行）
+
+    参数:
+        file_path: 图像路径
+        background_color: RGBA图像的合成背景色
+        transform: 可选的后处理函数，输入/输出均为numpy数组；
+                   使用进程池时必须是模块级函数（可被pickle）
+        cache: 可选的PreprocessedImageCache，命中时直接返回内存映射的预处理结果，跳过解码与transform
+
+    返回:
+        [H, W, 3]的uint8数组（经transform处理后由transform决定）
+    """
+    def create():
+        array = np.asarray(load_rgb_image(file_path, background_color))
+        if transform is not None:
+            array = transform(array)
+        return array
+
+    if cache is None:
+        return create()
+    signature = f"{transform_signature(transform)}|bg={tuple(background_color)}"
+    return cache.get_or_create(file_path, signature, create)
+
+
+def _decode_safe(file_path, background_color, transform, cache):
+    """解码并捕获异常，返回(数组, 错误信息)"""
+    try:
+        return decode_image(file_path, background_color, transform, cache), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+class ImageLoader:
+    def __init__(self, workers=4, prefetch=16, backend='thread', background_color=(255, 255, 255),
+                 cache=None):
+        """
+        并行图像解码器
+
+        Args:
+            workers: 工作线程/进程数
+            prefetch: 最多提前解码的图像数量（有界队列，限制内存占用）
+            backend: 'thread'（PIL解码时会释放GIL，适合大多数情况）或 'process'
+            background_color: RGBA图像的合成背景色
+            cache: 可选的PreprocessedImageCache，预处理结果按内容哈希缓存到磁盘，
+                   每轮迭代结束后按LRU淘汰超出上限的条目
+        """
+        if backend not in ('thread', 'process'):
+            raise ValueError(f"不支持的backend: {backend}")
+
+        self.workers = max(1, workers)
+        self.prefetch = max(1, prefetch)
+        self.backend = backend
+        self.background_color = background_color
+        self.cache = cache
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            executor_cls = ThreadPoolExecutor if self.backend == 'thread' else ProcessPoolExecutor
+            self._executor = executor_cls(max_workers=self.workers)
+        return self._executor
+
+    def iter_images(self, paths, transform=None, transforms=None):
+        """
+        并行解码并按输入顺序产出图像
+
+        Args:
+            paths: 图像路径列表
+            transform: 可选的后处理函数（如缩放、转灰度），在工作线程/进程中执行
+            transforms: 可选的与paths一一对应的后处理函数列表（如数据增强的各个变体），优先于transform
+
+        Returns:
+            (索引, 路径, 数组或None, 错误信息或None) 的生成器；解码失败的图像数组为None
+        """
+        executor = self._get_executor()
+        pending = deque()
+        path_iter = iter(enumerate(paths))
+
+        def submit_next():
+            item = next(path_iter, None)
+            if item is None:
+                return False
+            index, path = item
+            item_transform = transform if transforms is None else transforms[index]
+            pending.append((index, path, executor.submit(_decode_safe, path, self.background_color,
+                                                              item_transform, self.cache)))
+            return True
+
+        for _ in range(self.prefetch):
+            if not submit_next():
+                break
+
+        while pending:
+            index, path, future = pending.popleft()
+            array, error = future.result()
+            submit_next()
+            yield index, path, array, error
+
+        if self.cache is not None:
+            self.cache.evict()
+
+    def close(self):
+        """关闭线程池/进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def iter_images(paths, workers=4, prefetch=16, backend='thread', transform=None,
+                background_color=(255, 255, 255), cache=None, transforms=None):
+    """
+    并行解码一组图像的便捷函数，参数见ImageLoader
+
+    返回:
+        (索引, 路径, 数组或None, 错误信息或None) 的生成器
+    """
+    with ImageLoader(workers, prefetch, backend, background_color, cache) as loader:
+        yield from loader.iter_images(paths, transform, transforms)
@@ -1,62 +1,182 @@
 #!/usr/bin/env python3
 """
 简化版RGBA转RGB图像格式转换器
-将指定目录中的RGBA格式图像转换为RGB格式
+将指定目录中的RGBA格式图像转换为RGB格式（原地替换）
+
+安全性:
+    - 备份按内容哈希保存在 <目录>/.rgba_backup/ 中，优先用硬链接（不复制、不重新编码），跨设备时才复制
+    - 转换结果先写入同目录的临时文件并fsync，再用os.replace原子替换原文件，中断时原文件不会损坏
+    - 每个文件处理完成后追加到日志 <目录>/.rgba_convert_journal.jsonl，中断后重新运行会跳过已处理且未变化的文件
+    - 多个进程并行转换；dry_run只读取文件头列出需要转换的文件
 """
 
+import json
 import os
-from PIL import Image
-from pathlib import Path
-from datetime import datetime
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from PIL import Image, PngImagePlugin
+
+# 将Evaluate目录加入搜索路径，以便作为脚本直接运行
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
+
+from Image_handle.File_hash import file_sha256
+from Image_handle.Image_header import read_header
+
+# 备份目录与日志文件名（位于被转换的目录中）
+BACKUP_DIRNAME = ".rgba_backup"
+JOURNAL_FILENAME = ".rgba_convert_journal.jsonl"
 
+# 临时文件后缀，重新运行时清理中断遗留的临时文件
+TMP_SUFFIX = ".rgba-tmp"
 
-def convert_rgba_to_rgb(file_path, background_color=(255, 255, 255), quality=95):
+
+def backup_file(file_path, backup_dir):
     """
-    将单个RGBA图像转换为RGB格式
+    按内容哈希备份文件：相同内容只保存一份，优先使用硬链接
+
+    参数:
+        file_path: 原文件路径
+        backup_dir: 备份目录
+
+    返回:
+        (备份路径, 原文件的sha256)
+    """
+    digest = file_sha256(file_path)
+    backup_path = os.path.join(backup_dir, digest[:2], digest + os.path.splitext(file_path)[1].lower())
+    if not os.path.exists(backup_path):
+        os.makedirs(os.path.dirname(backup_path), exist_ok=True)
+        tmp_path = backup_path + TMP_SUFFIX
+        try:
+            os.link(file_path, tmp_path)
+        except OSError:
+            # 跨设备或文件系统不支持硬链接时复制
+            shutil.copy2(file_path, tmp_path)
+        os.replace(tmp_path, backup_path)
+    return backup_path, digest
+
+
+def _png_info(img):
+    """保留PNG中的文本块（如ComfyUI保存的prompt/workflow）"""
+    text = getattr(img, 'text', None) or {}
+    if not text:
+        return None
+    info = PngImagePlugin.PngInfo()
+    for key, value in text.items():
+        info.add_text(key, value)
+    return info
+
+
+def convert_rgba_to_rgb(file_path, background_color=(255, 255, 255), quality=95, backup_dir=None):
+    """
+    将单个RGBA图像转换为RGB格式（原地原子替换）
 
     参数:
         file_path: 图像文件路径
         background_color: 背景颜色RGB值，用于替换透明通道
         quality: JPEG压缩质量(1-100)
+        backup_dir: 备份目录，为None时不备份
 
     返回:
-        (成功, 消息)
+        日志条目dict：file, status(converted/skipped/failed), message, backup, sha256_before,
+        以及转换后的 size, mtime_ns
     """
+    entry = {'file': os.path.basename(file_path), 'status': 'failed', 'message': '', 'backup': None,
+             'sha256_before': None}
+    tmp_path = None
     try:
         # 打开图像
         with Image.open(file_path) as img:
             # 检查是否为RGBA格式
             if img.mode != 'RGBA':
-                return False, f"跳过 - 不是RGBA格式(当前: {img.mode})"
-
-            # 创建备份文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_path = file_path.replace('.', f'_rgba_backup_{timestamp}.')
-
-            # 备份原文件
-            img.save(backup_path)
-
-            # 创建RGB图像
-            rgb_img = Image.new('RGB', img.size, background_color)
+                entry['status'] = 'skipped'
+                entry['message'] = f"跳过 - 不是RGBA格式(当前: {img.mode})"
+            else:
+                image_format = img.format
+                pnginfo = _png_info(img) if image_format == 'PNG' else None
+
+                # 创建RGB图像，使用alpha通道作为蒙版粘贴图像
+                rgb_img = Image.new('RGB', img.size, background_color)
+                rgb_img.paste(img, mask=img.split()[3])
+
+        if entry['status'] != 'skipped':
+            # 备份原文件（硬链接保留原文件内容，替换后仍然可以恢复）
+            if backup_dir is not None:
+                entry['backup'], entry['sha256_before'] = backup_file(file_path, backup_dir)
+                entry['backup'] = os.path.relpath(entry['backup'], os.path.dirname(file_path))
 
-            # 使用alpha通道作为蒙版粘贴图像
-            rgb_img.paste(img, mask=img.split()[3])
-
-            # 保存转换后的图像（覆盖原文件）
             save_kwargs = {}
-            if Path(file_path).suffix.lower() in ['.jpg', '.jpeg']:
+            if image_format == 'JPEG':
                 save_kwargs['quality'] = quality
                 save_kwargs['optimize'] = True
+            if pnginfo is not None:
+                save_kwargs['pnginfo'] = pnginfo
+
+            # 先写临时文件并刷到磁盘，再原子替换原文件
+            directory, name = os.path.split(file_path)
+            tmp_path = os.path.join(directory, f".{name}{TMP_SUFFIX}")
+            with open(tmp_path, 'wb') as f:
+                rgb_img.save(f, format=image_format, **save_kwargs)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, file_path)
+            tmp_path = None
+
+            entry['status'] = 'converted'
+            entry['message'] = "成功转换" + (f" (备份: {entry['backup']})" if entry['backup'] else "")
+    except Exception as e:
+        entry['status'] = 'failed'
+        entry['message'] = f"转换失败: {str(e)}"
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-            rgb_img.save(file_path, **save_kwargs)
+    # 记录处理后的文件签名，重新运行时据此判断文件是否已处理
+    try:
+        stat = os.stat(file_path)
+        entry['size'], entry['mtime_ns'] = stat.st_size, stat.st_mtime_ns
+    except OSError:
+        entry['size'], entry['mtime_ns'] = None, None
+    return entry
 
-            return True, f"成功转换 (备份: {os.path.basename(backup_path)})"
-
-    except Exception as e:
-        return False, f"转换失败: {str(e)}"
 
+def load_journal(journal_path):
+    """
+    读取转换日志
 
-def batch_convert_rgba(directory_path, background_color=(255, 255, 255), quality=95):
+    返回:
+        {文件名: 最后一条日志条目}
+    """
+    done = {}
+    if not os.path.exists(journal_path):
+        return done
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue    # 中断时写了一半的最后一行
+            done[entry['file']] = entry
+    return done
+
+
+def _is_done(entry, file_path):
+    """日志中已成功处理（转换或跳过），且文件在那之后没有变化"""
+    if entry is None or entry['status'] == 'failed':
+        return False
+    stat = os.stat(file_path)
+    return (entry['size'], entry['mtime_ns']) == (stat.st_size, stat.st_mtime_ns)
+
+
+def batch_convert_rgba(directory_path, background_color=(255, 255, 255), quality=95, workers=None,
+                       dry_run=False, backup=True):
     """
     批量转换目录中的RGBA图像为RGB格式
 
@@ -64,6 +184,9 @@ def batch_convert_rgba(directory_path, background_color=(255, 255, 255), quality
         directory_path: 目录路径
         background_color: 背景颜色RGB值
         quality: JPEG压缩质量
+        workers: 并行进程数，默认CPU核数
+        dry_run: 只列出需要转换的文件，不做修改
+        backup: 是否备份原文件
     """
     # 支持的图像格式
     image_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.tif', '.webp'}
@@ -82,50 +205,73 @@ def batch_convert_rgba(directory_path, background_color=(255, 255, 255), quality
     print(f"JPEG质量: {quality}")
     print("=" * 60)
 
-    # 统计变量
-    success_count = 0
-    skip_count = 0
-    fail_count = 0
-    success_files = []
-    skip_files = []
-    fail_files = []
-
-    # 获取目录中的所有文件
-    files = os.listdir(directory_path)
-
-    # 筛选图像文件
+    # 筛选图像文件（跳过子目录与中断遗留的临时文件）
     image_files = []
-    for filename in files:
-        file_path = os.path.join(directory_path, filename)
+    with os.scandir(directory_path) as entries:
+        for dir_entry in entries:
+            if not dir_entry.is_file():
+                continue
+            if dir_entry.name.endswith(TMP_SUFFIX):
+                if not dry_run:
+                    os.remove(dir_entry.path)
+                continue
+            if os.path.splitext(dir_entry.name)[1].lower() in image_extensions:
+                image_files.append((dir_entry.name, dir_entry.path))
+    image_files.sort()
 
-        # 跳过子目录
-        if os.path.isdir(file_path):
-            continue
+    print(f"\n发现 {len(image_files)} 个图像文件\n")
 
-        # 检查是否为图像文件
-        if Path(file_path).suffix.lower() in image_extensions:
-            image_files.append((filename, file_path))
+    # 日志中已完成且未变化的文件直接跳过
+    journal_path = os.path.join(directory_path, JOURNAL_FILENAME)
+    journal = load_journal(journal_path)
+    todo = [(filename, file_path) for filename, file_path in image_files
+            if not _is_done(journal.get(filename), file_path)]
+    print(f"日志中已完成 {len(image_files) - len(todo)} 个，待处理 {len(todo)} 个")
+
+    if dry_run:
+        # 只读取文件头判断是否为RGBA
+        candidates = []
+        for filename, file_path in todo:
+            try:
+                mode = read_header(file_path)[4]
+            except Exception as e:
+                print(f"✗ {filename}: 无法读取文件头 ({e})")
+                continue
+            if mode == 'RGBA':
+                candidates.append(filename)
+                print(f"  将转换: {filename}")
+        print(f"\n[dry-run] 需要转换 {len(candidates)} 个文件，未做任何修改")
+        return len(candidates), 0, 0
 
-    print(f"\n发现 {len(image_files)} 个图像文件\n")
+    # 统计变量
+    success_files = []
+    skip_files = []
+    fail_files = []
 
-    # 处理每个图像文件
-    for filename, file_path in image_files:
-        print(f"处理: {filename} ... ", end="")
-
-        success, message = convert_rgba_to_rgb(file_path, background_color, quality)
-
-        if success:
-            print(f"✓ {message}")
-            success_count += 1
-            success_files.append(filename)
-        elif "跳过" in message:
-            print(f"- {message}")
-            skip_count += 1
-            skip_files.append((filename, message))
-        else:
-            print(f"✗ {message}")
-            fail_count += 1
-            fail_files.append((filename, message))
+    backup_dir = os.path.join(directory_path, BACKUP_DIRNAME) if backup else None
+    worker = partial(convert_rgba_to_rgb, background_color=background_color, quality=quality, backup_dir=backup_dir)
+    workers = max(1, workers or os.cpu_count() or 1)
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as executor, \
+                open(journal_path, 'a', encoding='utf-8') as journal_file:
+            chunksize = max(1, len(todo) // (workers * 8))
+            for entry in executor.map(worker, [file_path for _, file_path in todo], chunksize=chunksize):
+                # 每个文件完成后立即写入日志
+                journal_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                journal_file.flush()
+
+                filename, message = entry['file'], entry['message']
+                if entry['status'] == 'converted':
+                    print(f"处理: {filename} ... ✓ {message}")
+                    success_files.append(filename)
+                elif entry['status'] == 'skipped':
+                    skip_files.append((filename, message))
+                else:
+                    print(f"处理: {filename} ... ✗ {message}")
+                    fail_files.append((filename, message))
+            os.fsync(journal_file.fileno())
+
+    success_count, skip_count, fail_count = len(success_files), len(skip_files), len(fail_files)
 
     # 打印汇总结果
     print("\n" + "=" * 60)
@@ -137,9 +283,6 @@ def batch_convert_rgba(directory_path, background_color=(255, 255, 255), quality
             print(f"    - {f}")
 
     print(f"\n- 跳过(非RGBA): {skip_count} 个文件")
-    if skip_files:
-        for f, reason in skip_files:
-            print(f"    - {f}")
 
     print(f"\n✗ 转换失败: {fail_count} 个文件")
     if fail_files:
@@ -147,11 +290,11 @@ def batch_convert_rgba(directory_path, background_color=(255, 255, 255), quality
             print(f"    - {f}: {error}")
 
     print("\n" + "=" * 60)
-    print(f"总计: 处理 {len(image_files)} 个文件")
+    print(f"总计: 处理 {len(todo)} 个文件（日志中已完成 {len(image_files) - len(todo)} 个）")
     print(f"      成功 {success_count} | 跳过 {skip_count} | 失败 {fail_count}")
 
-    if success_count > 0:
-        print(f"\n提示: 原始RGBA文件已备份为 *_rgba_backup_时间戳.* 格式")
+    if success_count > 0 and backup:
+        print(f"\n提示: 原始RGBA文件按内容哈希备份在 {backup_dir}，对应关系见 {journal_path}")
 
     return success_count, skip_count, fail_count
 
@@ -175,5 +318,8 @@ if __name__ == "__main__":
     # 3. 设置JPEG压缩质量 (1-100, 越高质量越好但文件越大)
     jpeg_quality = 95
 
+    # 4. 先设为True查看需要转换的文件，确认后改为False执行转换
+    dry_run = False
+
     # ========== 执行转换 ==========
-    batch_convert_rgba(convert_directory, background, jpeg_quality)
\ No newline at end of file
+    batch_convert_rgba(convert_directory, background, jpeg_quality, dry_run=dry_run)
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+数据集预处理流水线
+把原来分散在 Modify_resolution.py（缩放）、Horizontal_flip.py（水平翻转）、Modify_ImageRGB.py（RGBA转RGB）、
+Image_CheckNaN.py（检查非法值）中的处理合并为一次遍历：每张图像只读取、解码一次，依次经过声明的处理步骤，
+所有输出由多个进程并行编码写入，并在输出文件夹中记录清单（prepare_manifest.json）。
+重新运行时，源文件与处理步骤都没有变化、且输出文件仍然存在的图像会被跳过。
+
+处理步骤的输入输出均为 [(文件名后缀, PIL Image), ...]，一张图像可以产生多个输出（如原图+翻转图）。
+步骤必须是模块级函数或其functools.partial（可被pickle），清单中用transform_signature记录。
+内置步骤带有显式的cache_signature（名称+版本），直接运行本脚本（__main__）与作为模块导入时签名相同；
+修改步骤的处理结果时递增其版本，使旧输出重新生成。
+
+用法示例（生成LoRA训练集：检查 -> RGBA合成白底 -> 缩放到1024x768 -> 原图+水平翻转，描述文本一并复制）:
+    python Prepare_pipeline.py --input ../../Dataset/Work_Ship/5_Tugboat --output E:/LoRA/5_Tugboat \
+        --ops validate flatten resize=1024x768 flip
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+from PIL import Image
+
+# 将Evaluate目录加入搜索路径，以便作为脚本直接运行
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
+
+from Image_handle.Image_cache import transform_signature
+from Image_handle.Image_loader import flatten_rgba, list_images
+
+# 清单文件名（保存在输出文件夹中）与格式版本
+MANIFEST_FILENAME = "prepare_manifest.json"
+MANIFEST_VERSION = 1
+
+# JPEG输出质量（与Modify_ImageRGB.py一致）
+JPEG_QUALITY = 95
+
+
+class InvalidImageError(ValueError):
+    """图像内容不合法（尺寸过小、包含NaN/Inf等）"""
+
+
+# ---------------- 处理步骤 ----------------
+
+def validate(variants, min_size=1):
+    """
+    检查图像：尺寸不小于min_size，浮点/高位深图像不含NaN或Inf（Image_CheckNaN.py的检查）
+
+    不合法时抛出InvalidImageError，该图像不产生任何输出
+    """
+    for suffix, image in variants:
+        if min(image.size) < min_size:
+            raise InvalidImageError(f"尺寸过小: {image.size}")
+        if image.mode in ('F', 'I', 'I;16'):
+            values = np.asarray(image, dtype=np.float64)
+            if not np.isfinite(values).all():
+                raise InvalidImageError("图像包含非法值（NaN/Inf）")
+    return variants
+
+
+validate.cache_signature = "prepare.validate:v1"
+
+
+def flatten(variants, background_color=(255, 255, 255)):
+    """转换为RGB，带透明通道的图像以背景色合成（Modify_ImageRGB.py的转换）"""
+    result = []
+    for suffix, image in variants:
+        # 调色板/灰度图像的透明信息先转换为alpha通道，避免直接convert('RGB')丢失透明区域
+        if image.mode in ('LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+            image = image.convert('RGBA')
+        result.append((suffix, flatten_rgba(image, background_color)))
+    return result
+
+
+flatten.cache_signature = "prepare.flatten:v1"
+
+
+def resize(variants, size=(1024, 768), resample=Image.BICUBIC):
+    """缩放到固定尺寸 (宽, 高)（Modify_resolution.py的缩放）"""
+    size = tuple(size)
+    return [(suffix, image if image.size == size else image.resize(size, resample)) for suffix, image in variants]
+
+
+resize.cache_signature = "prepare.resize:v1"
+
+
+def horizontal_flip(variants, keep_original=True, suffix="_flipped"):
+    """水平翻转（Horizontal_flip.py的翻转），keep_original为True时同时保留原图"""
+    flipped = [(name + suffix, image.transpose(Image.Transpose.FLIP_LEFT_RIGHT)) for name, image in variants]
+    return list(variants) + flipped if keep_original else flipped
+
+
+horizontal_flip.cache_signature = "prepare.horizontal_flip:v1"
+
+
+def parse_ops(names):
+    """
+    解析命令行中的处理步骤
+
+    Args:
+        names: 如 ['validate', 'flatten', 'resize=1024x768', 'flip']，
+               另有 flip-only（只保留翻转图）、flatten=0,0,0（指定背景色）
+
+    Returns:
+        处理步骤列表
+    """
+    ops = []
+    for item in names:
+        name, _, value = item.partition('=')
+        if name == 'validate':
+            ops.append(partial(validate, min_size=int(value)) if value else validate)
+        elif name == 'flatten':
+            ops.append(partial(flatten, background_color=tuple(int(c) for c in value.split(','))) if value else flatten)
+        elif name == 'resize':
+            width, height = (int(v) for v in value.lower().split('x'))
+            ops.append(partial(resize, size=(width, height)))
+        elif name == 'flip':
+            ops.append(horizontal_flip)
+        elif name == 'flip-only':
+            ops.append(partial(horizontal_flip, keep_original=False))
+        else:
+            raise ValueError(f"不支持的处理步骤: {item}，可选: validate, flatten, resize=WxH, flip, flip-only")
+    return ops
+
+
+# ---------------- 单张图像（在工作进程中执行） ----------------
+
+def _save_image(image, path):
+    """按扩展名保存图像（先写临时文件再原子替换）"""
+    extension = os.path.splitext(path)[1].lower()
+    image_format = Image.registered_extensions().get(extension)
+    if image_format is None:
+        raise ValueError(f"不支持的输出格式: {extension}")
+    save_kwargs = {}
+    if image_format == 'JPEG':
+        save_kwargs['quality'] = JPEG_QUALITY
+        if image.mode not in ('RGB', 'L'):
+            image = flatten_rgba(image)
+    tmp_path = f"{path}.tmp"
+    image.save(tmp_path, format=image_format, **save_kwargs)
+    os.replace(tmp_path, path)
+
+
+def process_image(input_path, output_dir, ops, output_format=None, copy_captions=True):
+    """
+    读取一张图像，依次执行处理步骤并写入全部输出
+
+    Args:
+        input_path: 源图像路径
+        output_dir: 输出文件夹
+        ops: 处理步骤列表
+        output_format: 输出扩展名（如 '.png'），默认与源文件相同
+        copy_captions: 源图像有同名.txt描述文本时，为每个输出复制一份
+
+    Returns:
+        清单条目dict（失败时包含error）
+    """
+    stat = os.stat(input_path)
+    entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': None, 'outputs': [], 'error': None}
+    try:
+        # 文件只读取一次：同一份字节用于计算哈希和解码
+        with open(input_path, 'rb') as f:
+            data = f.read()
+        entry['sha256'] = hashlib.sha256(data).hexdigest()
+        image = Image.open(io.BytesIO(data))
+        image.load()
+
+        variants = [("", image)]
+        for op in ops:
+            variants = op(variants)
+
+        stem, extension = os.path.splitext(os.path.basename(input_path))
+        extension = output_format or extension
+        caption_file = os.path.splitext(input_path)[0] + ".txt"
+        caption = None
+        if copy_captions and os.path.exists(caption_file):
+            with open(caption_file, 'r', encoding='utf-8') as f:
+                caption = f.read()
+
+        for suffix, result in variants:
+            filename = f"{stem}{suffix}{extension}"
+            _save_image(result, os.path.join(output_dir, filename))
+            output = {'file': filename, 'width': result.width, 'height': result.height, 'mode': result.mode}
+            if caption is not None:
+                output['caption'] = f"{stem}{suffix}.txt"
+                with open(os.path.join(output_dir, output['caption']), 'w', encoding='utf-8') as f:
+                    f.write(caption)
+            entry['outputs'].append(output)
+    except Exception as e:
+        entry['outputs'] = []
+        entry['error'] = f"{type(e).__name__}: {e}"
+    return entry
+
+
+# ---------------- 流水线 ----------------
+
+class PreparePipeline:
+    def __init__(self, ops, output_format=None, copy_captions=True, workers=None, backend='process'):
+        """
+        数据集预处理流水线
+
+        Args:
+            ops: 处理步骤列表（见模块说明）
+            output_format: 输出扩展名（如 '.png'），默认与源文件相同
+            copy_captions: 是否为每个输出复制源图像的同名.txt描述文本
+            workers: 并行进程/线程数，默认CPU核数
+            backend: 'process'（编码PNG等CPU密集操作，默认）或 'thread'
+        """
+        if backend not in ('thread', 'process'):
+            raise ValueError(f"不支持的backend: {backend}")
+        self.ops = list(ops)
+        self.output_format = output_format
+        self.copy_captions = copy_captions
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.backend = backend
+
+    @property
+    def signature(self):
+        """处理步骤与输出设置的签名，变化后全部图像重新处理"""
+        return [transform_signature(op) for op in self.ops] + [f"format={self.output_format}",
+                                                               f"captions={self.copy_captions}"]
+
+    def _load_manifest(self, output_dir):
+        path = os.path.join(output_dir, MANIFEST_FILENAME)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"清单读取失败，将全部重新处理: {e}")
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION or manifest.get('ops') != self.signature:
+            return {}
+        return manifest.get('sources', {})
+
+    def _is_current(self, entry, input_path, output_dir):
+        """源文件未变化、上次处理成功且输出文件都存在"""
+        if not entry or entry.get('error'):
+            return False
+        stat = os.stat(input_path)
+        if (entry['size'], entry['mtime_ns']) != (stat.st_size, stat.st_mtime_ns):
+            return False
+        return all(os.path.exists(os.path.join(output_dir, output['file'])) for output in entry['outputs'])
+
+    def run(self, input_dir, output_dir):
+        """
+        处理input_dir中的全部图像，输出到output_dir
+
+        Returns:
+            清单dict：{'version', 'ops', 'input_dir', 'sources': {源文件名: 条目}}
+        """
+        if os.path.abspath(input_dir) == os.path.abspath(output_dir):
+            raise ValueError("输出文件夹不能与输入文件夹相同")
+        os.makedirs(output_dir, exist_ok=True)
+
+        filenames, paths = list_images(input_dir)
+        previous = self._load_manifest(output_dir)
+        sources = {}
+        todo = []
+        for filename, path in zip(filenames, paths):
+            if self._is_current(previous.get(filename), path, output_dir):
+                sources[filename] = previous[filename]
+            else:
+                todo.append((filename, path))
+        print(f"共 {len(filenames)} 张图像，跳过未变化的 {len(filenames) - len(todo)} 张，需要处理 {len(todo)} 张"
+              f"（{self.workers} 个{'进程' if self.backend == 'process' else '线程'}）")
+
+        start_time = time.time()
+        worker = partial(process_image, output_dir=output_dir, ops=self.ops, output_format=self.output_format,
+                         copy_captions=self.copy_captions)
+        executor_cls = ProcessPoolExecutor if self.backend == 'process' else ThreadPoolExecutor
+        if todo:
+            with executor_cls(max_workers=self.workers) as executor:
+                chunksize = max(1, len(todo) // (self.workers * 4))
+                for (filename, _), entry in zip(todo, executor.map(worker, [path for _, path in todo],
+                                                                   chunksize=chunksize)):
+                    sources[filename] = entry
+                    if entry['error']:
+                        print(f"✗ {filename}: {entry['error']}")
+
+        manifest = {'version': MANIFEST_VERSION, 'ops': self.signature, 'input_dir': os.path.abspath(input_dir),
+                    'sources': dict(sorted(sources.items()))}
+        manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+        with open(f"{manifest_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+
+        failed = sum(1 for entry in sources.values() if entry['error'])
+        outputs = sum(len(entry['outputs']) for entry in sources.values())
+        print(f"完成: 输出 {outputs} 张，失败 {failed} 张，用时 {time.time() - start_time:.1f} 秒，清单: {manifest_path}")
+        return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据集预处理：一次读取完成检查、RGBA合成、缩放、翻转等步骤")
+    parser.add_argument('--input', required=True, help="源图像文件夹")
+    parser.add_argument('--output', required=True, help="输出文件夹")
+    parser.add_argument('--ops', nargs='+', required=True,
+                        help="处理步骤（按顺序）: validate[=最小边长] flatten[=R,G,B] resize=WxH flip flip-only")
+    parser.add_argument('--format', dest='output_format', help="输出扩展名，如 .png（默认与源文件相同）")
+    parser.add_argument('--no-captions', action='store_true', help="不复制同名.txt描述文本")
+    parser.add_argument('--workers', type=int, help="并行进程数（默认CPU核数）")
+    args = parser.parse_args()
+
+    pipeline = PreparePipeline(parse_ops(args.ops), output_format=args.output_format,
+                               copy_captions=not args.no_captions, workers=args.workers)
+    pipeline.run(args.input, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+评估结果持久化存储（SQLite）
+每个图像文件夹对应一份结果库（默认保存在用户缓存目录，不在图像文件夹中写入文件），
+以 (文件内容哈希, 指标, 指标版本, 提示词哈希) 为键。
+重新评估同一文件夹时只计算新增或内容变化的图像，其余分数直接从结果库读取并合并。
+文件的内容哈希也按 (路径, 大小, 修改时间ns) 记录在结果库中，重新运行时只对变化的文件重新计算哈希。
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from Image_handle.File_hash import file_signature
+from Image_handle.Image_cache import content_hash
+
+# 结果库默认保存目录，文件名由图像文件夹的绝对路径哈希得到
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "metric_scores")
+
+# SQLite单条语句的参数数量有限，按批查询
+_QUERY_CHUNK = 500
+
+
+def text_hash(text):
+    """
+    计算提示词的哈希（无提示词的指标使用空字符串）
+
+    参数:
+        text: 提示词或None
+
+    返回:
+        十六进制摘要字符串
+    """
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class ScoreStore:
+    def __init__(self, db_path):
+        """
+        评估结果库
+
+        Args:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS scores ("
+                " file_hash TEXT NOT NULL,"
+                " metric TEXT NOT NULL,"
+                " metric_version TEXT NOT NULL,"
+                " prompt_hash TEXT NOT NULL,"
+                " filename TEXT,"
+                " score REAL NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (file_hash, metric, metric_version, prompt_hash))")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS file_hashes ("
+                " path TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " file_hash TEXT NOT NULL)")
+
+    @classmethod
+    def for_folder(cls, folder, store_dir=DEFAULT_STORE_DIR):
+        """
+        打开图像文件夹对应的结果库（保存在store_dir中，不修改图像文件夹；需要指定位置时直接使用ScoreStore(db_path)）
+
+        Args:
+            folder: 图像文件夹路径
+            store_dir: 结果库保存目录
+
+        Returns:
+            ScoreStore
+        """
+        folder = os.path.abspath(folder)
+        os.makedirs(store_dir, exist_ok=True)
+        name = hashlib.sha256(folder.encode("utf-8")).hexdigest()[:16]
+        return cls(os.path.join(store_dir, f"{name}.sqlite"))
+
+    def file_hashes(self, paths):
+        """
+        获取文件内容哈希：大小与修改时间与结果库中的记录一致时直接复用，否则重新计算并更新记录
+
+        Args:
+            paths: 图像路径列表
+
+        Returns:
+            与paths顺序一致的哈希列表
+        """
+        abs_paths = [os.path.abspath(path) for path in paths]
+        unique_paths = list(dict.fromkeys(abs_paths))
+        known = {}
+        for i in range(0, len(unique_paths), _QUERY_CHUNK):
+            chunk = unique_paths[i:i + _QUERY_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT path, size, mtime_ns, file_hash FROM file_hashes WHERE path IN ({placeholders})", chunk)
+            known.update((path, ((size, mtime_ns), file_hash)) for path, size, mtime_ns, file_hash in rows)
+
+        hashes = {}
+        changed = []
+        for path in unique_paths:
+            signature = file_signature(path)
+            entry = known.get(path)
+            if entry is not None and entry[0] == signature:
+                hashes[path] = entry[1]
+            else:
+                hashes[path] = content_hash(path)
+                changed.append((path, signature[0], signature[1], hashes[path]))
+
+        if changed:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, file_hash) VALUES (?, ?, ?, ?)",
+                    changed)
+        return [hashes[path] for path in abs_paths]
+
+    def lookup(self, file_hashes, metric, metric_version, prompt=None):
+        """
+        查询已保存的分数
+
+        Args:
+            file_hashes: 文件内容哈希列表
+            metric: 指标名称
+            metric_version: 指标版本（模型与权重），版本变化后旧结果不再命中
+            prompt: 提示词，无提示词的指标为None
+
+        Returns:
+            {文件哈希: 分数}，只包含命中的条目
+        """
+        prompt_hash = text_hash(prompt)
+        unique_hashes = list(dict.fromkeys(file_hashes))
+        found = {}
+        for i in range(0, len(unique_hashes), _QUERY_CHUNK):
+            chunk = unique_hashes[i:i + _QUERY_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT file_hash, score FROM scores WHERE metric = ? AND metric_version = ? AND prompt_hash = ?"
+                f" AND file_hash IN ({placeholders})",
+                [metric, metric_version, prompt_hash] + chunk)
+            found.update(rows)
+        return found
+
+    def save(self, rows, metric, metric_version, prompt=None):
+        """
+        保存分数（同一个键已存在时覆盖）
+
+        Args:
+            rows: (文件哈希, 文件名, 分数) 的可迭代对象
+            metric: 指标名称
+            metric_version: 指标版本
+            prompt: 提示词，无提示词的指标为None
+        """
+        prompt_hash = text_hash(prompt)
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scores"
+                " (file_hash, metric, metric_version, prompt_hash, filename, score, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(file_hash, metric, metric_version, prompt_hash, filename, float(score), now)
+                 for file_hash, filename, score in rows])
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def score_incremental(store, paths, metric, metric_version, score_fn, prompt=None):
+    """
+    增量评估：只对结果库中没有的图像调用score_fn，再与已保存的分数合并
+
+    Args:
+        store: ScoreStore
+        paths: 图像路径列表
+        metric: 指标名称
+        metric_version: 指标版本
+        score_fn: 打分函数，输入待计算的图像路径列表，返回与之一一对应的分数（读取失败为NaN，不会保存）
+        prompt: 提示词，无提示词的指标为None
+
+    Returns:
+        与paths顺序一致的[N]分数数组，读取失败的图像为NaN
+    """
+    hashes = store.file_hashes(paths)
+    cached = store.lookup(hashes, metric, metric_version, prompt)
+
+    scores = np.full(len(paths), np.nan)
+    missing = []
+    for index, file_hash in enumerate(hashes):
+        if file_hash in cached:
+            scores[index] = cached[file_hash]
+        else:
+            missing.append(index)
+    print(f"{metric}: 复用已保存结果 {len(paths) - len(missing)} 张，需要计算 {len(missing)} 张")
+
+    if missing:
+        new_scores = np.asarray(score_fn([paths[i] for i in missing]), dtype=np.float64)
+        scores[missing] = new_scores
+        store.save(((hashes[i], os.path.basename(paths[i]), score)
+                    for i, score in zip(missing, new_scores) if not np.isnan(score)),
+                   metric, metric_version, prompt)
+    return scores
+
+
+def score_incremental_pairs(store, paths, prompts, metric, metric_version, score_fn):
+    """
+    按每张图像各自的提示词（描述文本）增量评估，结果库的键与score_incremental相同
+
+    Args:
+        store: ScoreStore
+        paths: 图像路径列表
+        prompts: 与paths一一对应的提示词
+        metric: 指标名称
+        metric_version: 指标版本
+        score_fn: 打分函数 score_fn(待计算的图像路径列表, 对应的提示词列表)，返回一一对应的分数（读取失败为NaN）
+
+    Returns:
+        与paths顺序一致的[N]分数数组，读取失败的图像为NaN
+    """
+    hashes = store.file_hashes(paths)
+    scores = np.full(len(paths), np.nan)
+
+    # 按提示词分组查询
+    groups = {}
+    for index, prompt in enumerate(prompts):
+        groups.setdefault(prompt, []).append(index)
+    for prompt, indices in groups.items():
+        cached = store.lookup([hashes[i] for i in indices], metric, metric_version, prompt)
+        for i in indices:
+            if hashes[i] in cached:
+                scores[i] = cached[hashes[i]]
+
+    missing = [i for i in range(len(paths)) if np.isnan(scores[i])]
+    print(f"{metric}: 复用已保存结果 {len(paths) - len(missing)} 张，需要计算 {len(missing)} 张"
+          f"（提示词 {len(groups)} 个）")
+
+    if missing:
+        new_scores = np.asarray(score_fn([paths[i] for i in missing], [prompts[i] for i in missing]),
+                                dtype=np.float64)
+        scores[missing] = new_scores
+        for prompt in {prompts[i] for i in missing}:
+            store.save(((hashes[i], os.path.basename(paths[i]), score)
+                        for i, score in zip(missing, new_scores) if prompts[i] == prompt and not np.isnan(score)),
+                       metric, metric_version, prompt)
+    return scores
@@ -0,0 +1,154 @@
+import contextlib
+from dataclasses import dataclass
+
+import numpy as np
+import torch
+from scipy import stats
+
+
+@dataclass
+class ToleranceReport:
+    """快速推理与fp32参考结果的对比"""
+    max_abs_diff: float         # 最大绝对误差
+    mean_abs_diff: float        # 平均绝对误差
+    rank_correlation: float     # Spearman秩相关系数（排名是否保持一致）
+    passed: bool                # 是否满足容差要求
+
+
+class InferenceMode:
+    def __init__(self, device, fast=False, dtype=torch.bfloat16, channels_last=True, compile_model=False):
+        """
+        推理模式设置：默认fp32；fast=True时启用混合精度autocast、channels_last内存格式与可选的torch.compile
+
+        Args:
+            device: 计算设备
+            fast: 是否启用快速推理（需显式开启）
+            dtype: CPU上autocast使用的精度，默认bfloat16（GPU上固定使用float16）
+            channels_last: 快速推理时是否把卷积模型和输入转换为channels_last格式
+            compile_model: 快速推理时是否用torch.compile编译模型
+        """
+        self.device = torch.device(device)
+        self.fast = fast
+        self.dtype = dtype
+        self.channels_last = channels_last
+        self.compile_model = compile_model
+
+    def prepare_model(self, model):
+        """
+        为推理准备模型（eval模式，快速推理时转换内存格式并按需编译）
+
+        Returns:
+            可直接调用的模型（编译后为包装后的模块）
+        """
+        model.eval()
+        if not self.fast:
+            return model
+        if self.channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        if self.compile_model:
+            model = torch.compile(model)
+        return model
+
+    def prepare_input(self, tensor):
+        """快速推理时把4维图像batch转换为channels_last格式"""
+        if self.fast and self.channels_last and tensor.dim() == 4:
+            return tensor.contiguous(memory_format=torch.channels_last)
+        return tensor
+
+    def context(self):
+        """
+        推理上下文：始终使用torch.inference_mode，快速推理时再叠加autocast
+
+        用法:
+            with self.inference.context():
+                ...
+        """
+        stack = contextlib.ExitStack()
+        stack.enter_context(torch.inference_mode())
+        if self.fast:
+            dtype = self.dtype if self.device.type == 'cpu' else torch.float16
+            stack.enter_context(torch.autocast(device_type=self.device.type, dtype=dtype))
+        return stack
+
+
+def compare_scores(reference_scores, fast_scores, atol=1e-2, min_rank_correlation=0.99):
+    """
+    对比快速推理与fp32参考的分数
+
+    Args:
+        reference_scores: fp32参考分数
+        fast_scores: 快速推理分数
+        atol: 允许的最大绝对误差
+        min_rank_correlation: 允许的最小Spearman秩相关系数
+
+    Returns:
+        ToleranceReport
+    """
+    reference_scores = np.asarray(reference_scores, dtype=np.float64)
+    fast_scores = np.asarray(fast_scores, dtype=np.float64)
+    diff = np.abs(reference_scores - fast_scores)
+
+    if len(reference_scores) > 1:
+        rank_correlation = float(stats.spearmanr(reference_scores, fast_scores)[0])
+        if np.isnan(rank_correlation):
+            # 有一组分数全部相同：两组都相同时排名一致，否则说明快速推理丢失了排名信息
+            same = np.ptp(reference_scores) == 0 and np.ptp(fast_scores) == 0
+            rank_correlation = 1.0 if same else 0.0
+    else:
+        rank_correlation = 1.0
+
+    max_abs_diff = float(diff.max()) if diff.size else 0.0
+    passed = max_abs_diff <= atol and rank_correlation >= min_rank_correlation
+    return ToleranceReport(max_abs_diff=max_abs_diff, mean_abs_diff=float(diff.mean()) if diff.size else 0.0,
+                           rank_correlation=rank_correlation, passed=passed)
+
+
+def check_scores(reference_fn, candidate_fn, calibration_images, atol=1e-2, min_rank_correlation=0.99,
+                 label="快速推理"):
+    """
+    在校准图像集上对比参考打分函数与加速后的打分函数（快速推理、int8量化等）
+
+    Args:
+        reference_fn: fp32参考打分函数，输入图像列表，返回分数列表
+        candidate_fn: 加速后的打分函数
+        calibration_images: 校准图像列表
+        atol: 允许的最大绝对误差
+        min_rank_correlation: 允许的最小Spearman秩相关系数
+        label: 打印时的名称
+
+    Returns:
+        ToleranceReport
+    """
+    report = compare_scores(reference_fn(calibration_images), candidate_fn(calibration_images),
+                            atol, min_rank_correlation)
+    status = "通过" if report.passed else "未通过"
+    print(f"{label}校准{status}: 最大误差 {report.max_abs_diff:.6f}，平均误差 {report.mean_abs_diff:.6f}，"
+          f"秩相关 {report.rank_correlation:.4f}（{len(calibration_images)} 张图像）")
+    return report
+
+
+def check_fast_inference(inference, score_fn, calibration_images, atol=1e-2, min_rank_correlation=0.99):
+    """
+    在校准图像集上分别以fp32与快速推理打分，检查误差是否在容差之内
+
+    Args:
+        inference: 评估器使用的InferenceMode（会临时切换fast开关，结束后恢复）
+        score_fn: 打分函数，输入图像列表，返回分数列表
+        calibration_images: 校准图像列表
+        atol: 允许的最大绝对误差
+        min_rank_correlation: 允许的最小Spearman秩相关系数
+
+    Returns:
+        ToleranceReport
+    """
+    def score_with(fast):
+        def run(images):
+            previous = inference.fast
+            inference.fast = fast
+            try:
+                return score_fn(images)
+            finally:
+                inference.fast = previous
+        return run
+
+    return check_scores(score_with(False), score_with(True), calibration_images, atol, min_rank_correlation)
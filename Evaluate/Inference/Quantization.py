@@ -0,0 +1,134 @@
+import os
+
+import torch
+import torch.nn as nn
+
+# 量化权重的保存目录（不写入模型原始权重所在的目录，如site-packages或HuggingFace缓存）
+QUANTIZED_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "quantized_models")
+
+# 支持的量化方式
+#   dynamic: 动态int8量化，只量化nn.Linear（适合CLIP/BLIP等Transformer图像塔），无需校准数据；
+#            量化本身只是逐层转换权重，每次加载时直接量化，不保存量化权重
+#   static:  静态int8量化（FX图模式），卷积与激活都量化（适合AlexNet/VGG等卷积骨干），需要校准数据；
+#            校准需要跑一遍校准图像，量化权重保存在QUANTIZED_CACHE_DIR，之后直接加载
+QUANTIZE_MODES = ('dynamic', 'static')
+
+
+def _quantized_engine():
+    """选择可用的量化后端"""
+    engines = torch.backends.quantized.supported_engines
+    for engine in ('x86', 'fbgemm', 'qnnpack'):
+        if engine in engines:
+            return engine
+    raise RuntimeError(f"当前PyTorch不支持int8量化后端: {engines}")
+
+
+def quantized_weights_path(original_path, mode, tag="", cache_dir=QUANTIZED_CACHE_DIR):
+    """
+    量化权重的保存路径：按原始权重的文件名保存在cache_dir中
+
+    Args:
+        original_path: 原始权重路径
+        mode: 量化方式
+        tag: 附加在文件名中的标识（如量化的是哪个子模块）
+        cache_dir: 保存目录
+
+    Returns:
+        量化权重路径
+    """
+    filename = f"{os.path.splitext(os.path.basename(original_path))[0]}{tag}.int8-{mode}.pt"
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, filename)
+
+
+def source_key(original_path):
+    """
+    量化权重对应的来源：原始权重的文件名与大小 + PyTorch版本（量化模块的序列化格式随版本变化）
+
+    Returns:
+        dict，与量化权重一起保存，不一致时重新量化
+    """
+    return {'source': os.path.basename(original_path), 'source_size': os.path.getsize(original_path),
+            'torch': str(torch.__version__)}
+
+
+def quantize_dynamic_int8(model):
+    """动态int8量化：nn.Linear的权重量化为int8，激活在运行时动态量化"""
+    return torch.ao.quantization.quantize_dynamic(model.eval(), {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static_int8(model, example_input, calibration_batches=()):
+    """
+    静态int8量化（FX图模式）
+
+    Args:
+        model: fp32模型
+        example_input: 用于图追踪的示例输入
+        calibration_batches: 校准输入的可迭代对象，用于统计各层激活的取值范围；
+                             为空时得到未校准的模型结构，只能用于随后加载已保存的量化权重
+
+    Returns:
+        量化后的GraphModule
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    engine = _quantized_engine()
+    torch.backends.quantized.engine = engine
+    prepared = prepare_fx(model.eval(), get_default_qconfig_mapping(engine), (example_input,))
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def load_or_quantize(model, mode, original_path, tag="", example_input=None, calibration_batches=None):
+    """
+    静态量化：优先加载QUANTIZED_CACHE_DIR中已保存的量化权重，不存在、原始权重或PyTorch版本变化时重新校准并保存；
+    动态量化：直接量化（加载已保存的权重前同样要先执行quantize_dynamic构建量化模块，保存不能省去任何计算）
+
+    Args:
+        model: fp32模型（只在CPU上运行）
+        mode: 'dynamic' 或 'static'
+        original_path: 被量化模块的原始权重路径（决定量化权重的文件名，并用于检查原始权重是否变化）
+        tag: 文件名附加标识
+        example_input: 静态量化的示例输入
+        calibration_batches: 静态量化的校准输入（首次量化时必需）
+
+    Returns:
+        量化后的模型
+    """
+    if mode not in QUANTIZE_MODES:
+        raise ValueError(f"不支持的量化方式: {mode}，可选值: {list(QUANTIZE_MODES)}")
+    if mode == 'dynamic':
+        return quantize_dynamic_int8(model)
+    if example_input is None:
+        raise ValueError("静态量化需要example_input")
+
+    path = quantized_weights_path(original_path, mode, tag)
+    key = source_key(original_path)
+
+    saved = None
+    if os.path.exists(path):
+        try:
+            saved = torch.load(path, map_location='cpu')
+        except Exception as e:
+            print(f"量化权重读取失败，将重新量化: {e}")
+        if saved is not None and any(saved.get(name) != value for name, value in key.items()):
+            saved = None
+
+    if saved is not None:
+        quantized = quantize_static_int8(model, example_input)
+        quantized.load_state_dict(saved['state_dict'])
+        print(f"已加载量化权重: {path}")
+        return quantized
+
+    if calibration_batches is None:
+        raise ValueError(f"未找到已保存的量化权重 {path}，首次静态量化需要提供校准图像")
+    quantized = quantize_static_int8(model, example_input, calibration_batches)
+
+    tmp_path = f"{path}.tmp"
+    torch.save({'state_dict': quantized.state_dict(), **key}, tmp_path)
+    os.replace(tmp_path, path)
+    print(f"量化权重已保存到: {path}")
+    return quantized
@@ -1,11 +1,34 @@
 import os
+import sys
+from collections import OrderedDict
+from functools import partial
+from urllib import parse
 
 import torch
+import torchvision
 import lpips
 from PIL import Image
 import torchvision.transforms as transforms
 import numpy as np
 
+# 将Evaluate目录加入搜索路径，以便导入Image_handle中的公共模块
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
+
+from Image_handle.Image_loader import load_rgb_image, decode_image, resize_rgb
+from Image_handle.Image_cache import PreprocessedImageCache, DEFAULT_CACHE_DIR
+from Inference.Inference_mode import InferenceMode
+from Inference.Quantization import load_or_quantize
+
+# LPIPS输入尺寸 (宽, 高)
+LPIPS_IMAGE_SIZE = (600, 400)
+
+# 特征缓存与两两距离矩阵分块计算的默认内存上限（字节）
+# VGG在400x600下每张图像的各层fp16特征约58MB，AlexNet约3MB
+DEFAULT_FEATURE_CACHE_BYTES = 1 << 30
+DEFAULT_MATRIX_FEATURE_BYTES = 2 << 30
+
 def interpret_lpips_score(lpips_value):
     """
     解释LPIPS分数
@@ -23,25 +46,129 @@ def interpret_lpips_score(lpips_value):
     else:
         return "差异很大，几乎完全不同"
 
+def load_lpips_image(image, cache=None):
+    """
+    读取图像并缩放到LPIPS输入尺寸（缩放方式与transforms.Resize相同，之后的Resize不再改变图像）
+
+    Args:
+        image: 图像路径、PIL Image或numpy array
+        cache: 可选的PreprocessedImageCache，仅对路径输入生效
+
+    Returns:
+        RGB格式的PIL Image
+    """
+    if isinstance(image, str):
+        array = decode_image(image, transform=partial(resize_rgb, size=LPIPS_IMAGE_SIZE), cache=cache)
+        # 复制一份，避免持有缓存文件的内存映射
+        return Image.fromarray(np.array(array))
+    return load_rgb_image(image)
+
+
+# lpips各骨干网络使用的torchvision预训练权重（lpips以pretrained=True加载，对应IMAGENET1K_V1）
+BACKBONE_WEIGHTS = {
+    'alex': 'AlexNet_Weights',
+    'vgg': 'VGG16_Weights',
+    'squeeze': 'SqueezeNet1_1_Weights',
+}
+
+
+def backbone_checkpoint(net):
+    """
+    lpips骨干网络的torchvision预训练权重文件（torch hub缓存中的路径，文件名包含权重哈希）
+
+    Returns:
+        权重文件路径
+    """
+    weights = getattr(torchvision.models, BACKBONE_WEIGHTS[net]).IMAGENET1K_V1
+    path = os.path.join(torch.hub.get_dir(), 'checkpoints', os.path.basename(parse.urlparse(weights.url).path))
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"未找到{net}骨干网络的预训练权重: {path}")
+    return path
+
+class LPIPSImageDataset(torch.utils.data.Dataset):
+    """按路径读取并预处理候选图像，供DataLoader在工作进程中并行解码"""
+
+    def __init__(self, image_paths, transform, cache=None):
+        self.image_paths = image_paths
+        self.transform = transform
+        self.cache = cache
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    def __getitem__(self, index):
+        image = load_lpips_image(self.image_paths[index], self.cache)
+        # LPIPS需要归一化到[-1, 1]
+        return 2 * self.transform(image) - 1
+
+
 class LPIPSEvaluator:
-    def __init__(self, net='alex', device=None):
+    def __init__(self, net='alex', device=None, cache_dir=None, fast_inference=False, compile_model=False,
+                 quantize=None, calibration_images=None, feature_cache_bytes=DEFAULT_FEATURE_CACHE_BYTES):
         """
         初始化LPIPS评估器
 
         Args:
             net: 网络类型 ('alex', 'vgg', 'squeeze')
             device: 计算设备
+            cache_dir: 预处理图像缓存目录，为None时不使用缓存；
+                       启用后缩放到400x600的图像按内容哈希缓存，重复运行时跳过解码与缩放
+            fast_inference: 启用快速推理（CPU上bfloat16 autocast + channels_last），
+                            使用前建议用Inference_mode.check_fast_inference在校准集上检查误差
+            compile_model: 快速推理时是否用torch.compile编译骨干网络
+            quantize: 骨干网络的int8量化方式（仅CPU）：None、'static'（卷积骨干推荐）或 'dynamic'；
+                      静态量化的权重保存在用户缓存目录，之后直接加载，可用Inference_mode.check_scores对比fp32结果
+            calibration_images: 首次静态量化时用于统计激活范围的图像路径列表
+            feature_cache_bytes: 两两距离矩阵特征缓存的内存上限（字节），超出时按最近使用时间淘汰，0表示不缓存
         """
-        self.device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.device = torch.device(device) if device else torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.inference = InferenceMode(self.device, fast=fast_inference, compile_model=compile_model)
         self.loss_fn = lpips.LPIPS(net=net).to(self.device)
+        self.loss_fn.eval()
 
         # 定义预处理 图像预处理
         self.transform = transforms.Compose([
-            transforms.Resize((400, 600)),
+            transforms.Resize((LPIPS_IMAGE_SIZE[1], LPIPS_IMAGE_SIZE[0])),
             transforms.ToTensor(),
             transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
         ])
 
+        self.image_cache = PreprocessedImageCache(cache_dir) if cache_dir else None
+
+        if quantize:
+            if self.inference.device.type != 'cpu':
+                raise ValueError("int8量化只支持在CPU上运行")
+            if fast_inference:
+                raise ValueError("quantize与fast_inference不能同时启用")
+            self.loss_fn.net = self._quantize_backbone(net, quantize, calibration_images)
+        else:
+            self.loss_fn.net = self.inference.prepare_model(self.loss_fn.net)
+
+        # 两两距离矩阵使用的特征缓存（LRU）：(路径, 大小, 修改时间) -> 各层归一化特征
+        self.feature_cache_bytes = feature_cache_bytes
+        self._feature_cache = OrderedDict()
+        self._feature_cache_size = 0
+
+
+    def _quantize_backbone(self, net, mode, calibration_images):
+        """
+        int8量化骨干网络。静态量化的权重保存在用户缓存目录（如 ~/.cache/quantized_models/alexnet-owt-7be5be79-backbone.int8-static.pt），
+        并以torchvision骨干网络的预训练权重文件与PyTorch版本判断是否需要重新量化；动态量化每次直接执行
+
+        Returns:
+            量化后的骨干网络
+        """
+        original_path = backbone_checkpoint(net)
+        example_input = torch.zeros(1, 3, LPIPS_IMAGE_SIZE[1], LPIPS_IMAGE_SIZE[0])
+
+        calibration_batches = None
+        if calibration_images:
+            # 骨干网络的输入是经过scaling_layer的图像
+            calibration_batches = (self.loss_fn.scaling_layer(batch)
+                                   for batch in self.iter_image_batches(calibration_images, num_workers=0))
+
+        return load_or_quantize(self.loss_fn.net, mode, original_path, tag='-backbone',
+                                example_input=example_input, calibration_batches=calibration_batches)
 
     def preprocess_image(self, image_path):
         """
@@ -53,21 +180,7 @@ class LPIPSEvaluator:
         Returns:
             预处理后的tensor
         """
-        # 加载图像
-        if isinstance(image_path, str):
-            image = Image.open(image_path)
-        else:
-            image = image_path
-
-        # 处理RGBA图像
-        if image.mode == 'RGBA':
-            # 创建白色背景
-            background = Image.new('RGB', image.size, (255, 255, 255))
-            # 使用alpha通道作为mask进行粘贴
-            background.paste(image, mask=image.split()[3])
-            image = background
-        elif image.mode != 'RGB':
-            image = image.convert('RGB')
+        image = load_lpips_image(image_path, self.image_cache)
 
         # 转换为tensor
         img_tensor = self.transform(image)
@@ -96,15 +209,268 @@ class LPIPSEvaluator:
         img2_tensor = self.preprocess_image(img2_path)
 
         # 计算LPIPS
-        with torch.no_grad():
-            distance = self.loss_fn(img1_tensor, img2_tensor)
+        with self.inference.context():
+            distance = self.loss_fn(self.inference.prepare_input(img1_tensor),
+                                    self.inference.prepare_input(img2_tensor))
 
         return distance.item()
 
+    def iter_image_batches(self, images, batch_size=16, num_workers=2):
+        """
+        按batch产出预处理后的候选图像
+
+        Args:
+            images: 图像路径列表（由DataLoader多进程解码）或内存图像列表
+            batch_size: 批大小
+            num_workers: DataLoader工作进程数
+
+        Returns:
+            [B, 3, H, W]的tensor生成器
+        """
+        if all(isinstance(img, str) for img in images):
+            loader = torch.utils.data.DataLoader(LPIPSImageDataset(images, self.transform, self.image_cache),
+                                                 batch_size=batch_size,
+                                                 shuffle=False,
+                                                 num_workers=num_workers,
+                                                 pin_memory=self.device.type == 'cuda')
+            yield from loader
+            return
+
+        for i in range(0, len(images), batch_size):
+            yield torch.cat([self.preprocess_image(img) for img in images[i:i + batch_size]], dim=0)
+
+    def calculate_lpips_batch(self, reference, images, batch_size=16, num_workers=2):
+        """
+        批量计算一张参考图像与多张候选图像的LPIPS距离
+
+        参考图像只预处理一次，候选图像经DataLoader并行解码后按batch送入LPIPS网络
+
+        Args:
+            reference: 参考图像路径、PIL Image对象或已预处理的tensor
+            images: 候选图像路径列表或内存图像列表
+            batch_size: 批大小
+            num_workers: DataLoader工作进程数（为0时在主进程中解码）
+
+        Returns:
+            与images顺序一致的LPIPS距离列表
+        """
+        if isinstance(reference, torch.Tensor):
+            ref_tensor = reference.to(self.device)
+        else:
+            ref_tensor = self.preprocess_image(reference)
+
+        distances = []
+        with self.inference.context():
+            for batch in self.iter_image_batches(images, batch_size, num_workers):
+                batch = self.inference.prepare_input(batch.to(self.device, non_blocking=True))
+                ref_batch = self.inference.prepare_input(ref_tensor.expand(batch.shape[0], -1, -1, -1))
+                distance = self.loss_fn(ref_batch, batch)
+                distances.extend(distance.flatten().float().cpu().tolist())
+
+        return distances
+
+    def _extract_normalized_features(self, batch):
+        """
+        提取一个batch的LPIPS各层归一化特征（与lpips.LPIPS.forward中的处理一致）
+
+        Returns:
+            每层一个[B, C, H*W]的tensor
+        """
+        loss_fn = self.loss_fn
+        net_input = loss_fn.scaling_layer(batch) if loss_fn.version == '0.1' else batch
+        outs = loss_fn.net(self.inference.prepare_input(net_input))
+        return [lpips.normalize_tensor(outs[kk].float()).flatten(2) for kk in range(loss_fn.L)]
+
+    def _layer_weights(self, kk, channels):
+        """第kk层的通道权重（1x1卷积权重），非lpips模式下为全1"""
+        if self.loss_fn.lpips:
+            return self.loss_fn.lins[kk].model[-1].weight.detach().reshape(1, channels, 1)
+        return torch.ones(1, channels, 1, device=self.device)
+
+    def get_lpips_features(self, images, batch_size=16, num_workers=2, feature_dtype=torch.float16):
+        """
+        提取并缓存每张图像的LPIPS各层归一化特征，每张图像只经过一次骨干网络
+
+        Args:
+            images: 图像路径列表或内存图像列表（只有路径输入会被缓存）
+            batch_size: 批大小
+            num_workers: DataLoader工作进程数
+            feature_dtype: 缓存特征的数据类型，默认float16以减半内存占用
+
+        Returns:
+            每层一个[N, C, H*W]的CPU tensor
+        """
+        keys = [None] * len(images)
+        if all(isinstance(img, str) for img in images):
+            for index, path in enumerate(images):
+                stat = os.stat(path)
+                keys[index] = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+        # 结果直接写入预先分配的[N, C, H*W]张量，不再先收集每张图像的特征再stack复制一遍
+        outputs = None
+
+        def store(index, feats):
+            nonlocal outputs
+            if outputs is None:
+                outputs = [torch.empty((len(images),) + tuple(f.shape), dtype=feature_dtype) for f in feats]
+            for kk, f in enumerate(feats):
+                outputs[kk][index] = f
+
+        missing = []
+        for index, key in enumerate(keys):
+            cached = self._feature_cache.get(key) if key is not None else None
+            if cached is None:
+                missing.append(index)
+            else:
+                self._feature_cache.move_to_end(key)
+                store(index, cached)
+
+        if missing:
+            missing_images = [images[index] for index in missing]
+            position = 0
+            with self.inference.context():
+                for batch in self.iter_image_batches(missing_images, batch_size, num_workers):
+                    layers = self._extract_normalized_features(batch.to(self.device))
+                    for b in range(batch.shape[0]):
+                        index = missing[position + b]
+                        feats = [layer[b].to('cpu', feature_dtype) for layer in layers]
+                        store(index, feats)
+                        if keys[index] is not None:
+                            self._cache_features(keys[index], feats)
+                    position += batch.shape[0]
+
+        if outputs is None:
+            return []
+        return outputs
+
+    def _cache_features(self, key, feats):
+        """将一张图像的特征放入LRU缓存，总大小超过feature_cache_bytes时淘汰最久未使用的条目"""
+        size = sum(f.numel() * f.element_size() for f in feats)
+        if size > self.feature_cache_bytes:
+            return
+        self._feature_cache[key] = feats
+        self._feature_cache_size += size
+        while self._feature_cache_size > self.feature_cache_bytes:
+            _, evicted = self._feature_cache.popitem(last=False)
+            self._feature_cache_size -= sum(f.numel() * f.element_size() for f in evicted)
+
+    def clear_feature_cache(self):
+        """清空特征缓存"""
+        self._feature_cache.clear()
+        self._feature_cache_size = 0
+
+    def feature_bytes_per_image(self, feature_dtype=torch.float16):
+        """单张图像各层特征占用的字节数（所有输入都缩放到LPIPS_IMAGE_SIZE，因此与图像无关）"""
+        dummy = torch.zeros(1, 3, LPIPS_IMAGE_SIZE[1], LPIPS_IMAGE_SIZE[0], device=self.device)
+        with self.inference.context():
+            layers = self._extract_normalized_features(dummy)
+        element_size = torch.empty(0, dtype=feature_dtype).element_size()
+        return sum(layer[0].numel() for layer in layers) * element_size
+
+    def _pairwise_distances(self, row_features, col_features, chunk_size):
+        """
+        两组图像之间的LPIPS距离
+
+        利用 sum_c w_c (f_i - f_j)^2 = a_i + a_j - 2 * <w·f_i, f_j> 展开，每层的距离由分块矩阵乘法得到
+
+        Args:
+            row_features: 每层一个[R, C, H*W]的tensor
+            col_features: 每层一个[K, C, H*W]的tensor
+
+        Returns:
+            [R, K]的float64 tensor
+        """
+        def self_terms(feats, weights, hw):
+            # 每张图像的自相关项 a_i = mean_hw(sum_c w_c f_i^2)
+            terms = torch.zeros(feats.shape[0], dtype=torch.float64)
+            for i in range(0, feats.shape[0], chunk_size):
+                block = feats[i:i + chunk_size].to(self.device, torch.float32)
+                terms[i:i + chunk_size] = (weights * block ** 2).sum(dim=(1, 2)).double().cpu() / hw
+            return terms
+
+        distances = torch.zeros(row_features[0].shape[0], col_features[0].shape[0], dtype=torch.float64)
+        with torch.no_grad():
+            for kk, (rows_all, cols_all) in enumerate(zip(row_features, col_features)):
+                _, channels, hw = rows_all.shape
+                weights = self._layer_weights(kk, channels)
+                row_terms = self_terms(rows_all, weights, hw)
+                col_terms = row_terms if cols_all is rows_all else self_terms(cols_all, weights, hw)
+
+                # 互相关项 G_ij = mean_hw(sum_c w_c f_i f_j)
+                for i in range(0, rows_all.shape[0], chunk_size):
+                    rows = (weights * rows_all[i:i + chunk_size].to(self.device, torch.float32)).flatten(1)
+                    for j in range(0, cols_all.shape[0], chunk_size):
+                        cols = cols_all[j:j + chunk_size].to(self.device, torch.float32).flatten(1)
+                        cross = (rows @ cols.T).double().cpu() / hw
+                        distances[i:i + chunk_size, j:j + chunk_size] += (
+                            row_terms[i:i + chunk_size, None] + col_terms[None, j:j + chunk_size] - 2 * cross)
+        return distances
+
+    def calculate_lpips_matrix(self, images, batch_size=16, num_workers=2, chunk_size=64,
+                               max_feature_bytes=DEFAULT_MATRIX_FEATURE_BYTES):
+        """
+        计算一组图像两两之间的LPIPS距离矩阵（N×N）
+
+        每层的两两距离由分块矩阵乘法得到，骨干网络只需运行N次而不是N²次。
+        全部特征超过max_feature_bytes时按行块计算：同时只保留两个块的特征，块算完即释放，
+        内存有上限，代价是列块的特征需要重新提取（可被特征缓存命中）
+
+        Args:
+            images: 图像路径列表或内存图像列表
+            batch_size: 特征提取的批大小
+            num_workers: DataLoader工作进程数
+            chunk_size: 分块矩阵乘法的块大小，用于控制内存占用
+            max_feature_bytes: 计算时同时保留的特征的内存上限（字节）
+
+        Returns:
+            [N, N]的numpy距离矩阵，对角线为0
+        """
+        n = len(images)
+        matrix = torch.zeros(n, n, dtype=torch.float64)
+        if n == 0:
+            return matrix.numpy()
+
+        # 每个块最多占用一半的内存上限（行块与列块同时存在）
+        block = max(1, int(max_feature_bytes // (2 * self.feature_bytes_per_image())))
+        if block >= n:
+            features = self.get_lpips_features(images, batch_size, num_workers)
+            matrix = self._pairwise_distances(features, features, chunk_size)
+        else:
+            for i in range(0, n, block):
+                rows = self.get_lpips_features(images[i:i + block], batch_size, num_workers)
+                matrix[i:i + block, i:i + block] = self._pairwise_distances(rows, rows, chunk_size)
+                for j in range(i + block, n, block):
+                    cols = self.get_lpips_features(images[j:j + block], batch_size, num_workers)
+                    distances = self._pairwise_distances(rows, cols, chunk_size)
+                    matrix[i:i + block, j:j + block] = distances
+                    matrix[j:j + block, i:i + block] = distances.T
+                    del cols
+                del rows
+
+        matrix.clamp_(min=0)
+        matrix.fill_diagonal_(0)
+        return matrix.numpy()
+
+    def calculate_lpips_diversity(self, images, **kwargs):
+        """
+        计算集合内多样性：两两LPIPS距离的平均值（越大表示生成结果越多样）
+
+        Args:
+            images: 图像路径列表或内存图像列表
+            **kwargs: 传给calculate_lpips_matrix的参数
+
+        Returns:
+            (平均两两距离, 距离矩阵)
+        """
+        matrix = self.calculate_lpips_matrix(images, **kwargs)
+        upper = matrix[np.triu_indices(len(images), k=1)]
+        diversity = float(upper.mean()) if upper.size else 0.0
+        return diversity, matrix
+
 def main():
     # 使用示例
 
-    evaluator = LPIPSEvaluator(net='alex')
+    evaluator = LPIPSEvaluator(net='alex', cache_dir=DEFAULT_CACHE_DIR)
     # distance = evaluator.calculate_lpips(image_path01, image_path02)
     # print(f"LPIPS距离: {distance:.4f}")
 
@@ -133,10 +499,12 @@ def main():
             filename_globle.append(filename)
             img_list.append(os.path.join(image_paths, filename))
 
+    # 参考图像只预处理一次，候选图像分批并行计算感知相似度得分
+    distances = evaluator.calculate_lpips_batch(image_origin, img_list, batch_size=16, num_workers=4)
+
     resule_score = list()
     for index in range(len(img_list)):
-        # 分别与第0张进行比较 计算感知相似度得分
-        distance = evaluator.calculate_lpips(image_origin, img_list[index])
+        distance = distances[index]
         resule_score.append([0,filename_globle[index], distance,interpret_lpips_score(distance)])
 
     Score = 0
@@ -150,5 +518,9 @@ def main():
     Ave_Score = Score / len(resule_score)
     print(f"Ave_Score = {Ave_Score}")
 
+    # 集合内多样性（两两LPIPS平均值）
+    diversity, _ = evaluator.calculate_lpips_diversity(img_list, batch_size=16, num_workers=4)
+    print(f"Diversity (mean pairwise LPIPS) = {diversity}")
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+"""
+ComfyUI HTTP API 批量生成驱动
+不再模拟鼠标点击Queue按钮，而是直接读取 my_workflows/*.json 并提交到ComfyUI的 /prompt 接口：
+队列中始终保持指定数量的任务（queue_depth），通过 /history 轮询完成情况，并用 /view 下载输出图像。
+生成速度只受GPU限制，不再受固定的点击间隔限制。
+
+工作流文件支持两种格式:
+    API格式: ComfyUI菜单中"Save (API Format)"导出的 {节点id: {class_type, inputs}}，直接提交
+    UI格式:  普通保存的工作流（含nodes/links），借助服务器的 /object_info 转换为API格式，
+             cg-use-everywhere广播节点的隐式连接按broadcast_edges的规则还原
+
+广播节点的解析规则（与cg-use-everywhere默认设置一致，不考虑标题/分组/颜色限制与优先级）:
+    Anything Everywhere / Anything Everywhere3 / Anything Everywhere?:
+        每个已连接的输入，发送到其他节点上类型相同且未连接的输入
+    Prompts Everywhere:
+        +ve 发送到未连接且名称包含pos的CONDITIONING输入，-ve 发送到名称包含neg的输入
+
+用法示例:
+    python ComfyUI_Driver.py --workflow ../../my_workflows/workflow_api.json --count 200 \
+        --queue-depth 4 --output-dir E:/2025-09-08/5.3/3-5_Fullmodel
+"""
+
+import argparse
+import copy
+import json
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import List
+from urllib import error, parse, request
+
+# 默认服务器地址
+DEFAULT_SERVER = "http://127.0.0.1:8188"
+
+# 每次提交时随机化的种子输入名称（相当于界面上的 control_after_generate = randomize）
+SEED_INPUTS = ('seed', 'noise_seed')
+SEED_MAX = 2 ** 50
+
+# 只存在于前端的节点，转换为API格式时忽略
+FRONTEND_ONLY_NODES = ('Note', 'MarkdownNote', 'Reroute', 'PrimitiveNode')
+
+# 节点mode：2为静音（不执行），4为旁路（输入直接透传到输出）
+MODE_MUTED = 2
+MODE_BYPASS = 4
+
+# 广播节点（只在前端解析连接）
+BROADCAST_NODES = ('Anything Everywhere', 'Anything Everywhere3', 'Anything Everywhere?', 'Prompts Everywhere')
+
+# Prompts Everywhere 的输入与其目标输入名称中包含的关键字
+PROMPT_BROADCAST_INPUTS = {'+ve': 'pos', '-ve': 'neg'}
+
+# 作为控件（widget）的输入类型，其余类型只能通过连线输入
+WIDGET_TYPES = ('INT', 'FLOAT', 'STRING', 'BOOLEAN', 'COMBO')
+
+
+@dataclass
+class GenerationResult:
+    """一次提交的生成结果"""
+    index: int                                       # 提交序号（从0开始）
+    prompt_id: str                                   # ComfyUI返回的任务id
+    status: str                                      # success / error / timeout
+    files: List[str] = field(default_factory=list)   # 已下载的输出文件路径
+    error: str = ""                                  # 失败原因
+
+
+def is_api_format(workflow):
+    """判断工作流是否为API格式（{节点id: {class_type, inputs}}）"""
+    return 'nodes' not in workflow and all(
+        isinstance(node, dict) and 'class_type' in node for node in workflow.values())
+
+
+def broadcast_edges(workflow):
+    """
+    解析UI格式工作流中广播节点隐式建立的连接
+
+    Returns:
+        [(广播节点id, 目标节点id, 目标输入名称, 数据类型, 广播节点该输入的link id), ...]，API格式工作流返回空列表
+    """
+    if is_api_format(workflow):
+        return []
+    # link id -> 数据类型
+    link_types = {link[0]: link[5] for link in workflow['links']}
+
+    sources = []   # (广播节点id, 数据类型, 目标输入名称关键字, link id)
+    for node in workflow['nodes']:
+        if node['type'] not in BROADCAST_NODES or node.get('mode', 0) in (MODE_MUTED, MODE_BYPASS):
+            continue
+        for node_input in node.get('inputs', []):
+            if node_input.get('link') is None:
+                continue
+            keyword = PROMPT_BROADCAST_INPUTS.get(node_input['name']) if node['type'] == 'Prompts Everywhere' else None
+            sources.append((str(node['id']), link_types[node_input['link']], keyword, node_input['link']))
+
+    edges = []
+    for node in workflow['nodes']:
+        if node['type'] in BROADCAST_NODES:
+            continue
+        for node_input in node.get('inputs', []):
+            # 已连接的输入与控件输入不接收广播
+            if node_input.get('link') is not None or node_input.get('widget'):
+                continue
+            for source_id, data_type, keyword, link_id in sources:
+                if node_input.get('type') == data_type and (keyword is None or keyword in node_input['name'].lower()):
+                    edges.append((source_id, str(node['id']), node_input['name'], data_type, link_id))
+    return edges
+
+
+def widget_positions(node, node_info=None):
+    """
+    UI格式节点的控件输入名称在widgets_values中的位置
+
+    前端按节点定义中的输入顺序创建控件，因此优先使用 /object_info 的输入顺序；
+    没有节点定义时退回到node['inputs']中记录的控件名称。
+    种子等控件后面带有一个control_after_generate附加值，计算位置时跳过
+
+    Args:
+        node: UI格式节点
+        node_info: 服务器 /object_info 中该节点的定义（可选）
+
+    Returns:
+        {控件名称: widgets_values中的下标}
+    """
+    specs = {}
+    if node_info:
+        for section in ('required', 'optional'):
+            specs.update(node_info.get('input', {}).get(section, {}))
+        order = node_info.get('input_order')
+        if order:
+            names = order.get('required', []) + order.get('optional', [])
+            specs = {name: specs[name] for name in names if name in specs}
+    if specs:
+        widget_inputs = [name for name, spec in specs.items()
+                         if isinstance(spec[0], list) or spec[0] in WIDGET_TYPES]
+    else:
+        widget_inputs = [i['name'] for i in node.get('inputs', []) if i.get('widget')]
+
+    def has_control(name):
+        spec = specs.get(name)
+        options = spec[1] if spec and len(spec) > 1 and isinstance(spec[1], dict) else {}
+        return name in SEED_INPUTS or options.get('control_after_generate', False)
+
+    values = node.get('widgets_values') or []
+    extra = len(values) - len(widget_inputs)
+    positions = {}
+    position = 0
+    for name in widget_inputs:
+        if position >= len(values):
+            break
+        positions[name] = position
+        position += 1
+        if has_control(name) and extra > 0:
+            position += 1
+            extra -= 1
+    return positions
+
+
+def ui_to_api(workflow, object_info):
+    """
+    将UI格式工作流转换为API格式
+
+    Args:
+        workflow: UI格式工作流（含nodes与links）
+        object_info: 服务器 /object_info 返回的节点定义
+
+    Returns:
+        API格式工作流
+    """
+    nodes = {node['id']: node for node in workflow['nodes']}
+    # link id -> (源节点id, 源输出序号)
+    links = {link[0]: (link[1], link[2]) for link in workflow['links']}
+
+    unsupported = sorted({node['type'] for node in nodes.values()
+                          if 'Everywhere' in node['type'] and node['type'] not in BROADCAST_NODES})
+    if unsupported:
+        # 这些广播节点的规则没有实现，无法还原其连接
+        raise ValueError(f"工作流包含不支持的广播节点 {unsupported}，"
+                         f"请在ComfyUI中用\"Save (API Format)\"导出API格式工作流后再使用")
+    unknown = sorted({node['type'] for node in nodes.values()
+                      if node['type'] not in object_info and node['type'] not in FRONTEND_ONLY_NODES
+                      and node['type'] not in BROADCAST_NODES})
+    if unknown:
+        raise ValueError(f"服务器上没有这些节点: {unknown}")
+
+    # 广播节点隐式建立的连接：目标节点id -> {输入名称: 广播节点对应输入的link id}
+    broadcast = {}
+    for _, target_id, name, _, link_id in broadcast_edges(workflow):
+        broadcast.setdefault(target_id, {}).setdefault(name, link_id)
+
+    def resolve(link_id):
+        """沿Reroute与旁路节点找到真正的源节点，PrimitiveNode直接返回其值，源节点被静音时返回None"""
+        origin_id, slot = links[link_id]
+        origin = nodes[origin_id]
+        if origin['type'] == 'Reroute' or origin.get('mode') == MODE_BYPASS:
+            output_type = origin['outputs'][slot]['type']
+            for node_input in origin.get('inputs', []):
+                if node_input.get('link') is not None and (origin['type'] == 'Reroute'
+                                                           or node_input.get('type') == output_type):
+                    return resolve(node_input['link'])
+            return None
+        if origin['type'] == 'PrimitiveNode':
+            return origin['widgets_values'][0]
+        if origin.get('mode') == MODE_MUTED:
+            return None
+        # API格式中连线输入写作 [源节点id, 源输出序号]
+        return [str(origin_id), slot]
+
+    api = {}
+    for node_id, node in nodes.items():
+        if (node['type'] in FRONTEND_ONLY_NODES or node['type'] in BROADCAST_NODES
+                or node.get('mode') in (MODE_MUTED, MODE_BYPASS)):
+            continue
+        values = node.get('widgets_values') or []
+        inputs = {name: values[position]
+                  for name, position in widget_positions(node, object_info.get(node['type'])).items()}
+
+        # 连线输入覆盖控件值
+        for node_input in node.get('inputs', []):
+            if node_input.get('link') is None:
+                continue
+            source = resolve(node_input['link'])
+            if source is None:
+                inputs.pop(node_input['name'], None)
+            else:
+                inputs[node_input['name']] = source
+
+        # 广播连接（只作用于未连线的输入）
+        for name, link_id in broadcast.get(str(node_id), {}).items():
+            source = resolve(link_id)
+            if source is not None:
+                inputs[name] = source
+
+        api[str(node_id)] = {'class_type': node['type'], 'inputs': inputs}
+    return api
+
+
+class ComfyUIBatchDriver:
+    def __init__(self, server=DEFAULT_SERVER, queue_depth=4, poll_interval=1.0, timeout=1800,
+                 download_types=('output',)):
+        """
+        ComfyUI批量生成驱动
+
+        Args:
+            server: ComfyUI服务器地址
+            queue_depth: 服务器队列中同时保持的任务数量（正在运行的也计入）
+            poll_interval: 轮询 /history 的间隔（秒）
+            timeout: 单个任务从提交到完成的最长等待时间（秒）
+            download_types: 下载的输出类型，SaveImage为output，PreviewImage为temp
+        """
+        self.server = server.rstrip('/')
+        self.queue_depth = queue_depth
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.download_types = tuple(download_types)
+        self.client_id = uuid.uuid4().hex
+        self._object_info = None
+        # ComfyUI一般运行在本机或局域网，不经过HTTP_PROXY等代理设置
+        self._opener = request.build_opener(request.ProxyHandler({}))
+
+    # ---------------- HTTP ----------------
+
+    def _request(self, path, payload=None):
+        url = f"{self.server}{path}"
+        data = None
+        headers = {}
+        if payload is not None:
+            data = json.dumps(payload).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        req = request.Request(url, data=data, headers=headers)
+        try:
+            with self._opener.open(req, timeout=60) as response:
+                return response.read()
+        except error.HTTPError as e:
+            body = e.read().decode('utf-8', errors='replace')
+            raise RuntimeError(f"ComfyUI请求失败 {path}: HTTP {e.code} {body}") from e
+
+    def _get_json(self, path):
+        return json.loads(self._request(path))
+
+    def object_info(self):
+        """服务器上全部节点的定义（只请求一次）"""
+        if self._object_info is None:
+            self._object_info = self._get_json('/object_info')
+        return self._object_info
+
+    # ---------------- 工作流 ----------------
+
+    def load_workflow(self, workflow_path):
+        """
+        读取工作流文件，UI格式会通过 /object_info 转换为API格式
+
+        Returns:
+            API格式工作流
+        """
+        with open(workflow_path, 'r', encoding='utf-8') as f:
+            workflow = json.load(f)
+        if is_api_format(workflow):
+            return workflow
+        return ui_to_api(workflow, self.object_info())
+
+    @staticmethod
+    def randomize_seeds(workflow, rng=random):
+        """
+        复制工作流并随机化全部种子输入；相同的工作流重复提交时ComfyUI会直接复用缓存、不产生新图像
+
+        Returns:
+            新的API格式工作流
+        """
+        workflow = copy.deepcopy(workflow)
+        for node in workflow.values():
+            for name in SEED_INPUTS:
+                if isinstance(node['inputs'].get(name), int):
+                    node['inputs'][name] = rng.randrange(SEED_MAX)
+        return workflow
+
+    # ---------------- 队列 ----------------
+
+    def submit(self, workflow):
+        """
+        提交一个任务到 /prompt
+
+        Returns:
+            prompt_id
+        """
+        response = json.loads(self._request('/prompt', {'prompt': workflow, 'client_id': self.client_id}))
+        if response.get('node_errors'):
+            raise RuntimeError(f"工作流校验失败: {response['node_errors']}")
+        return response['prompt_id']
+
+    def get_history(self, prompt_id):
+        """
+        查询任务记录（任务执行结束后，无论成功或失败才会出现在 /history 中）
+
+        Returns:
+            任务已结束时返回记录，否则返回None
+        """
+        return self._get_json(f'/history/{prompt_id}').get(prompt_id) or None
+
+    def cancel(self, prompt_id):
+        """
+        取消一个任务：仍在排队时从队列中删除，正在运行时中断
+
+        Returns:
+            'deleted' / 'interrupted' / 'not_found'
+        """
+        queue = self._get_json('/queue')
+        if any(item[1] == prompt_id for item in queue.get('queue_running', [])):
+            # 较新的ComfyUI只中断指定的任务，旧版本忽略prompt_id、中断当前正在运行的任务（即该任务）
+            self._request('/interrupt', {'prompt_id': prompt_id})
+            return 'interrupted'
+        if any(item[1] == prompt_id for item in queue.get('queue_pending', [])):
+            self._request('/queue', {'delete': [prompt_id]})
+            return 'deleted'
+        return 'not_found'
+
+    def download_outputs(self, entry, output_dir):
+        """
+        下载一个任务的输出图像
+
+        Returns:
+            保存的文件路径列表
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        files = []
+        for node_output in entry.get('outputs', {}).values():
+            for image in node_output.get('images', []):
+                if image.get('type', 'output') not in self.download_types:
+                    continue
+                query = parse.urlencode({'filename': image['filename'], 'subfolder': image.get('subfolder', ''),
+                                         'type': image.get('type', 'output')})
+                path = os.path.join(output_dir, image['filename'])
+                tmp_path = f"{path}.part"
+                with open(tmp_path, 'wb') as f:
+                    f.write(self._request(f'/view?{query}'))
+                os.replace(tmp_path, path)
+                files.append(path)
+        return files
+
+    def run(self, workflow, count, output_dir, randomize_seed=True):
+        """
+        批量生成：同一个工作流提交count次
+
+        Args:
+            workflow: API格式工作流
+            count: 生成次数
+            output_dir: 输出图像保存目录
+            randomize_seed: 每次提交前是否随机化种子
+
+        Returns:
+            按提交顺序排列的GenerationResult列表
+        """
+        jobs = ((self.randomize_seeds(workflow) if randomize_seed else workflow, output_dir) for _ in range(count))
+        return self.run_jobs(jobs, count)
+
+    def run_jobs(self, jobs, count, on_result=None):
+        """
+        依次提交一组任务：队列中始终保持queue_depth个任务，完成一个补充一个
+
+        单个任务的提交、查询或下载失败（网络错误、校验失败等）只记为该任务的error，不中断其余任务；
+        超时的任务会从ComfyUI队列中删除或被中断，使服务器上的任务数不超过queue_depth
+
+        Args:
+            jobs: (API格式工作流, 输出目录) 的可迭代对象，提交时才逐个取出
+            count: 任务数量（jobs提前结束时以实际数量为准）
+            on_result: 每个任务结束时的回调 on_result(GenerationResult)，可用于记录进度
+
+        Returns:
+            按提交顺序排列的GenerationResult列表
+        """
+        jobs = iter(jobs)
+        results = []
+        pending = {}   # prompt_id -> (序号, 输出目录, 提交时间)
+        submitted = 0
+        start_time = time.time()
+
+        def finish(result):
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+        def cancel(prompt_id):
+            try:
+                self.cancel(prompt_id)
+            except (OSError, RuntimeError, ValueError) as e:
+                print(f"取消任务 {prompt_id} 失败: {e}")
+
+        try:
+            while submitted < count or pending:
+                # 补充队列
+                while submitted < count and len(pending) < self.queue_depth:
+                    job = next(jobs, None)
+                    if job is None:
+                        count = submitted
+                        break
+                    prompt, output_dir = job
+                    index = submitted
+                    submitted += 1
+                    try:
+                        prompt_id = self.submit(prompt)
+                    except (OSError, RuntimeError, ValueError) as e:
+                        finish(GenerationResult(index, "", 'error', error=f"提交失败: {e}"))
+                        print(f"第 {index + 1} 个任务提交失败: {e}")
+                        continue
+                    pending[prompt_id] = (index, output_dir, time.time())
+
+                if not pending:
+                    continue
+                time.sleep(self.poll_interval)
+
+                # 检查完成情况
+                for prompt_id, (index, output_dir, submit_time) in list(pending.items()):
+                    try:
+                        entry = self.get_history(prompt_id)
+                    except (OSError, RuntimeError, ValueError) as e:
+                        del pending[prompt_id]
+                        cancel(prompt_id)
+                        finish(GenerationResult(index, prompt_id, 'error', error=f"查询失败: {e}"))
+                        continue
+                    if entry is None:
+                        if time.time() - submit_time > self.timeout:
+                            del pending[prompt_id]
+                            cancel(prompt_id)
+                            finish(GenerationResult(index, prompt_id, 'timeout', error="等待超时"))
+                        continue
+
+                    del pending[prompt_id]
+                    status = entry.get('status') or {}
+                    if status.get('status_str') == 'error':
+                        finish(GenerationResult(index, prompt_id, 'error', error=str(status.get('messages'))))
+                        print(f"第 {index + 1} 个任务失败: {prompt_id}")
+                        continue
+                    try:
+                        files = self.download_outputs(entry, output_dir)
+                    except (OSError, RuntimeError) as e:
+                        finish(GenerationResult(index, prompt_id, 'error', error=f"下载失败: {e}"))
+                        continue
+                    finish(GenerationResult(index, prompt_id, 'success', files=files))
+
+                    done = len(results)
+                    elapsed = time.time() - start_time
+                    print(f"进度: {done}/{count}，已下载 {len(files)} 张，平均 {elapsed / done:.1f} 秒/个")
+        except KeyboardInterrupt:
+            print(f"\n接收到停止信号，已完成 {len(results)}/{count} 个任务（已提交的任务仍在ComfyUI队列中）")
+
+        results.sort(key=lambda r: r.index)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="通过ComfyUI HTTP API批量提交工作流并下载输出图像")
+    parser.add_argument('--workflow', required=True, help="工作流JSON文件（API格式或UI格式）")
+    parser.add_argument('--count', type=int, required=True, help="生成次数")
+    parser.add_argument('--output-dir', required=True, help="输出图像保存目录")
+    parser.add_argument('--server', default=DEFAULT_SERVER, help="ComfyUI服务器地址")
+    parser.add_argument('--queue-depth', type=int, default=4, help="服务器队列中同时保持的任务数量")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="轮询间隔（秒）")
+    parser.add_argument('--timeout', type=float, default=1800, help="单个任务的最长等待时间（秒）")
+    parser.add_argument('--keep-seed', action='store_true', help="不随机化种子（默认每次提交随机化）")
+    args = parser.parse_args()
+
+    driver = ComfyUIBatchDriver(args.server, queue_depth=args.queue_depth, poll_interval=args.poll_interval,
+                                timeout=args.timeout)
+    workflow = driver.load_workflow(args.workflow)
+    results = driver.run(workflow, args.count, args.output_dir, randomize_seed=not args.keep_seed)
+
+    succeeded = [r for r in results if r.status == 'success']
+    print(f"\n完成: 成功 {len(succeeded)} 个，失败 {len(results) - len(succeeded)} 个，"
+          f"共下载 {sum(len(r.files) for r in succeeded)} 张图像")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+ComfyUI工作流图分析
+解析工作流的节点与连线（包括cg-use-everywhere广播节点隐式建立的连接），找出真正影响保存输出的子图：
+    - 删除无法到达保存节点的节点（PreviewImage、Note、只用于预览的预处理器等）
+    - 计算工作流加载的模型文件（checkpoint / VAE / LoRA / ControlNet / IPAdapter / CLIP Vision）
+    - 将排队的工作流变体按加载的模型分组排序，使用相同模型的变体连续执行，减少SDXL模型切换（每次数十秒）
+
+API格式与UI格式工作流都适用。
+
+广播节点隐式建立的连接由ComfyUI_Driver.broadcast_edges解析（规则见该模块说明）。
+
+用法示例:
+    python Workflow_Graph.py --workflow "../../my_workflows/xxx.json" --output pruned.json
+"""
+
+import argparse
+import copy
+import json
+import os
+
+# 广播连接的解析与ui_to_api共用同一份实现
+from ComfyUI_Driver import MODE_BYPASS, MODE_MUTED, broadcast_edges, is_api_format, widget_positions
+
+# 保存输出的节点，分析时作为图的终点
+OUTPUT_NODES = ('SaveImage', 'Image Save', 'SaveAnimatedWEBP', 'SaveAnimatedPNG')
+
+# 没有连线、但在前端对整个工作流生效的节点，裁剪UI格式工作流时保留
+GLOBAL_NODES = ('easy globalSeed',)
+
+# 模型文件扩展名
+MODEL_EXTENSIONS = ('.safetensors', '.ckpt', '.pt', '.pth', '.bin', '.gguf')
+
+# 模型类别（按输入名称判断），排序时先按checkpoint分组，其次VAE、LoRA、ControlNet，切换代价大的放在前面
+MODEL_CATEGORIES = (
+    ('ckpt', 'unet'),
+    ('vae',),
+    ('lora',),
+    ('control',),
+)
+
+
+def _node_map(workflow):
+    """{节点id字符串: (类型, mode, 节点)}"""
+    if is_api_format(workflow):
+        return {node_id: (node['class_type'], 0, node) for node_id, node in workflow.items()}
+    return {str(node['id']): (node['type'], node.get('mode', 0), node) for node in workflow['nodes']}
+
+
+def dependencies(workflow):
+    """
+    每个节点的上游节点（连线输入 + 广播连接）
+
+    Returns:
+        {节点id: {上游节点id, ...}}
+    """
+    if is_api_format(workflow):
+        # API格式中连线输入写作 [源节点id, 源输出序号]
+        return {node_id: {str(value[0]) for value in node['inputs'].values()
+                          if isinstance(value, list) and len(value) == 2}
+                for node_id, node in workflow.items()}
+
+    origins = {link[0]: str(link[1]) for link in workflow['links']}
+    deps = {str(node['id']): {origins[node_input['link']] for node_input in node.get('inputs', [])
+                              if node_input.get('link') is not None}
+            for node in workflow['nodes']}
+    for source_id, target_id, _, _, _ in broadcast_edges(workflow):
+        deps[target_id].add(source_id)
+    return deps
+
+
+def reachable_nodes(workflow, output_types=OUTPUT_NODES):
+    """
+    从保存节点向上游遍历，找出影响输出的全部节点
+
+    静音的节点不会执行，保留在结果中（连线不变）但不再向其上游遍历
+
+    Args:
+        workflow: API格式或UI格式工作流
+        output_types: 作为终点的节点类型
+
+    Returns:
+        节点id集合
+    """
+    nodes = _node_map(workflow)
+    deps = dependencies(workflow)
+    stack = [node_id for node_id, (node_type, mode, _) in nodes.items()
+             if node_type in output_types and mode != MODE_MUTED]
+    reached = set()
+    while stack:
+        node_id = stack.pop()
+        if node_id in reached or node_id not in nodes:
+            continue
+        reached.add(node_id)
+        if nodes[node_id][1] == MODE_MUTED:
+            continue
+        stack.extend(deps.get(node_id, ()))
+    return reached
+
+
+def prune(workflow, output_types=OUTPUT_NODES):
+    """
+    删除无法到达保存节点的节点
+
+    Args:
+        workflow: API格式或UI格式工作流
+        output_types: 作为终点的节点类型
+
+    Returns:
+        裁剪后的新工作流（格式与输入相同）
+    """
+    keep = reachable_nodes(workflow, output_types)
+    if not keep:
+        raise ValueError(f"工作流中没有保存输出的节点（{', '.join(output_types)}）")
+
+    if is_api_format(workflow):
+        return {node_id: copy.deepcopy(node) for node_id, node in workflow.items() if node_id in keep}
+
+    pruned = copy.deepcopy(workflow)
+    pruned['nodes'] = [node for node in pruned['nodes']
+                       if str(node['id']) in keep or node['type'] in GLOBAL_NODES]
+    kept_ids = {str(node['id']) for node in pruned['nodes']}
+    pruned['links'] = [link for link in pruned['links'] if str(link[1]) in kept_ids and str(link[3]) in kept_ids]
+    kept_links = {link[0] for link in pruned['links']}
+    # 被删除节点的输出连线也要从保留节点的outputs中移除
+    for node in pruned['nodes']:
+        for output in node.get('outputs', []):
+            if output.get('links'):
+                output['links'] = [link_id for link_id in output['links'] if link_id in kept_links]
+    return pruned
+
+
+def _model_category(input_name):
+    name = input_name.lower()
+    for index, keywords in enumerate(MODEL_CATEGORIES):
+        if any(keyword in name for keyword in keywords):
+            return index
+    return len(MODEL_CATEGORIES)
+
+
+def loaded_models(workflow, output_types=OUTPUT_NODES, object_info=None):
+    """
+    工作流执行时加载的模型文件（只统计影响输出、且未静音/旁路的节点）
+
+    Args:
+        workflow: API或UI格式的工作流
+        output_types: 输出节点类型
+        object_info: 服务器 /object_info 返回的节点定义（UI格式时按其输入顺序定位控件，与ui_to_api一致）
+
+    Returns:
+        [(类别序号, 节点类型, 输入名称, 文件名), ...]，按类别排序
+    """
+    nodes = _node_map(workflow)
+    models = []
+    for node_id in reachable_nodes(workflow, output_types):
+        node_type, mode, node = nodes[node_id]
+        if mode in (MODE_MUTED, MODE_BYPASS):
+            continue
+        if is_api_format(workflow):
+            values = node['inputs'].items()
+        else:
+            widgets = node.get('widgets_values')
+            if not isinstance(widgets, list):
+                continue
+            positions = widget_positions(node, (object_info or {}).get(node['type']))
+            values = ((name, widgets[position]) for name, position in positions.items())
+        for name, value in values:
+            if isinstance(value, str) and value.lower().endswith(MODEL_EXTENSIONS):
+                models.append((_model_category(name), node_type, name, value))
+    return sorted(set(models))
+
+
+def loader_signature(workflow, output_types=OUTPUT_NODES, object_info=None):
+    """
+    工作流加载的模型组合，签名相同的工作流连续执行时不需要重新加载模型，参数同loaded_models
+
+    Returns:
+        可比较、可哈希的元组
+    """
+    return tuple(loaded_models(workflow, output_types, object_info))
+
+
+def order_by_loaders(items, signature_fn):
+    """
+    按模型签名排序：签名相同的连续排列（组内保持原顺序），checkpoint相同的组相邻
+
+    Args:
+        items: 待排序的列表
+        signature_fn: item -> 模型签名（loader_signature）
+
+    Returns:
+        排序后的新列表
+    """
+    signatures = [signature_fn(item) for item in items]
+    order = sorted(range(len(items)), key=lambda i: signatures[i])
+    return [items[i] for i in order]
+
+
+def count_model_swaps(signatures):
+    """按顺序执行时模型组合发生变化的次数"""
+    return sum(1 for previous, current in zip(signatures, signatures[1:]) if previous != current)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析ComfyUI工作流：删除不影响保存输出的节点，列出加载的模型")
+    parser.add_argument('--workflow', required=True, help="工作流JSON文件（API格式或UI格式）")
+    parser.add_argument('--output', help="裁剪后工作流的保存路径（不指定时只打印分析结果）")
+    parser.add_argument('--output-types', nargs='+', default=list(OUTPUT_NODES), help="作为终点的节点类型")
+    args = parser.parse_args()
+
+    with open(args.workflow, 'r', encoding='utf-8') as f:
+        workflow = json.load(f)
+
+    nodes = _node_map(workflow)
+    keep = reachable_nodes(workflow, args.output_types)
+    for source_id, target_id, name, data_type, _ in broadcast_edges(workflow):
+        print(f"广播连接: {source_id}（{nodes[source_id][0]}） -> {target_id}.{name}  [{data_type}]")
+
+    removed = sorted((node_id for node_id in nodes if node_id not in keep and nodes[node_id][0] not in GLOBAL_NODES),
+                     key=lambda node_id: int(node_id) if node_id.isdigit() else node_id)
+    print(f"\n节点 {len(nodes)} 个，影响输出 {len(keep)} 个，可删除 {len(removed)} 个:")
+    for node_id in removed:
+        print(f"  {node_id}  {nodes[node_id][0]}")
+
+    print("\n加载的模型:")
+    for _, node_type, name, value in loaded_models(workflow, args.output_types):
+        print(f"  {node_type}.{name} = {value}")
+
+    if args.output:
+        output_dir = os.path.dirname(os.path.abspath(args.output))
+        os.makedirs(output_dir, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(prune(workflow, args.output_types), f, ensure_ascii=False, indent=2)
+        print(f"\n裁剪后的工作流已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+ComfyUI工作流参数扫描
+按网格或随机采样修改工作流中节点的控件值（种子、CFG、步数、LoRA权重、ControlNet强度、IPAdapter权重等），
+生成具体的工作流变体，去除完全相同的变体后交给ComfyUIBatchDriver排队生成。
+每个变体完成后记录到进度文件，中断后重新运行会跳过已完成的变体。
+待生成的变体按加载的模型（checkpoint/LoRA/ControlNet等）分组排序后提交，减少模型切换；
+prune为true时提交前删除不影响保存输出的节点（预览图及只用于预览的预处理器等）。
+
+扫描配置（JSON）示例:
+    {
+        "workflow": "../../my_workflows/workflow_api.json",
+        "mode": "grid",
+        "repeats": 20,
+        "prune": true,
+        "parameters": {
+            "24.cfg": [5, 7, 9],
+            "81.strength": [0.6, 0.8],
+            "101.weight": [1.0, 1.35]
+        }
+    }
+
+    参数地址为 "节点id.输入名称"，API格式与UI格式工作流都适用
+    mode:       grid（全部组合）或 random（随机采样samples个，random_seed固定采样结果）
+    parameters: grid模式下为取值列表；random模式下可以是取值列表，或 {"min": a, "max": b}（均匀采样），
+                加 "integer": true 时为整数
+    repeats:    每个参数组合生成的次数，每次使用由变体内容确定的不同种子（重新运行时种子不变）
+    prune:      提交前删除不影响保存输出的节点（默认false）
+
+输出目录结构:
+    <output_dir>/<参数组合>/...png     种子以外的参数相同的图像放在同一个文件夹，可直接用于评估
+    <output_dir>/sweep_variants.json   每个变体的参数与输出文件夹
+    <output_dir>/sweep_progress.jsonl  已完成的变体
+
+用法示例:
+    python Workflow_Sweep.py --spec sweep_cfg.json --output-dir E:/2025-09-08/5.4 --queue-depth 4
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+
+from ComfyUI_Driver import (ComfyUIBatchDriver, DEFAULT_SERVER, SEED_INPUTS, SEED_MAX, is_api_format,
+                            ui_to_api, widget_positions)
+from Workflow_Graph import count_model_swaps, loader_signature, order_by_loaders, prune
+
+# 进度与变体清单文件名
+PROGRESS_FILENAME = "sweep_progress.jsonl"
+MANIFEST_FILENAME = "sweep_variants.json"
+
+
+def parse_address(address):
+    """
+    解析参数地址 "节点id.输入名称"
+
+    Returns:
+        (节点id字符串, 输入名称)
+    """
+    node_id, _, name = address.partition('.')
+    if not node_id or not name:
+        raise ValueError(f"参数地址格式应为 \"节点id.输入名称\": {address}")
+    return node_id, name
+
+
+def set_parameter(workflow, address, value, object_info=None):
+    """
+    修改工作流中一个节点的控件值（原地修改）
+
+    Args:
+        workflow: API格式或UI格式工作流
+        address: 参数地址 "节点id.输入名称"
+        value: 新的取值
+        object_info: 服务器 /object_info 返回的节点定义（UI格式时使用，与ui_to_api的控件位置一致）
+    """
+    node_id, name = parse_address(address)
+    if is_api_format(workflow):
+        if node_id not in workflow:
+            raise ValueError(f"工作流中没有节点 {node_id}")
+        workflow[node_id]['inputs'][name] = value
+        return
+
+    node = next((n for n in workflow['nodes'] if str(n['id']) == node_id), None)
+    if node is None:
+        raise ValueError(f"工作流中没有节点 {node_id}")
+    positions = widget_positions(node, (object_info or {}).get(node['type']))
+    if name not in positions:
+        raise ValueError(f"节点 {node_id}（{node['type']}）没有控件 {name}，可选: {list(positions)}")
+    node['widgets_values'][positions[name]] = value
+
+
+def apply_seed(workflow, seed, object_info=None):
+    """将工作流中所有种子输入设为同一个值（原地修改），object_info的用途同set_parameter"""
+    if is_api_format(workflow):
+        for node in workflow.values():
+            for name in SEED_INPUTS:
+                if name in node['inputs'] and not isinstance(node['inputs'][name], list):
+                    node['inputs'][name] = seed
+        return
+    for node in workflow['nodes']:
+        positions = widget_positions(node, (object_info or {}).get(node['type']))
+        for name in SEED_INPUTS:
+            if name in positions:
+                node['widgets_values'][positions[name]] = seed
+
+
+def expand_grid(parameters):
+    """
+    网格扫描：列出全部参数组合
+
+    Returns:
+        [{参数地址: 取值}, ...]
+    """
+    addresses = list(parameters)
+    return [dict(zip(addresses, values)) for values in itertools.product(*(parameters[a] for a in addresses))]
+
+
+def sample_random(parameters, samples, rng):
+    """
+    随机扫描：每个参数独立采样
+
+    Returns:
+        [{参数地址: 取值}, ...]
+    """
+    def draw(spec):
+        if isinstance(spec, dict):
+            if spec.get('integer'):
+                return rng.randint(spec['min'], spec['max'])
+            return rng.uniform(spec['min'], spec['max'])
+        return rng.choice(spec)
+
+    return [{address: draw(spec) for address, spec in parameters.items()} for _ in range(samples)]
+
+
+def workflow_key(workflow):
+    """工作流内容的哈希，用于去重与断点续跑"""
+    text = json.dumps(workflow, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def variant_dirname(params):
+    """
+    由种子以外的参数生成输出文件夹名（如 24.cfg=7_81.strength=0.8），不同种子的图像放在同一个文件夹
+    """
+    parts = [f"{address}={value}" for address, value in params.items()
+             if parse_address(address)[1] not in SEED_INPUTS]
+    name = "_".join(parts) or "base"
+    return re.sub(r'[^\w.=-]', '_', name)
+
+
+def materialize(workflow, assignments, repeats=1, object_info=None):
+    """
+    生成具体的工作流变体，并去除内容完全相同的变体
+
+    Args:
+        workflow: 原始工作流
+        assignments: [{参数地址: 取值}, ...]
+        repeats: 每个参数组合的生成次数（大于1时为每次生成确定的不同种子）
+        object_info: 服务器 /object_info 返回的节点定义（UI格式工作流时传入）
+
+    Returns:
+        [(变体哈希, 参数, 输出文件夹名, 工作流), ...]，按首次出现的顺序
+    """
+    variants = {}
+    for params in assignments:
+        base = json.loads(json.dumps(workflow))
+        for address, value in params.items():
+            set_parameter(base, address, value, object_info)
+
+        for repeat in range(repeats):
+            variant = base
+            variant_params = dict(params)
+            if repeats > 1:
+                variant = json.loads(json.dumps(base))
+                # 种子由参数组合与重复序号确定，重新运行时保持不变
+                seed_source = f"{workflow_key(base)}|{repeat}".encode('utf-8')
+                seed = int.from_bytes(hashlib.sha256(seed_source).digest()[:8], 'big') % SEED_MAX
+                apply_seed(variant, seed, object_info)
+                variant_params['seed'] = seed
+            key = workflow_key(variant)
+            if key not in variants:
+                variants[key] = (key, variant_params, variant_dirname(params), variant)
+    return list(variants.values())
+
+
+class WorkflowSweep:
+    def __init__(self, driver, spec, output_dir, base_dir="."):
+        """
+        工作流参数扫描
+
+        Args:
+            driver: ComfyUIBatchDriver
+            spec: 扫描配置（见模块说明）
+            output_dir: 输出根目录（同时保存进度与变体清单）
+            base_dir: 解析spec中相对工作流路径的目录
+        """
+        self.driver = driver
+        self.spec = spec
+        self.output_dir = output_dir
+
+        workflow_path = os.path.join(base_dir, spec['workflow'])
+        with open(workflow_path, 'r', encoding='utf-8') as f:
+            self.workflow = json.load(f)
+
+        # UI格式工作流按 /object_info 的输入顺序定位控件，与提交时ui_to_api的转换保持一致
+        self.object_info = None if is_api_format(self.workflow) else driver.object_info()
+
+        mode = spec.get('mode', 'grid')
+        parameters = spec.get('parameters', {})
+        if mode == 'grid':
+            assignments = expand_grid(parameters)
+        elif mode == 'random':
+            assignments = sample_random(parameters, spec['samples'], random.Random(spec.get('random_seed', 0)))
+        else:
+            raise ValueError(f"不支持的扫描方式: {mode}，可选值: grid, random")
+
+        self.variants = materialize(self.workflow, assignments, spec.get('repeats', 1), self.object_info)
+        print(f"参数组合 {len(assignments)} 个，去重后变体 {len(self.variants)} 个")
+
+    @property
+    def progress_path(self):
+        return os.path.join(self.output_dir, PROGRESS_FILENAME)
+
+    def completed_keys(self):
+        """读取进度文件中已成功完成的变体"""
+        if not os.path.exists(self.progress_path):
+            return set()
+        done = set()
+        with open(self.progress_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record['status'] == 'success':
+                    done.add(record['key'])
+        return done
+
+    def write_manifest(self):
+        """保存全部变体的参数与输出文件夹，便于之后按文件夹评估"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest = {key: {'params': params, 'dir': dirname} for key, params, dirname, _ in self.variants}
+        with open(os.path.join(self.output_dir, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    def run(self):
+        """
+        提交尚未完成的变体并等待全部完成
+
+        Returns:
+            本次运行的GenerationResult列表
+        """
+        self.write_manifest()
+        done = self.completed_keys()
+        todo = [variant for variant in self.variants if variant[0] not in done]
+        print(f"已完成 {len(self.variants) - len(todo)} 个，待生成 {len(todo)} 个")
+        if not todo:
+            return []
+
+        # 使用相同模型的变体连续提交
+        signatures = {variant[0]: loader_signature(variant[3], object_info=self.object_info) for variant in todo}
+        swaps_before = count_model_swaps([signatures[variant[0]] for variant in todo])
+        todo = order_by_loaders(todo, lambda variant: signatures[variant[0]])
+        swaps_after = count_model_swaps([signatures[variant[0]] for variant in todo])
+        print(f"模型组合 {len(set(signatures.values()))} 种，模型切换 {swaps_before} 次 -> {swaps_after} 次")
+
+        object_info = self.object_info
+        prune_nodes = self.spec.get('prune', False)
+
+        def jobs():
+            for _, _, dirname, workflow in todo:
+                if prune_nodes:
+                    workflow = prune(workflow)
+                prompt = workflow if object_info is None else ui_to_api(workflow, object_info)
+                yield prompt, os.path.join(self.output_dir, dirname)
+
+        def record(result):
+            key = todo[result.index][0]
+            with open(self.progress_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'key': key, 'prompt_id': result.prompt_id, 'status': result.status,
+                                    'files': result.files, 'error': result.error}, ensure_ascii=False) + "\n")
+
+        return self.driver.run_jobs(jobs(), len(todo), on_result=record)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ComfyUI工作流参数扫描（网格/随机），支持断点续跑")
+    parser.add_argument('--spec', required=True, help="扫描配置JSON文件")
+    parser.add_argument('--output-dir', required=True, help="输出根目录")
+    parser.add_argument('--server', default=DEFAULT_SERVER, help="ComfyUI服务器地址")
+    parser.add_argument('--queue-depth', type=int, default=4, help="服务器队列中同时保持的任务数量")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="轮询间隔（秒）")
+    parser.add_argument('--dry-run', action='store_true', help="只列出变体，不提交")
+    args = parser.parse_args()
+
+    with open(args.spec, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+
+    driver = ComfyUIBatchDriver(args.server, queue_depth=args.queue_depth, poll_interval=args.poll_interval)
+    sweep = WorkflowSweep(driver, spec, args.output_dir, base_dir=os.path.dirname(os.path.abspath(args.spec)))
+
+    if args.dry_run:
+        for key, params, dirname, _ in sweep.variants:
+            print(f"{key}  {dirname}  {params}")
+        return
+
+    results = sweep.run()
+    failed = [r for r in results if r.status != 'success']
+    print(f"\n本次完成 {len(results) - len(failed)} 个，失败 {len(failed)} 个（失败的变体重新运行时会再次提交）")
+
+
+if __name__ == "__main__":
+    main()
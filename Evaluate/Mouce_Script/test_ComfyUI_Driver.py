@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+ComfyUI_Driver 的测试：用http.server实现的最小ComfyUI服务器（/prompt、/history、/view、/queue、/interrupt），
+不需要真实的ComfyUI与GPU
+
+运行:
+    python -m pytest Evaluate/Mouce_Script/test_ComfyUI_Driver.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# 本目录的脚本以同目录导入的方式互相引用
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if _SCRIPT_DIR not in sys.path:
+    sys.path.append(_SCRIPT_DIR)
+
+from ComfyUI_Driver import ComfyUIBatchDriver, ui_to_api
+
+
+class StubComfyUI:
+    """
+    最小ComfyUI服务器：任务在被查询 polls_to_finish 次 /history 后完成，
+    工作流中带有 'reject' 节点时 /prompt 返回HTTP 400，带有 'hang' 节点时任务永远不完成
+    """
+
+    def __init__(self, polls_to_finish=1):
+        self.polls_to_finish = polls_to_finish
+        self.jobs = {}          # prompt_id -> {'prompt', 'polls', 'number'}
+        self.deleted = []
+        self.interrupted = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, body, content_type='application/json'):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                with stub.lock:
+                    if url.path.startswith('/history/'):
+                        return self._send(200, stub.history(url.path.rsplit('/', 1)[1]))
+                    if url.path == '/view':
+                        return self._send(200, f"IMG:{parse_qs(url.query)['filename'][0]}".encode(), 'image/png')
+                    if url.path == '/queue':
+                        return self._send(200, stub.queue())
+                self._send(404, {})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    if self.path == '/prompt':
+                        if 'reject' in body['prompt']:
+                            return self._send(400, {'error': 'invalid prompt', 'node_errors': {}})
+                        prompt_id = uuid.uuid4().hex
+                        stub.jobs[prompt_id] = {'prompt': body['prompt'], 'polls': 0, 'number': len(stub.jobs)}
+                        return self._send(200, {'prompt_id': prompt_id, 'number': len(stub.jobs), 'node_errors': {}})
+                    if self.path == '/queue':
+                        for prompt_id in body.get('delete', []):
+                            stub.deleted.append(prompt_id)
+                            stub.jobs.pop(prompt_id, None)
+                        return self._send(200, {})
+                    if self.path == '/interrupt':
+                        stub.interrupted.append(body.get('prompt_id'))
+                        stub.jobs.pop(body.get('prompt_id'), None)
+                        return self._send(200, {})
+                self._send(404, {})
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _finished(self, job):
+        return 'hang' not in job['prompt'] and job['polls'] >= self.polls_to_finish
+
+    def history(self, prompt_id):
+        job = self.jobs.get(prompt_id)
+        if job is None:
+            return {}
+        job['polls'] += 1
+        if not self._finished(job):
+            return {}
+        images = [{'filename': f"ComfyUI_{job['number']:05d}_.png", 'subfolder': '', 'type': 'output'},
+                  {'filename': f"preview_{job['number']}.png", 'subfolder': '', 'type': 'temp'}]
+        return {prompt_id: {'outputs': {'9': {'images': images}},
+                            'status': {'status_str': 'success', 'completed': True}}}
+
+    def queue(self):
+        # 第一个未完成的任务视为正在运行，其余为排队中
+        waiting = [[job['number'], prompt_id] for prompt_id, job in self.jobs.items() if not self._finished(job)]
+        return {'queue_running': waiting[:1], 'queue_pending': waiting[1:]}
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _workflow(**extra):
+    workflow = {'3': {'class_type': 'KSampler', 'inputs': {'seed': 1, 'steps': 20}}}
+    for node_id in extra:
+        workflow[node_id] = {'class_type': 'Stub', 'inputs': {}}
+    return workflow
+
+
+class ComfyUIDriverTest(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def _driver(self, stub, **kwargs):
+        kwargs.setdefault('queue_depth', 2)
+        return ComfyUIBatchDriver(stub.url, poll_interval=0.01, **kwargs)
+
+    def test_submit_poll_download(self):
+        with StubComfyUI(polls_to_finish=2) as stub:
+            results = self._driver(stub).run(_workflow(), 3, self.output_dir)
+            seeds = {job['prompt']['3']['inputs']['seed'] for job in stub.jobs.values()}
+
+        self.assertEqual([r.status for r in results], ['success'] * 3)
+        self.assertEqual([r.index for r in results], [0, 1, 2])
+        self.assertEqual(len(seeds), 3)   # 每次提交的种子不同
+        for result in results:
+            # 只下载output类型的图像
+            self.assertEqual(len(result.files), 1)
+            with open(result.files[0], 'rb') as f:
+                self.assertEqual(f.read(), f"IMG:{os.path.basename(result.files[0])}".encode())
+
+    def test_submit_error_does_not_abort_run(self):
+        with StubComfyUI() as stub:
+            results = self._driver(stub).run(_workflow(reject=True), 2, self.output_dir)
+
+        self.assertEqual([r.status for r in results], ['error', 'error'])
+        self.assertIn('HTTP 400', results[0].error)
+
+    def test_timeout_cancels_job_on_server(self):
+        with StubComfyUI() as stub:
+            results = self._driver(stub, timeout=0.05).run(_workflow(hang=True), 2, self.output_dir)
+
+        self.assertEqual([r.status for r in results], ['timeout', 'timeout'])
+        # 超时的任务在服务器上被中断（正在运行）或删除（仍在排队），不会继续占用队列
+        self.assertEqual(stub.interrupted[0], results[0].prompt_id)
+        self.assertEqual(sorted(stub.interrupted + stub.deleted), sorted(r.prompt_id for r in results))
+
+    def test_run_jobs_records_submit_error_per_job(self):
+        jobs = [(_workflow(), self.output_dir), (_workflow(reject=True), self.output_dir),
+                (_workflow(), self.output_dir)]
+        with StubComfyUI() as stub:
+            results = self._driver(stub).run_jobs(jobs, len(jobs))
+
+        self.assertEqual([r.status for r in results], ['success', 'error', 'success'])
+        self.assertIn('HTTP 400', results[1].error)
+
+    def test_run_jobs_short_iterable_stops_cleanly(self):
+        jobs = [(_workflow(), self.output_dir)] * 2
+        finished = []
+        with StubComfyUI() as stub:
+            results = self._driver(stub).run_jobs(iter(jobs), 5, on_result=finished.append)
+
+        self.assertEqual([r.status for r in results], ['success', 'success'])
+        self.assertEqual(len(finished), 2)
+
+    def test_ui_to_api_resolves_broadcast_nodes(self):
+        # Checkpoint -> Anything Everywhere(MODEL)，KSampler的model输入未连线，由广播提供
+        workflow = {
+            'nodes': [
+                {'id': 1, 'type': 'CheckpointLoaderSimple', 'mode': 0, 'widgets_values': ['a.safetensors'],
+                 'outputs': [{'type': 'MODEL'}], 'inputs': []},
+                {'id': 2, 'type': 'Anything Everywhere', 'mode': 0,
+                 'inputs': [{'name': 'anything', 'type': 'MODEL', 'link': 1}]},
+                {'id': 3, 'type': 'KSampler', 'mode': 0, 'widgets_values': [7, 'randomize', 20],
+                 'inputs': [{'name': 'model', 'type': 'MODEL', 'link': None}]},
+            ],
+            'links': [[1, 1, 0, 2, 0, 'MODEL']],
+        }
+        object_info = {
+            'CheckpointLoaderSimple': {'input': {'required': {'ckpt_name': [['a.safetensors'], {}]}}},
+            'KSampler': {'input': {'required': {'model': ['MODEL'], 'seed': ['INT', {}], 'steps': ['INT', {}]}}},
+        }
+        api = ui_to_api(workflow, object_info)
+
+        self.assertEqual(set(api), {'1', '3'})
+        self.assertEqual(api['3']['inputs'], {'model': ['1', 0], 'seed': 7, 'steps': 20})
+
+
+if __name__ == "__main__":
+    unittest.main()
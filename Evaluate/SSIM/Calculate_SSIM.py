@@ -1,7 +1,18 @@
 import os
+import sys
+from functools import partial
+
 import cv2
 import numpy as np
-from skimage.metrics import structural_similarity as ssim
+
+# 将Evaluate目录加入搜索路径，以便导入Image_handle中的公共模块（以及以 SSIM.xxx 的形式导入同目录模块）
+_EVALUATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _EVALUATE_DIR not in sys.path:
+    sys.path.append(_EVALUATE_DIR)
+
+from SSIM.SSIM_Engine import ssim_batch, ms_ssim_batch
+from Image_handle.Image_loader import decode_image, iter_images
+from Image_handle.Image_cache import PreprocessedImageCache, DEFAULT_CACHE_DIR
 
 def interpret_ssim_score(score):
     """
@@ -26,13 +37,34 @@ def interpret_ssim_score(score):
     else:
         return "负相关 - 图像可能呈现相反特性"
 
-def calculate_ssim_for_images(original_image_path, generated_images_dir):
+def prepare_ssim_image(image, size=None, color=False):
+    """
+    SSIM预处理：缩放到指定尺寸并按需转换为灰度图（在解码线程中执行）
+
+    参数:
+    image: [H, W, 3]的RGB数组
+    size: 目标尺寸 (宽, 高)，None表示不缩放
+    color: 为True时保留彩色
+
+    返回:
+    预处理后的数组
+    """
+    if size is not None and (image.shape[1], image.shape[0]) != size:
+        image = cv2.resize(image, size)
+    return image if color else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+def calculate_ssim_for_images(original_image_path, generated_images_dir, color=False,
+                              window='uniform', multiscale=False, cache_dir=None):
     """
     计算原图与生成图像集中各图像的SSIM分数
 
     参数:
     original_image_path: 原始图像路径
     generated_images_dir: 生成的图像所在的目录路径
+    color: 为True时逐通道计算彩色SSIM，否则转换为灰度图计算
+    window: 'uniform'（7x7均匀窗口，与skimage默认结果一致）或 'gaussian'（11x11高斯窗口）
+    multiscale: 为True时计算MS-SSIM
+    cache_dir: 预处理图像缓存目录，为None时不使用缓存；启用后重复运行时跳过解码与缩放
 
     返回:
     无，结果直接打印到控制台
@@ -42,13 +74,16 @@ def calculate_ssim_for_images(original_image_path, generated_images_dir):
         print(f"错误：原始图像文件不存在 '{original_image_path}'")
         return
 
-    original_img = cv2.imread(original_image_path)
-    if original_img is None:
+    cache = PreprocessedImageCache(cache_dir) if cache_dir else None
+
+    try:
+        original_img = decode_image(original_image_path, cache=cache)
+    except Exception:
         print(f"错误：无法读取原始图像 '{original_image_path}'")
         return
 
     # 转换为灰度图
-    original_gray = cv2.cvtColor(original_img, cv2.COLOR_BGR2GRAY)
+    original_gray = prepare_ssim_image(original_img, color=color)
 
     # 获取生成图像目录中的所有图像文件
     if not os.path.isdir(generated_images_dir):
@@ -67,30 +102,30 @@ def calculate_ssim_for_images(original_image_path, generated_images_dir):
     print("\nSSIM评分结果:")
     print("-" * 50)
 
-    ssim_scores = []
-
-    # 计算每张生成图像与原图的SSIM
-    for img_file in generated_images:
-        img_path = os.path.join(generated_images_dir, img_file)
-        gen_img = cv2.imread(img_path)
-
+    # 并行解码全部图像（缩放到原图尺寸并转换为灰度图），堆叠为一个数组后整批计算SSIM
+    valid_files = []
+    gen_stack = []
+    img_paths = [os.path.join(generated_images_dir, f) for f in generated_images]
+    transform = partial(prepare_ssim_image, size=(original_img.shape[1], original_img.shape[0]), color=color)
+    for index, img_path, gen_img, error in iter_images(img_paths, transform=transform, cache=cache):
         if gen_img is None:
-            print(f"警告：无法读取图像 '{img_file}'，跳过")
+            print(f"警告：无法读取图像 '{generated_images[index]}'，跳过")
             continue
 
-        # 确保生成图像尺寸与原图一致
-        if gen_img.shape != original_img.shape:
-            gen_img = cv2.resize(gen_img, (original_img.shape[1], original_img.shape[0]))
-
-        # 转换为灰度图
-        gen_gray = cv2.cvtColor(gen_img, cv2.COLOR_BGR2GRAY)
+        valid_files.append(generated_images[index])
+        gen_stack.append(gen_img)
 
-        # 计算SSIM
-        ssim_score = ssim(original_gray, gen_gray)
-        ssim_scores.append([0,img_file,float(ssim_score)])
+    if not gen_stack:
+        print(f"错误：没有可以计算的图像 '{generated_images_dir}'")
+        return
 
-        # print(f"{img_file}: {ssim_score:.4f}")
+    # 计算SSIM
+    if multiscale:
+        scores = ms_ssim_batch(original_gray, np.stack(gen_stack))
+    else:
+        scores = ssim_batch(original_gray, np.stack(gen_stack), window=window)
 
+    ssim_scores = [[0, img_file, float(score)] for img_file, score in zip(valid_files, scores)]
 
     ssim_scores.sort(key=lambda x: x[2], reverse=True)
     Total_score = 0
@@ -113,4 +148,4 @@ if __name__ == "__main__":
 
     generated_img_dir = "E:/2025-09-08/5.3/3-2_Ourmodel/"  # 生成图像所在目录
 
-    calculate_ssim_for_images(original_img_path, generated_img_dir)
\ No newline at end of file
+    calculate_ssim_for_images(original_img_path, generated_img_dir, cache_dir=DEFAULT_CACHE_DIR)
\ No newline at end of file
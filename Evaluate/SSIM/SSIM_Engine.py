@@ -0,0 +1,217 @@
+import numpy as np
+from scipy import ndimage
+
+# MS-SSIM各尺度权重（Wang et al. 2003）
+MS_SSIM_WEIGHTS = (0.0448, 0.2856, 0.3001, 0.2363, 0.1333)
+
+
+def gaussian_kernel_1d(sigma=1.5, truncate=3.5):
+    """
+    一维高斯核，sigma=1.5、truncate=3.5时为11抽头（与Wang et al. 2004及skimage一致）
+
+    参数:
+    sigma: 高斯标准差
+    truncate: 截断半径（以sigma为单位）
+
+    返回:
+    归一化的一维高斯核
+    """
+    radius = int(truncate * sigma + 0.5)
+    x = np.arange(-radius, radius + 1, dtype=np.float64)
+    kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    return kernel / kernel.sum()
+
+
+def _separable_filter(stack, window, win_size, kernel):
+    """
+    对[..., H, W]的图像栈在H、W两个方向做可分离滤波，整批一次完成
+
+    参数:
+    stack: [..., H, W]的浮点数组
+    window: 'gaussian' 或 'uniform'
+    win_size: 均匀窗口大小
+    kernel: 一维高斯核
+
+    返回:
+    滤波结果，形状与stack相同
+    """
+    if window == 'gaussian':
+        out = ndimage.correlate1d(stack, kernel, axis=-2, mode='reflect')
+        return ndimage.correlate1d(out, kernel, axis=-1, mode='reflect')
+    out = ndimage.uniform_filter1d(stack, win_size, axis=-2, mode='reflect')
+    return ndimage.uniform_filter1d(out, win_size, axis=-1, mode='reflect')
+
+
+def _to_channel_first(images, dtype):
+    """把[N, H, W]或[N, H, W, C]转换为[N, C, H, W]的浮点数组"""
+    if images.ndim == 3:
+        return images[:, None].astype(dtype)
+    return np.moveaxis(images, -1, 1).astype(dtype)
+
+
+class _SSIMContext:
+    """SSIM计算参数与参考图像的局部统计量（参考图像只需滤波一次，按广播与整批图像计算）"""
+
+    def __init__(self, ref_stack, data_range, window, win_size, sigma, K1, K2, use_sample_covariance):
+        """
+        参数:
+        ref_stack: [1, C, H, W]的参考图像
+        其余参数见ssim_batch
+        """
+        if window not in ('gaussian', 'uniform'):
+            raise ValueError(f"不支持的窗口类型: {window}")
+
+        self.window = window
+        self.kernel = gaussian_kernel_1d(sigma)
+        self.win_size = len(self.kernel) if window == 'gaussian' else win_size
+
+        if use_sample_covariance is None:
+            # 均匀窗口默认使用样本协方差（与skimage默认一致），高斯窗口使用总体协方差（与Wang et al.一致）
+            use_sample_covariance = window == 'uniform'
+        np_ = self.win_size ** 2
+        self.cov_norm = np_ / (np_ - 1) if use_sample_covariance else 1.0
+
+        self.C1 = (K1 * data_range) ** 2
+        self.C2 = (K2 * data_range) ** 2
+        self.pad = (self.win_size - 1) // 2
+
+        self.ref = ref_stack
+        self.ux = self.filter(ref_stack)
+        self.vx = self.cov_norm * (self.filter(ref_stack * ref_stack) - self.ux * self.ux)
+
+    def filter(self, stack):
+        return _separable_filter(stack, self.window, self.win_size, self.kernel)
+
+    def maps(self, stack):
+        """
+        计算一批图像与参考图像的亮度项与对比度-结构项
+
+        参数:
+        stack: [B, C, H, W]的浮点数组
+
+        返回:
+        (l_map, cs_map)，形状均为[B, C, H, W]
+        """
+        uy = self.filter(stack)
+        vy = self.cov_norm * (self.filter(stack * stack) - uy * uy)
+        vxy = self.cov_norm * (self.filter(self.ref * stack) - self.ux * uy)
+
+        l_map = (2 * self.ux * uy + self.C1) / (self.ux * self.ux + uy * uy + self.C1)
+        cs_map = (2 * vxy + self.C2) / (self.vx + vy + self.C2)
+        return l_map, cs_map
+
+    def crop_mean(self, maps):
+        """
+        裁掉边缘pad后按图像、按通道求均值（与skimage的crop(S, pad).mean()一致）
+
+        返回:
+        [B, C]的均值数组
+        """
+        p = self.pad
+        if p:
+            maps = maps[..., p:-p, p:-p]
+        return maps.reshape(maps.shape[0], maps.shape[1], -1).mean(axis=2, dtype=np.float64)
+
+
+def ssim_batch(reference, images, data_range=255, window='uniform', win_size=7, sigma=1.5,
+               K1=0.01, K2=0.03, use_sample_covariance=None, batch_size=8, dtype=np.float64):
+    """
+    批量计算参考图像与一组图像的SSIM
+
+    整批图像堆叠为一个数组，用可分离卷积一次完成局部统计量的计算；
+    window='uniform'、win_size=7时与skimage.metrics.structural_similarity的默认结果一致，
+    window='gaussian'时为Wang et al. 2004的11x11高斯窗口SSIM。
+
+    参数:
+    reference: 参考图像，[H, W]（灰度）或[H, W, C]（彩色，逐通道计算后取平均）
+    images: 图像栈，[N, H, W]或[N, H, W, C]，尺寸需与参考图像一致
+    data_range: 像素取值范围，uint8图像为255
+    window: 'uniform' 或 'gaussian'
+    win_size: 均匀窗口大小（高斯窗口时由sigma决定）
+    sigma: 高斯窗口标准差
+    K1, K2: SSIM稳定常数
+    use_sample_covariance: 是否使用样本协方差，None时按窗口类型自动选择
+    batch_size: 每次同时计算的图像数量，用于控制内存占用
+    dtype: 计算精度
+
+    返回:
+    [N]的SSIM分数数组
+    """
+    images = np.asarray(images)
+    if images.shape[1:] != reference.shape:
+        raise ValueError(f"图像尺寸 {images.shape[1:]} 与参考图像 {reference.shape} 不一致")
+
+    ctx = _SSIMContext(_to_channel_first(reference[None], dtype), data_range, window, win_size,
+                       sigma, K1, K2, use_sample_covariance)
+
+    scores = []
+    for i in range(0, images.shape[0], batch_size):
+        l_map, cs_map = ctx.maps(_to_channel_first(images[i:i + batch_size], dtype))
+        # 彩色图像逐通道计算SSIM后取平均
+        scores.append(ctx.crop_mean(l_map * cs_map).mean(axis=1))
+
+    return np.concatenate(scores) if scores else np.empty(0)
+
+
+def _downsample(stack):
+    """2x2平均池化（奇数边长时丢弃最后一行/列）"""
+    h, w = stack.shape[-2] // 2 * 2, stack.shape[-1] // 2 * 2
+    stack = stack[..., :h, :w]
+    return 0.25 * (stack[..., 0::2, 0::2] + stack[..., 1::2, 0::2] +
+                   stack[..., 0::2, 1::2] + stack[..., 1::2, 1::2])
+
+
+def ms_ssim_batch(reference, images, data_range=255, weights=MS_SSIM_WEIGHTS, sigma=1.5,
+                  K1=0.01, K2=0.03, batch_size=8, dtype=np.float64):
+    """
+    批量计算参考图像与一组图像的多尺度SSIM（MS-SSIM，高斯窗口）
+
+    参数:
+    reference: 参考图像，[H, W]或[H, W, C]
+    images: 图像栈，[N, H, W]或[N, H, W, C]
+    data_range: 像素取值范围
+    weights: 各尺度权重，长度即尺度数
+    sigma: 高斯窗口标准差
+    K1, K2: SSIM稳定常数
+    batch_size: 每次同时计算的图像数量
+    dtype: 计算精度
+
+    返回:
+    [N]的MS-SSIM分数数组
+    """
+    images = np.asarray(images)
+    if images.shape[1:] != reference.shape:
+        raise ValueError(f"图像尺寸 {images.shape[1:]} 与参考图像 {reference.shape} 不一致")
+
+    levels = len(weights)
+    min_side = min(reference.shape[:2])
+    if min_side // 2 ** (levels - 1) < len(gaussian_kernel_1d(sigma)):
+        raise ValueError(f"图像最短边 {min_side} 太小，无法计算 {levels} 个尺度的MS-SSIM")
+
+    weights = np.asarray(weights, dtype=np.float64)
+    ref_stack = _to_channel_first(reference[None], dtype)
+
+    # 参考图像各尺度的局部统计量只计算一次
+    contexts = []
+    for level in range(levels):
+        contexts.append(_SSIMContext(ref_stack, data_range, 'gaussian', None, sigma, K1, K2, False))
+        ref_stack = _downsample(ref_stack)
+
+    scores = []
+    for i in range(0, images.shape[0], batch_size):
+        stack = _to_channel_first(images[i:i + batch_size], dtype)
+
+        level_values = []
+        for level, ctx in enumerate(contexts):
+            l_map, cs_map = ctx.maps(stack)
+            if level == levels - 1:
+                level_values.append(ctx.crop_mean(l_map * cs_map))
+            else:
+                level_values.append(ctx.crop_mean(cs_map))
+                stack = _downsample(stack)
+
+        values = np.maximum(np.stack(level_values, axis=0), 0)
+        per_channel = np.prod(values ** weights[:, None, None], axis=0)
+        scores.append(per_channel.mean(axis=1))
+
+    return np.concatenate(scores) if scores else np.empty(0)